@@ -0,0 +1,91 @@
+"""
+AD FILTER THROUGHPUT: SINGLE CALLS VS BATCHES
+
+Сравнивает время на одно сообщение для `AdFilterRepository.process` (по одному
+сообщению) и `process_batch` с батчами от 8 до 512 сообщений.
+
+Запуск из корня репозитория:
+
+    PYTHONPATH=. python benchmarks/ad_filter_batch.py --model models/ad_filter.bin
+    PYTHONPATH=. python benchmarks/ad_filter_batch.py --model models/ad_filter.pkl
+"""
+
+import argparse
+import random
+import time
+import warnings
+from typing import List
+
+from entities.data import BotMessage
+from repositories.ad_filter import AdFilterRepository
+from repositories.ad_model_artifact import LinearAdModel, load_ad_model
+from repositories.model_registry import ModelRegistry
+
+BATCH_SIZES = [8, 16, 32, 64, 128, 256, 512]
+
+
+def vocabulary(model_path: str) -> List[str]:
+    """Однословные термины модели: из них собираются правдоподобные тексты."""
+    model = load_ad_model(model_path)
+    if isinstance(model, LinearAdModel):
+        blob, offsets = bytes(model._blob), model._offsets
+        terms = [
+            blob[offsets[i] : offsets[i + 1]].decode("utf-8")
+            for i in range(len(offsets) - 1)
+        ]
+    else:
+        terms = list(model.steps[0][1].vocabulary_)
+    return sorted(term for term in terms if " " not in term)
+
+
+def make_messages(words: List[str], count: int, seed: int = 0) -> List[BotMessage]:
+    rng = random.Random(seed)
+    return [
+        BotMessage(
+            question="Вопрос пользователя",
+            answer=" ".join(rng.choice(words) for _ in range(rng.randint(5, 60))),
+        )
+        for _ in range(count)
+    ]
+
+
+def per_message_us(repo: AdFilterRepository, messages, batch_size: int) -> float:
+    start = time.perf_counter()
+    if batch_size == 1:
+        for message in messages:
+            repo.process(message)
+    else:
+        for i in range(0, len(messages), batch_size):
+            repo.process_batch(messages[i : i + batch_size])
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default="models/ad_filter.bin")
+    parser.add_argument("--messages", type=int, default=2048)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")  # sklearn version warnings on unpickling
+
+    repo = AdFilterRepository(args.model, registry=ModelRegistry())
+    messages = make_messages(vocabulary(args.model), args.messages)
+    repo.process_batch(messages[:64])  # прогрев
+
+    print(f"model: {args.model}, messages: {len(messages)}")
+    print(f"{'batch':>6} {'us/msg':>10} {'msg/s':>10} {'speedup':>8}")
+    baseline = None
+    for batch_size in [1] + BATCH_SIZES:
+        best = min(
+            per_message_us(repo, messages, batch_size) for _ in range(args.repeats)
+        )
+        baseline = baseline or best
+        print(
+            f"{batch_size:>6} {best:>10.1f} {1e6 / best:>10.0f} {baseline / best:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -11,13 +13,113 @@ class Settings(BaseSettings):
     ollama_base_url: str = Field("", alias="LLM_BASE_URL")
     ollama_model_name: str = Field("", alias="LLM_MODEL_NAME")
     ollama_prompt: str = Field("перепиши текст", alias="LLM_PROMPT")
+    ollama_timeout_s: float = Field(30.0, alias="LLM_TIMEOUT_S")
+    ollama_max_concurrency: int = Field(4, alias="LLM_MAX_CONCURRENCY")
     off_topic_model_name: str = Field("all-MiniLM-L6-v2", alias="OFF_TOPIC_MODEL_NAME")
     ad_filter_model_name: str = Field(
-        "models/ad_filter.pkl", alias="AD_FILTER_MODEL_NAME"
+        "models/ad_filter.bin", alias="AD_FILTER_MODEL_NAME"
     )
+    # how often loaded model artifacts are checked for a new version
+    model_reload_interval_s: float = Field(5.0, alias="MODEL_RELOAD_INTERVAL_S")
+    # torch | onnx | onnx-int8
+    inference_backend: str = Field("torch", alias="INFERENCE_BACKEND")
+    onnx_cache_dir: str = Field("models/onnx", alias="ONNX_CACHE_DIR")
     kafka_brokers: str = Field("", alias="KAFKA_BROKERS")
+    # Kafka producer: records wait up to linger_ms to share a batch
+    kafka_linger_ms: int = Field(5, alias="KAFKA_LINGER_MS")
+    kafka_max_batch_size: int = Field(16384, alias="KAFKA_MAX_BATCH_SIZE")
+    # "", gzip, snappy, lz4 or zstd (the last three need their extra packages)
+    kafka_compression_type: str = Field("", alias="KAFKA_COMPRESSION_TYPE")
+    # 0, 1 or all
+    kafka_acks: str = Field("1", alias="KAFKA_ACKS")
+    # Kafka consumer: 0 handles records one by one with auto-commit; otherwise at most
+    # this many records in flight, concurrent across partitions, committed once handled
+    kafka_max_in_flight: int = Field(0, alias="KAFKA_MAX_IN_FLIGHT")
+    kafka_commit_interval_ms: int = Field(1000, alias="KAFKA_COMMIT_INTERVAL_MS")
+    # per_check: a check-requests.<check> topic per check; broadcast: the old single
+    # check-requests topic. To switch to per_check, redeploy the workers first
+    # (they read both layouts), then the API
+    check_topic_routing: Literal["per_check", "broadcast"] = Field(
+        "broadcast", alias="CHECK_TOPIC_ROUTING"
+    )
     mongo_uri: str = Field("", alias="MONGO_URI")
     gigachat_api: str = Field("", alias="GIGA_CHAT_API")
+    gigachat_timeout_s: float = Field(30.0, alias="GIGA_CHAT_TIMEOUT_S")
+    gigachat_max_concurrency: int = Field(4, alias="GIGA_CHAT_MAX_CONCURRENCY")
+    # Aggregator
+    # how long to wait for the remaining checks before finalizing as degraded
+    aggregator_pending_ttl_s: float = Field(30.0, alias="AGGREGATOR_PENDING_TTL_S")
+    aggregator_max_pending: int = Field(10000, alias="AGGREGATOR_MAX_PENDING")
+    # compacted topic mirroring pending requests, so they survive a rebalance or restart
+    aggregator_changelog_topic: str = Field(
+        "aggregator-changelog", alias="AGGREGATOR_CHANGELOG_TOPIC"
+    )
+    # how long closed-request markers stay in the changelog: a result redelivered
+    # within this window is recognised as late instead of reopening its request
+    aggregator_changelog_retention_ms: int = Field(
+        86_400_000, alias="AGGREGATOR_CHANGELOG_RETENTION_MS"
+    )
+    # partitions of check-results (and the changelog): the most aggregators
+    # that can share the load
+    kafka_result_partitions: int = Field(6, alias="KAFKA_RESULT_PARTITIONS")
+    # comma-separated rewrite backends (gigachat, ollama); the first is preferred
+    # until latency stats say otherwise
+    rewrite_backends: str = Field("gigachat", alias="REWRITE_BACKENDS")
+    rewrite_deadline_s: float = Field(30.0, alias="REWRITE_DEADLINE_S")
+    # duplicate a rewrite to the next backend when the first is this slow;
+    # off when unset
+    rewrite_hedge_after_s: Optional[float] = Field(None, alias="REWRITE_HEDGE_AFTER_S")
+    # memory | mongo | none
+    rewrite_cache_backend: str = Field("memory", alias="REWRITE_CACHE_BACKEND")
+    rewrite_cache_size: int = Field(10000, alias="REWRITE_CACHE_SIZE")
+    rewrite_cache_ttl_s: float = Field(86400.0, alias="REWRITE_CACHE_TTL_S")
+    # write-behind persistence of final results
+    mongo_batch_max_size: int = Field(500, alias="MONGO_BATCH_MAX_SIZE")
+    mongo_batch_max_latency_ms: float = Field(50.0, alias="MONGO_BATCH_MAX_LATENCY_MS")
+    mongo_batch_queue_size: int = Field(10000, alias="MONGO_BATCH_QUEUE_SIZE")
+    # Safety
+    safety_mask_batch_size: int = Field(32, alias="SAFETY_MASK_BATCH_SIZE")
+    safety_batch_max_size: int = Field(16, alias="SAFETY_BATCH_MAX_SIZE")
+    safety_batch_max_latency_ms: float = Field(
+        10.0, alias="SAFETY_BATCH_MAX_LATENCY_MS"
+    )
+    safety_batch_queue_size: int = Field(256, alias="SAFETY_BATCH_QUEUE_SIZE")
+    # comma-separated, e.g. "ru" or "en,ru"; preload defaults to all allowed languages
+    safety_languages: str = Field("en,ru", alias="SAFETY_LANGUAGES")
+    safety_preload_languages: Optional[str] = Field(
+        None, alias="SAFETY_PRELOAD_LANGUAGES"
+    )
+    # Ad filter
+    # the rules change verdicts (a link is always an ad), so they are opt-in:
+    # enable on one replica first and compare its verdicts with the others
+    ad_rules_enabled: bool = Field(False, alias="AD_RULES_ENABLED")
+    # JSON list of rules; the built-in rules are used when unset
+    ad_rules_path: Optional[str] = Field(None, alias="AD_RULES_PATH")
+    ad_batch_max_size: int = Field(64, alias="AD_BATCH_MAX_SIZE")
+    ad_batch_max_latency_ms: float = Field(10.0, alias="AD_BATCH_MAX_LATENCY_MS")
+    ad_batch_queue_size: int = Field(1024, alias="AD_BATCH_QUEUE_SIZE")
+    # Off-topic
+    off_topic_cache_size: int = Field(10000, alias="OFF_TOPIC_CACHE_SIZE")
+    # shared on-disk embedding store, e.g. "/app/cache/off_topic"; off when unset
+    off_topic_store_path: Optional[str] = Field(None, alias="OFF_TOPIC_STORE_PATH")
+    off_topic_store_capacity: int = Field(100_000, alias="OFF_TOPIC_STORE_CAPACITY")
+    # pair (answer vs question) | topics (answer vs allowed topics) | both
+    off_topic_mode: str = Field("pair", alias="OFF_TOPIC_MODE")
+    # JSON list of allowed topics, required by the "topics" and "both" modes
+    off_topic_topics_path: Optional[str] = Field(None, alias="OFF_TOPIC_TOPICS_PATH")
+    off_topic_topic_threshold: float = Field(0.5, alias="OFF_TOPIC_TOPIC_THRESHOLD")
+    off_topic_top_k: int = Field(3, alias="OFF_TOPIC_TOP_K")
+    # escalate embedding scores within [low, high] to the LLM (OPENROUTER_API_KEY)
+    off_topic_cascade_enabled: bool = Field(False, alias="OFF_TOPIC_CASCADE_ENABLED")
+    off_topic_uncertain_low: float = Field(0.4, alias="OFF_TOPIC_UNCERTAIN_LOW")
+    off_topic_uncertain_high: float = Field(0.6, alias="OFF_TOPIC_UNCERTAIN_HIGH")
+    off_topic_llm_timeout_s: float = Field(30.0, alias="OFF_TOPIC_LLM_TIMEOUT_S")
+    off_topic_llm_max_concurrency: int = Field(8, alias="OFF_TOPIC_LLM_MAX_CONCURRENCY")
+    # PII
+    pii_ner_batch_size: int = Field(16, alias="PII_NER_BATCH_SIZE")
+    pii_batch_max_size: int = Field(16, alias="PII_BATCH_MAX_SIZE")
+    pii_batch_max_latency_ms: float = Field(10.0, alias="PII_BATCH_MAX_LATENCY_MS")
+    pii_batch_queue_size: int = Field(256, alias="PII_BATCH_QUEUE_SIZE")
 
 
 settings = Settings()
@@ -45,6 +45,15 @@ class Violation(BaseModel):
     level: ViolationLevel
 
 
+class TopicMatch(BaseModel):
+    """
+    An allowed topic of the bot domain matched against an answer.
+    """
+
+    topic: str
+    score: float
+
+
 class ServiceCheckResult(BaseModel):
     """
     Result of a single service check (e.g. PII, Safety, AdFilter, OffTopic, Rewrite).
@@ -56,6 +65,11 @@ class ServiceCheckResult(BaseModel):
     question: Optional[str] = None
     censored_entities: Optional[List[str]] = None
     error: Optional[str] = None
+    model_version: Optional[str] = None
+    # which stage of the service decided, e.g. "rules" or "model"
+    stage: Optional[str] = None
+    # best matching allowed topics, for off-topic checks against the topic index
+    topic_matches: Optional[List[TopicMatch]] = None
 
 
 class FinalCheckResult(BaseModel):
@@ -64,6 +78,9 @@ class FinalCheckResult(BaseModel):
     # score: float
     masked_answer: str
     all_checks: Dict[str, ServiceCheckResult]
+    # finalized on deadline without every check; degraded results are never safe
+    degraded: bool = False
+    missing_checks: Optional[List[str]] = None
 
 
 class LLMRewriteResult(BaseModel):
@@ -80,3 +97,5 @@ class LLMRequest:
     model: Optional[str] = None
     ollama_host: Optional[str] = None
     api_key: Optional[str] = None
+    # identifies the rewrite for caching; requests without it are never cached
+    cache_key: Optional[str] = None
@@ -10,12 +10,27 @@ from config import settings
 app = FastAPI(title="Output Safety API", debug=True)
 
 
+# one producer for the whole app: its connections and batches are shared by all requests
+event_bus = KafkaEventBus(
+    brokers=settings.kafka_brokers,
+    linger_ms=settings.kafka_linger_ms,
+    max_batch_size=settings.kafka_max_batch_size,
+    compression_type=settings.kafka_compression_type,
+    acks=settings.kafka_acks,
+)
+
+
+@app.on_event("shutdown")
+async def close_event_bus():
+    await event_bus.close()
+
+
 async def get_event_bus() -> EventBus:
-    return KafkaEventBus(brokers=settings.kafka_brokers)
+    return event_bus
 
 
 async def get_enqueue_uc(bus: EventBus = Depends(get_event_bus)) -> CheckMessageUseCase:
-    return CheckMessageUseCase(event_bus=bus)
+    return CheckMessageUseCase(event_bus=bus, routing=settings.check_topic_routing)
 
 
 @app.post("/check", status_code=202)
@@ -1,32 +1,115 @@
 from entities.data import ServiceCheckResult, BotMessage
 from use_cases.ports.ml_service import IMLServiceRepository
-import pickle
+from repositories.ad_model_artifact import load_ad_model
+from repositories.ad_rules import SAFE, AdRuleEngine
+from repositories.model_registry import LoadedModel, ModelRegistry, default_registry
+from typing import Dict, List, Optional
+import time
 
 """
 SERVICE FOR DETECTING AD & COMPETITOR INFORMATION
 
 PIPELINE:
-1. Detection of the message's language (Russian / English)
-2. Deletion of links, HTML-inserts and some special symbols
-3. Tokenization of the text
-4. Running rule engine (cheching 3 categories: promo / competiton / common text)
-5. Running TF-IDF + linear classification (cheching 3 categories)
+1. Rule engine (repositories/ad_rules.py): links, HTML links, messenger links,
+   bare domains and promo codes -> unsafe; short plain answers -> safe.
+   Rules are data, so competitor names can be added via AD_RULES_PATH
+2. TF-IDF + calibrated linear classification for everything the rules
+   could not decide (scored in one batch)
+
+Each result records the deciding stage ("rules" / "model").
 """
 
 
 class AdFilterRepository(IMLServiceRepository):
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        registry: Optional[ModelRegistry] = None,
+        rules: Optional[AdRuleEngine] = None,
+    ):
         self.filename = model_path
-        with open(self.filename, "rb") as file:
-            self.model = pickle.load(file)
+        self.registry = registry or default_registry
+        # rule pre-filter; None sends every message to the classifier
+        self.rules = rules
+        self.stage_stats = {
+            stage: {"messages": 0, "seconds": 0.0} for stage in ("rules", "model")
+        }
+        self.rule_hits: Dict[str, int] = {}
+        # the registry loads the artifact once per process; fail fast if it is broken
+        self._loaded()
 
-    def process(self, message: BotMessage) -> ServiceCheckResult:
-        text = message.answer or ""
-        proba = float(self.model.predict_proba([text])[0, 1])
-        label = 0 if proba >= 0.5 else 1
-        return ServiceCheckResult(
-            safe=label,
-            score=proba,
-            masked_answer=message.answer,
-            question=message.question,
+    def _loaded(self) -> LoadedModel:
+        return self.registry.get(self.filename, load_ad_model)
+
+    @property
+    def model(self):
+        return self._loaded().model
+
+    def stage_report(self) -> dict:
+        """Share of messages decided by rules and the model time they saved."""
+        rules, model = self.stage_stats["rules"], self.stage_stats["model"]
+        total = rules["messages"] + model["messages"]
+        rules_ms = (
+            1000 * rules["seconds"] / rules["messages"] if rules["messages"] else 0.0
+        )
+        model_ms = (
+            1000 * model["seconds"] / model["messages"] if model["messages"] else 0.0
         )
+        return {
+            "messages": total,
+            "rules_hit_rate": rules["messages"] / total if total else 0.0,
+            "rules_ms_per_message": rules_ms,
+            "model_ms_per_message": model_ms,
+            "saved_ms": rules["messages"] * max(0.0, model_ms - rules_ms),
+            "rule_hits": dict(self.rule_hits),
+        }
+
+    def process(self, message: BotMessage) -> ServiceCheckResult:
+        return self.process_batch([message])[0]
+
+    def process_batch(self, messages: List[BotMessage]) -> List[ServiceCheckResult]:
+        """Decides what it can with the rules, scores the rest in one batch."""
+        results: List[Optional[ServiceCheckResult]] = [None] * len(messages)
+        pending = list(range(len(messages)))
+        if self.rules is not None:
+            start = time.perf_counter()
+            pending = []
+            for i, message in enumerate(messages):
+                decision = self.rules.decide(message.answer or "")
+                if decision is None:
+                    pending.append(i)
+                    continue
+                verdict, rule = decision
+                self.rule_hits[rule] = self.rule_hits.get(rule, 0) + 1
+                results[i] = ServiceCheckResult(
+                    safe=verdict == SAFE,
+                    score=0.0 if verdict == SAFE else 1.0,
+                    masked_answer=message.answer,
+                    question=message.question,
+                    stage="rules",
+                )
+            self._record("rules", len(messages) - len(pending), start)
+        if pending:
+            start = time.perf_counter()
+            # hold one model version for the whole batch, even if it is swapped
+            loaded = self._loaded()
+            texts = [messages[i].answer or "" for i in pending]
+            probas = loaded.model.predict_proba(texts)[:, 1]
+            for i, proba in zip(pending, probas):
+                proba = float(proba)
+                label = 0 if proba >= 0.5 else 1
+                results[i] = ServiceCheckResult(
+                    safe=label,
+                    score=proba,
+                    masked_answer=messages[i].answer,
+                    question=messages[i].question,
+                    model_version=loaded.version,
+                    stage="model",
+                )
+            self._record("model", len(pending), start)
+        return results
+
+    def _record(self, stage: str, messages: int, start: float) -> None:
+        stats = self.stage_stats[stage]
+        stats["messages"] += messages
+        stats["seconds"] += time.perf_counter() - start
@@ -0,0 +1,328 @@
+import functools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+"""
+PICKLE-FREE ARTIFACT FOR THE AD-FILTER MODEL
+
+Модель ad-фильтра — это TfidfVectorizer + CalibratedClassifierCV(sigmoid) над
+линейным классификатором. Для инференса из неё нужны только массивы:
+
+- словарь TF-IDF (термин -> столбец) в виде хеш-таблицы с открытой адресацией
+  поверх склеенных UTF-8 байтов терминов;
+- вектор idf;
+- коэффициенты и свободные члены линейной модели для каждого фолда калибровки;
+- параметры сигмоид a и b для каждого фолда.
+
+Все массивы лежат в одном файле по выровненным смещениям и открываются через
+mmap без копирования, поэтому несколько воркеров на одном узле делят одну
+копию в page cache, а загрузка модели — это чтение заголовка. Формат файла:
+
+    MAGIC (8 байт) | длина заголовка (uint64 LE) | JSON-заголовок | массивы
+
+Скоринг пачки текстов — одна разреженная TF-IDF матрица и произведение на
+коэффициенты. Порядок операций повторяет scikit-learn (те же разреженные
+произведения scipy, `1 / (1 + exp(-x))` в калибровке), поэтому
+`predict_proba` совпадает с исходным пайплайном бит в бит.
+
+Экспорт: python -m repositories.ad_model_artifact models/ad_filter.pkl models/ad_filter.bin
+"""
+
+MAGIC = b"ADLIN\x00\x01\x00"
+ALIGNMENT = 64
+
+
+def is_artifact(path: str) -> bool:
+    """Проверяет по сигнатуре, что файл — артефакт в этом формате, а не pickle."""
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def _term_hash(term: bytes) -> int:
+    return zlib.crc32(term)
+
+
+def _build_vocabulary(terms: List[str]) -> Dict[str, np.ndarray]:
+    """Склеивает термины в один блоб и строит хеш-таблицу с линейным пробированием."""
+    encoded = [term.encode("utf-8") for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    offsets[1:] = np.cumsum([len(term) for term in encoded])
+    size = 1
+    while size < 2 * max(1, len(encoded)):
+        size *= 2
+    table = np.full(size, -1, dtype="<i4")
+    for column, term in enumerate(encoded):
+        slot = _term_hash(term) & (size - 1)
+        while table[slot] >= 0:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = column
+    return {
+        "vocab_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "vocab_offsets": offsets,
+        "vocab_table": table,
+    }
+
+
+def _extract(pipeline) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Достаёт из пайплайна параметры анализатора и массивы модели."""
+    vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[-1][1]
+    params = vectorizer.get_params()
+    unsupported = {
+        "analyzer": "word",
+        "binary": False,
+        "preprocessor": None,
+        "tokenizer": None,
+        "stop_words": None,
+        "strip_accents": None,
+        "sublinear_tf": False,
+        "use_idf": True,
+    }
+    for name, expected in unsupported.items():
+        if params[name] != expected:
+            raise ValueError(
+                f"Unsupported TfidfVectorizer option {name}={params[name]!r}"
+            )
+    if params["norm"] not in ("l2", None):
+        raise ValueError(f"Unsupported TfidfVectorizer norm {params['norm']!r}")
+    if getattr(classifier, "method", None) != "sigmoid":
+        raise ValueError("Only CalibratedClassifierCV(method='sigmoid') is supported")
+    if len(classifier.classes_) != 2:
+        raise ValueError("Only binary classifiers are supported")
+
+    terms = [""] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+    folds = classifier.calibrated_classifiers_
+    arrays = {
+        "idf": np.asarray(vectorizer.idf_, dtype="<f8"),
+        "coef": np.stack([f.estimator.coef_.ravel() for f in folds]).astype("<f8"),
+        "intercept": np.array(
+            [float(np.ravel(f.estimator.intercept_)[0]) for f in folds], dtype="<f8"
+        ),
+        "calib_a": np.array([float(f.calibrators[0].a_) for f in folds], dtype="<f8"),
+        "calib_b": np.array([float(f.calibrators[0].b_) for f in folds], dtype="<f8"),
+        **_build_vocabulary(terms),
+    }
+    analyzer = {
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "ngram_range": list(params["ngram_range"]),
+        "norm": params["norm"],
+    }
+    return {"analyzer": analyzer, "classes": classifier.classes_.tolist()}, arrays
+
+
+def export_ad_model(pipeline, path: str) -> None:
+    """Сохраняет обученный пайплайн ad-фильтра в mmap-формат.
+
+    Файл пишется во временный и подменяется через `os.replace`, поэтому
+    реестр моделей никогда не увидит его наполовину записанным.
+
+    Args:
+        pipeline: Pipeline([TfidfVectorizer, CalibratedClassifierCV]).
+        path: Куда сохранить артефакт.
+    """
+    header, arrays = _extract(pipeline)
+    header["arrays"] = {}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    # уникальный временный файл: параллельные экспорты не пишут в один и тот же
+    directory, filename = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{filename}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<Q", len(header_bytes)))
+            file.write(header_bytes)
+            for name, array in arrays.items():
+                file.seek(data_start + header["arrays"][name]["offset"])
+                file.write(np.ascontiguousarray(array).tobytes())
+            file.truncate(data_start + offset)
+        # mkstemp создаёт файл 0600, а артефакт читают и другие воркеры
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class LinearAdModel:
+    """Ad-фильтр, читаемый из mmap-артефакта, с интерфейсом `predict_proba`.
+
+    Args:
+        path: Путь к артефакту.
+        term_cache_size: Размер LRU-кеша "термин -> столбец" поверх хеш-таблицы.
+
+    Attributes:
+        classes_: Метки классов в порядке столбцов `predict_proba`.
+    """
+
+    def __init__(self, path: str, term_cache_size: int = 1 << 16):
+        if sys.byteorder != "little":
+            raise RuntimeError("The ad model artifact is little-endian only")
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an ad model artifact")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_end = len(MAGIC) + 8 + header_len
+        header = json.loads(self._mmap[len(MAGIC) + 8 : header_end].decode("utf-8"))
+        data_start = -(-header_end // ALIGNMENT) * ALIGNMENT
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[name] = np.frombuffer(
+                self._mmap, dtype, count, data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        self.idf = arrays["idf"]
+        self.coef = arrays["coef"]
+        self.intercept = [float(x) for x in arrays["intercept"]]
+        self.calib_a = [float(x) for x in arrays["calib_a"]]
+        self.calib_b = [float(x) for x in arrays["calib_b"]]
+        # memoryview-индексация в разы быстрее скалярного доступа к numpy
+        self._blob = memoryview(arrays["vocab_blob"])
+        self._offsets = memoryview(arrays["vocab_offsets"])
+        self._table = memoryview(arrays["vocab_table"])
+        self._mask = len(arrays["vocab_table"]) - 1
+
+        analyzer = header["analyzer"]
+        self.lowercase = analyzer["lowercase"]
+        self.token_regex = re.compile(analyzer["token_pattern"])
+        self.ngram_range = tuple(analyzer["ngram_range"])
+        self.norm = analyzer["norm"]
+        self.classes_ = np.array(header["classes"])
+        self.column = functools.lru_cache(maxsize=term_cache_size)(self._find_column)
+
+    def _find_column(self, term: str) -> int:
+        """Столбец термина в TF-IDF или -1, если термина нет в словаре."""
+        key = term.encode("utf-8")
+        table, offsets, blob, mask = self._table, self._offsets, self._blob, self._mask
+        slot = _term_hash(key) & mask
+        while True:
+            column = table[slot]
+            if column < 0:
+                return -1
+            if blob[offsets[column] : offsets[column + 1]] == key:
+                return column
+            slot = (slot + 1) & mask
+
+    def analyze(self, text: str) -> List[str]:
+        """Токены и n-граммы, как у TfidfVectorizer(analyzer="word")."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_regex.findall(text)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        original = tokens
+        if min_n == 1:
+            tokens = list(original)
+            min_n += 1
+        else:
+            tokens = []
+        for n in range(min_n, min(max_n + 1, len(original) + 1)):
+            for i in range(len(original) - n + 1):
+                tokens.append(" ".join(original[i : i + n]))
+        return tokens
+
+    def transform(self, texts: List[str]) -> sp.csr_matrix:
+        """TF-IDF матрица текстов, как у TfidfVectorizer.transform."""
+        indptr = [0]
+        indices: List[int] = []
+        counts: List[int] = []
+        for text in texts:
+            row: Dict[int, int] = {}
+            for term, count in Counter(self.analyze(text)).items():
+                column = self.column(term)
+                if column >= 0:
+                    row[column] = count
+            for column in sorted(row):
+                indices.append(column)
+                counts.append(row[column])
+            indptr.append(len(indices))
+        indices_array = np.array(indices, dtype=np.int64)
+        data = np.array(counts, dtype=np.float64)
+        data *= self.idf[indices_array]
+        X = sp.csr_matrix(
+            (data, indices_array, np.array(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.idf)),
+        )
+        if self.norm == "l2":
+            # csr_matvec суммирует квадраты строки последовательно, как sklearn
+            squares = sp.csr_matrix((data * data, X.indices, X.indptr), shape=X.shape)
+            norms = np.sqrt(squares @ np.ones(X.shape[1]))
+            norms[norms == 0.0] = 1.0
+            X.data /= np.repeat(norms, np.diff(X.indptr))
+        return X
+
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        """Выходы линейной модели каждого фолда калибровки: (тексты, фолды)."""
+        X = self.transform(texts)
+        # по фолду за раз: строки coef непрерывны, копии транспонированной
+        # матрицы не нужно, а суммы те же, что в LinearSVC.decision_function
+        return np.stack(
+            [X @ coef + b for coef, b in zip(self.coef, self.intercept)], axis=1
+        )
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Вероятности классов, как у CalibratedClassifierCV.predict_proba."""
+        proba = np.zeros((len(texts), 2), dtype=np.float64)
+        if not texts:
+            return proba
+        decisions = self.decision_function(texts).tolist()
+        for row, fold_decisions in enumerate(decisions):
+            negative = positive = 0.0
+            for df, a, b in zip(fold_decisions, self.calib_a, self.calib_b):
+                # expit(-(a * df + b)) по каждому фолду, затем среднее по фолдам
+                fold_positive = 1 / (1 + math.exp(a * df + b))
+                negative += 1.0 - fold_positive
+                positive += fold_positive
+            proba[row, 0] = negative / len(self.calib_a)
+            proba[row, 1] = positive / len(self.calib_a)
+        return proba
+
+
+def load_ad_model(path: str):
+    """Загружает ad-фильтр: mmap-артефакт или (по старинке) pickle."""
+    if is_artifact(path):
+        return LinearAdModel(path)
+    import pickle
+
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+if __name__ == "__main__":
+    source: Optional[str] = sys.argv[1] if len(sys.argv) > 1 else None
+    target: Optional[str] = sys.argv[2] if len(sys.argv) > 2 else None
+    if source is None or target is None:
+        sys.exit(
+            "usage: python -m repositories.ad_model_artifact SOURCE.pkl TARGET.bin"
+        )
+    export_ad_model(load_ad_model(source), target)
+    print(f"Exported {source} -> {target}")
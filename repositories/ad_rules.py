@@ -0,0 +1,139 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+"""
+RULE ENGINE FOR THE AD FILTER
+
+Быстрый pre-filter перед TF-IDF классификатором. Правила — это данные
+(список `AdRule` или JSON-файл с тем же набором полей), а не код:
+
+- unsafe-правила ищутся в ответе (`search`). Все они компилируются в одну
+  регулярку с именованной группой на правило, поэтому проверка — один проход
+  по тексту, а `lastgroup` называет сработавшее правило. Флаги в регулярках
+  задаются только локально: `(?i:...)`;
+- safe-правила проверяются, только если ни одно unsafe-правило не сработало:
+  ответ должен целиком совпасть с `pattern` (`fullmatch`), быть не длиннее
+  `max_words` слов и не содержать `exclude`.
+
+Если не сработало ни одно правило, решение остаётся за классификатором.
+"""
+
+SAFE = "safe"
+UNSAFE = "unsafe"
+
+WORD_REGEX = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class AdRule:
+    """Одно правило pre-filter-а.
+
+    Attributes:
+        name: Имя правила; попадает в статистику срабатываний.
+        verdict: "unsafe" (реклама) или "safe" (точно не реклама).
+        pattern: Регулярка. Для unsafe ищется в тексте, для safe должна
+            совпасть со всем текстом.
+        max_words: Только для safe: максимальная длина ответа в словах.
+        exclude: Только для safe: если регулярка найдена, правило не действует.
+    """
+
+    name: str
+    verdict: str
+    pattern: str
+    max_words: Optional[int] = None
+    exclude: Optional[str] = None
+
+
+DEFAULT_RULES = [
+    AdRule("url", UNSAFE, r"(?i:\bhttps?://|\bwww\.)\S+"),
+    AdRule("html_link", UNSAFE, r"(?i:<a\s[^>]*\bhref\s*=)"),
+    AdRule("messenger_link", UNSAFE, r"(?i:\b(?:t\.me|wa\.me|vk\.com|vk\.cc)/)\S+"),
+    AdRule(
+        "domain",
+        UNSAFE,
+        r"(?i:(?<![@\w.-])[a-z0-9][a-z0-9-]{1,62}"
+        r"\.(?:ru|com|net|org|io|me|su|info|biz|shop|store|online|рф)\b)",
+    ),
+    AdRule(
+        "promo_code",
+        UNSAFE,
+        r"(?i:\b(?:промо-?код\w*|купон\w*|promo\s?code|coupon))\W{0,3}"
+        r"(?=[A-Za-z0-9_-]*\d|[A-Z0-9_-]{4,}\b)[A-Za-z0-9_-]{3,}",
+    ),
+    AdRule(
+        "short_plain_answer",
+        SAFE,
+        r"[\s\"'«(]*(?:[^\W\d_]+(?:[\s,.!?;:()\"'«»—-]+[^\W\d_]+)*)?"
+        r"[\s.!?…)\"'»]*",
+        max_words=12,
+        exclude=(
+            r"(?i)куп[иию]|скидк|акци[яи]|бесплатн|подпис|закаж|выгодн|распродаж"
+            r"|промо|реклам|\bbuy\b|discount|\bsale\b|\bfree\b|subscribe|\border\b"
+        ),
+    ),
+]
+
+
+def load_ad_rules(path: str) -> List[AdRule]:
+    """Читает правила из JSON: список объектов с полями `AdRule`."""
+    with open(path, "r", encoding="utf-8") as file:
+        return [AdRule(**rule) for rule in json.load(file)]
+
+
+class AdRuleEngine:
+    """Скомпилированный набор правил ad-фильтра.
+
+    Args:
+        rules: Правила; по умолчанию `DEFAULT_RULES`.
+    """
+
+    def __init__(self, rules: Optional[Iterable[AdRule]] = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        for rule in self.rules:
+            if rule.verdict not in (SAFE, UNSAFE):
+                raise ValueError(
+                    f"Unknown verdict {rule.verdict!r} in rule {rule.name}"
+                )
+        unsafe = [rule for rule in self.rules if rule.verdict == UNSAFE]
+        self._unsafe_names = [rule.name for rule in unsafe]
+        self._unsafe = (
+            re.compile(
+                "|".join(f"(?P<r{i}>{rule.pattern})" for i, rule in enumerate(unsafe))
+            )
+            if unsafe
+            else None
+        )
+        self._safe = [
+            (
+                rule,
+                re.compile(rule.pattern),
+                re.compile(rule.exclude) if rule.exclude else None,
+            )
+            for rule in self.rules
+            if rule.verdict == SAFE
+        ]
+
+    def decide(self, text: str) -> Optional[Tuple[str, str]]:
+        """Решение по тексту без модели.
+
+        Returns:
+            (verdict, имя правила) или None, если решать должен классификатор.
+        """
+        if self._unsafe is not None:
+            match = self._unsafe.search(text)
+            if match is not None:
+                return UNSAFE, self._unsafe_names[int(match.lastgroup[1:])]
+        words = None
+        for rule, pattern, exclude in self._safe:
+            if rule.max_words is not None:
+                if words is None:
+                    words = len(WORD_REGEX.findall(text))
+                if words > rule.max_words:
+                    continue
+            if exclude is not None and exclude.search(text):
+                continue
+            if pattern.fullmatch(text):
+                return SAFE, rule.name
+        return None
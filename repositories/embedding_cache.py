@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+"""
+LRU CACHE FOR TEXT EMBEDDINGS
+
+Бот снова и снова получает одни и те же вопросы, поэтому эмбеддинги
+кешируются. Ключ — blake2b-хеш текста со схлопнутыми пробелами, так что
+память занимают только 16-байтовые ключи и сами векторы. Другой нормализации
+(регистр, Unicode NFKC) нет: токенизатор различает такие тексты, и их
+эмбеддинги разные.
+Размер кеша ограничен, старые записи вытесняются по LRU.
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Схлопывает пробелы: токенизатор делит текст по пробелам и их не видит."""
+    return " ".join(text.split())
+
+
+def text_key(text: str, namespace: str = "") -> bytes:
+    """Ключ кеша: blake2b-хеш нормализованного текста.
+
+    Args:
+        text: Текст.
+        namespace: Например, версия модели: у разных версий разные ключи.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if namespace:
+        digest.update(namespace.encode("utf-8") + b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """Потокобезопасный LRU-кеш эмбеддингов.
+
+    Attributes:
+        max_size: Максимальное число записей; 0 отключает кеш.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(0, max_size)
+        self._entries: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str) -> Optional[Any]:
+        """Эмбеддинг текста или None; попадание поднимает запись в начало LRU."""
+        key = text_key(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: Any) -> None:
+        if not self.max_size:
+            return
+        key = text_key(text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Сбрасывает записи (например, после смены версии модели)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,204 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from repositories.embedding_cache import text_key
+
+"""
+PERSISTENT MEMORY-MAPPED EMBEDDING STORE
+
+Дисковый кеш эмбеддингов float32, общий для всех реплик воркера на узле и
+переживающий рестарты. Два файла:
+
+- `<path>.idx` — заголовок и хеш-индекс. Индекс set-associative: ключ
+  (16 байт blake2b от версии модели и нормализованного текста) попадает в
+  один набор из `ways` слотов. Слот: ключ, счётчик seq и время последнего
+  обращения;
+- `<path>.vec` — векторы фиксированной ширины, слот i хранит строку i.
+
+Размер ограничен ёмкостью, заданной при создании: при записи в заполненный
+набор вытесняется слот, к которому дольше всего не обращались.
+
+Запись сериализуется `flock` на `.idx` (между процессами) и мьютексом
+(между потоками). Чтение идёт без блокировок, по схеме seqlock: запись
+делает seq нечётным, пишет вектор и ключ, затем делает seq чётным; читатель
+сверяет seq до и после копирования вектора и при расхождении считает это
+промахом. Порядок записей в общую память гарантирован на x86 (TSO).
+Нечётный seq под блокировкой записи бывает только у слота, писатель которого
+упал посреди записи: такой слот считается свободным и перезаписывается.
+
+Пространство имён (бэкенд и версия модели) входит в ключ, поэтому векторы
+torch, onnx и onnx-int8 и разных версий не смешиваются, а
+старые просто вытесняются со временем — после деплоя новой версии реплики
+со старой моделью продолжают пользоваться своими записями.
+"""
+
+MAGIC = b"EMBSTOR1"
+HEADER = struct.Struct("<8sIII")  # magic, dim, n_sets, ways
+HEADER_SIZE = 64
+SLOT_DTYPE = np.dtype([("key", "V16"), ("seq", "<u8"), ("tick", "<u8")])
+
+
+class EmbeddingStore:
+    """Общий для процессов mmap-кеш эмбеддингов.
+
+    Файлы создаются при первой записи: размерность берётся из первого вектора.
+
+    Attributes:
+        path: Префикс путей `.idx` и `.vec`.
+        capacity: Сколько векторов хранить (при создании файлов).
+        ways: Ассоциативность индекса.
+    """
+
+    def __init__(self, path: str, capacity: int = 100_000, ways: int = 8):
+        self.path = path
+        self.capacity = max(1, capacity)
+        self.ways = max(1, ways)
+        self.idx_path = f"{path}.idx"
+        self.vec_path = f"{path}.vec"
+        self._lock = threading.Lock()
+        self._idx_file = None
+        self._slots = None
+        self._vectors = None
+        self.dim: Optional[int] = None
+        self.n_sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ─── files ────────────────────────────────────────────────────────────
+
+    def _map(self) -> bool:
+        """Отображает существующие файлы в память; False, если их ещё нет."""
+        if self._slots is not None:
+            return True
+        if not os.path.exists(self.idx_path):
+            return False
+        idx_file = open(self.idx_path, "r+b")
+        idx_map = mmap.mmap(idx_file.fileno(), 0)
+        magic, dim, n_sets, ways = HEADER.unpack_from(idx_map, 0)
+        if magic != MAGIC:
+            idx_file.close()
+            raise ValueError(f"{self.idx_path} is not an embedding store index")
+        with open(self.vec_path, "r+b") as vec_file:
+            vec_map = mmap.mmap(vec_file.fileno(), 0)
+        self._slots = np.frombuffer(
+            idx_map, SLOT_DTYPE, n_sets * ways, HEADER_SIZE
+        ).reshape(n_sets, ways)
+        self._vectors = np.frombuffer(vec_map, np.float32).reshape(n_sets, ways, dim)
+        self._idx_file = idx_file
+        self.dim, self.n_sets, self.ways = dim, n_sets, ways
+        return True
+
+    def _create(self, dim: int) -> None:
+        """Создаёт пустые файлы; вызывается под блокировкой каталога."""
+        n_sets = -(-self.capacity // self.ways)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.vec_path, "wb") as vec_file:
+            vec_file.truncate(n_sets * self.ways * dim * 4)
+        # индекс появляется последним и атомарно: его наличие значит "готово"
+        tmp_path = f"{self.idx_path}.tmp"
+        with open(tmp_path, "wb") as idx_file:
+            idx_file.write(HEADER.pack(MAGIC, dim, n_sets, self.ways))
+            idx_file.truncate(HEADER_SIZE + n_sets * self.ways * SLOT_DTYPE.itemsize)
+        os.replace(tmp_path, self.idx_path)
+
+    def _open_for_write(self, dim: int) -> bool:
+        if self._map():
+            return True
+        lock_path = f"{self.path}.lock"
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.idx_path):
+                    self._create(dim)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return self._map()
+
+    # ─── lookups ──────────────────────────────────────────────────────────
+
+    def _set(self, key: bytes) -> int:
+        return int.from_bytes(key[:8], "little") % self.n_sets
+
+    def get(self, text: str, namespace: str = "") -> Optional[np.ndarray]:
+        """Вектор текста или None. Не блокирует и не ждёт писателей."""
+        if not self._map():
+            self.misses += 1
+            return None
+        key = text_key(text, namespace)
+        slots = self._slots[self._set(key)]
+        vectors = self._vectors[self._set(key)]
+        for way in range(self.ways):
+            seq = int(slots["seq"][way])
+            if seq == 0 or seq & 1 or slots["key"][way].tobytes() != key:
+                continue
+            vector = np.array(vectors[way])
+            if int(slots["seq"][way]) != seq:
+                break  # слот перезаписали, пока мы читали
+            # гонка двух читателей за tick безвредна: это лишь приоритет LRU
+            slots["tick"][way] = int(time.time())
+            self.hits += 1
+            return vector
+        self.misses += 1
+        return None
+
+    def put(self, text: str, vector, namespace: str = "") -> bool:
+        """Сохраняет вектор; False, если размерность не совпала с хранилищем."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if not self._open_for_write(len(vector)):
+            return False
+        if len(vector) != self.dim:
+            return False
+        key = text_key(text, namespace)
+        set_index = self._set(key)
+        slots, vectors = self._slots[set_index], self._vectors[set_index]
+        with self._lock:
+            fcntl.flock(self._idx_file, fcntl.LOCK_EX)
+            try:
+                free = None
+                for way in range(self.ways):
+                    seq = int(slots["seq"][way])
+                    # нечётный seq: запись оборвалась, слот недописан
+                    if seq and not seq & 1 and slots["key"][way].tobytes() == key:
+                        slots["tick"][way] = int(time.time())
+                        return True
+                    if free is None and (seq == 0 or seq & 1):
+                        free = way
+                if free is None:
+                    free = int(np.argmin(slots["tick"]))
+                    self.evictions += 1
+                # начинаем с нечётного: чётный seq + 1, у оборванной записи — seq
+                seq = int(slots["seq"][free]) | 1
+                slots["seq"][free] = seq
+                vectors[free] = vector
+                slots["key"][free] = np.void(key)
+                slots["tick"][free] = int(time.time())
+                slots["seq"][free] = seq + 1
+            finally:
+                fcntl.flock(self._idx_file, fcntl.LOCK_UN)
+        return True
+
+    def __len__(self) -> int:
+        if not self._map():
+            return 0
+        seq = self._slots["seq"]
+        return int(np.count_nonzero((seq != 0) & (seq % 2 == 0)))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self),
+            "capacity": self.n_sets * self.ways if self.n_sets else self.capacity,
+            "evictions": self.evictions,
+        }
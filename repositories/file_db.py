@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Optional
 from pymongo import MongoClient, collection
@@ -6,6 +7,17 @@ from use_cases.ports.db_connector import IDBRepository
 from entities.data import FinalCheckResult
 
 
+def result_update(doc: dict) -> dict:
+    """
+    Update-документ для upsert результата по request_id.
+    Деградированный результат (по таймауту) пишется только если результата ещё
+    нет: повторно доставленная проверка не должна затирать полный результат.
+    """
+    if doc["result"].get("degraded"):
+        return {"$setOnInsert": doc}
+    return {"$set": doc}
+
+
 class MongoResultRepository(IDBRepository):
     """
     Репозиторий, сохраняющий FinalCheckResult в MongoDB.
@@ -22,7 +34,6 @@ class MongoResultRepository(IDBRepository):
         выбирает базу и коллекцию.
         """
         uri = mongo_uri or os.getenv("MONGO_URI")
-        print(uri)
         if not uri:
             raise ValueError(
                 "Mongo URI must be provided via argument or MONGO_URI env var"
@@ -39,10 +50,11 @@ class MongoResultRepository(IDBRepository):
         self.db = self.client[db_name]
         self.collection: collection.Collection = self.db[collection_name]
 
-    def save(self, request_id: str, final_result: FinalCheckResult) -> None:
+    async def save(self, request_id: str, final_result: FinalCheckResult) -> None:
         """
         Сохраняет или обновляет документ с ключом request_id.
         Поля модели FinalCheckResult будут сохранены как вложенное JSON-поле result.
+        Запись выполняется в пуле потоков, чтобы не блокировать event loop.
         """
         doc = {
             "request_id": request_id,
@@ -50,11 +62,11 @@ class MongoResultRepository(IDBRepository):
         }
 
         try:
-            self.collection.update_one(
+            await asyncio.to_thread(
+                self.collection.update_one,
                 {"request_id": request_id},
-                {"$set": doc},
+                result_update(doc),
                 upsert=True,
             )
-            print(f"[mongo] Saved result for request_id={request_id}")
         except OperationFailure as e:
             raise RuntimeError("Failed to write to MongoDB") from e
@@ -0,0 +1,382 @@
+import inspect
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+
+import numpy as np
+import torch
+from transformers import (
+    AutoConfig,
+    AutoModelForSequenceClassification,
+    AutoModelForTokenClassification,
+    AutoTokenizer,
+    pipeline,
+)
+
+"""
+INFERENCE BACKENDS FOR THE TRANSFORMER REPOSITORIES
+
+Один интерфейс загрузки моделей для SafetyClassifierRepository (классификатор
+последовательностей), PIIDetectorRepository (NER) и OffTopicRepository
+(эмбеддинги). Бэкенд выбирается через `INFERENCE_BACKEND`:
+
+- "torch"     — eager PyTorch fp32, как раньше;
+- "onnx"      — граф экспортируется в ONNX один раз, дальше ONNX Runtime на CPU;
+- "onnx-int8" — то же, но веса динамически квантуются в int8.
+
+Экспортированные графы кешируются в `ONNX_CACHE_DIR`, поэтому экспорт
+выполняется только при первом запуске. Графы пишутся во временный файл и
+подменяются через `os.replace`: несколько воркеров, стартующих одновременно,
+могут экспортировать модель параллельно, но никто не загрузит недописанный.
+Пакеты `onnx`/`onnxruntime` нужны только ONNX-бэкендам и импортируются
+лениво, как и sentence-transformers (его нет в образах safety и pii).
+"""
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _write_atomically(path: str, write: Callable[[str], None]) -> None:
+    """Вызывает `write(tmp_path)` и атомарно переносит результат в `path`."""
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        # mkstemp создаёт файл 0600, а кеш читают и другие воркеры
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class InferenceBackend(ABC):
+    """Фабрика моделей для одного способа исполнения."""
+
+    name: str
+
+    @abstractmethod
+    def sequence_classifier(self, model_name: str):
+        """Модель, вызываемая как `model(**inputs).logits` (torch.Tensor)."""
+        ...
+
+    @abstractmethod
+    def token_classifier(self, model_name: str) -> Callable:
+        """NER с выходом как у `pipeline("ner")` без агрегации."""
+        ...
+
+    @abstractmethod
+    def sentence_encoder(self, model_name: str):
+        """Модель с методом `encode`, совместимым с SentenceTransformer."""
+        ...
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def sequence_classifier(self, model_name: str):
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        return model
+
+    def token_model(self, model_name: str):
+        model = AutoModelForTokenClassification.from_pretrained(model_name)
+        model.eval()
+        return model
+
+    def token_classifier(self, model_name: str) -> Callable:
+        return pipeline("ner", model=model_name)
+
+    def sentence_encoder(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+
+
+class OnnxModel:
+    """ONNX Runtime сессия с интерфейсом `model(**inputs).logits`."""
+
+    def __init__(self, path: str, config):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.config = config
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs) -> SimpleNamespace:
+        feed = {
+            name: np.asarray(inputs[name], dtype=np.int64)
+            for name in self.input_names
+            if name in inputs
+        }
+        (logits,) = self.session.run(["logits"], feed)
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+class OnnxTokenClassifier:
+    """NER поверх ONNX-модели; повторяет вывод `pipeline("ner")`."""
+
+    def __init__(self, tokenizer, model: OnnxModel):
+        self.tokenizer = tokenizer
+        self.model = model
+
+    def __call__(self, texts, batch_size: int = 1):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        results = []
+        for start in range(0, len(batch), max(1, batch_size)):
+            results.extend(self._run(batch[start : start + batch_size]))
+        return results[0] if single else results
+
+    def _run(self, texts: List[str]) -> List[List[dict]]:
+        enc = self.tokenizer(
+            texts,
+            return_tensors="np",
+            truncation=True,
+            padding=True,
+            return_offsets_mapping=True,
+            return_special_tokens_mask=True,
+        )
+        logits = self.model(**enc).logits.numpy()
+        shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs = shifted / shifted.sum(axis=-1, keepdims=True)
+        id2label = self.model.config.id2label
+        output = []
+        for row, text_probs in enumerate(probs):
+            entities = []
+            for idx, token_probs in enumerate(text_probs):
+                if (
+                    enc["special_tokens_mask"][row][idx]
+                    or not enc["attention_mask"][row][idx]
+                ):
+                    continue
+                label_id = int(token_probs.argmax())
+                label = id2label[label_id]
+                if label == "O":
+                    continue
+                start, end = enc["offset_mapping"][row][idx]
+                token_id = int(enc["input_ids"][row][idx])
+                # как pipeline: для неизвестного токена — исходный фрагмент текста
+                word = (
+                    texts[row][start:end]
+                    if token_id == self.tokenizer.unk_token_id
+                    else self.tokenizer.convert_ids_to_tokens(token_id)
+                )
+                entities.append(
+                    {
+                        "entity": label,
+                        "score": float(token_probs[label_id]),
+                        "index": idx,
+                        "word": word,
+                        "start": int(start),
+                        "end": int(end),
+                    }
+                )
+            output.append(entities)
+        return output
+
+
+class OnnxBackend(InferenceBackend):
+    """Экспортирует модели в ONNX (опционально int8) и исполняет их в ONNX Runtime."""
+
+    def __init__(self, cache_dir: str = "models/onnx", quantize: bool = False):
+        self.cache_dir = cache_dir
+        self.quantize = quantize
+        self.name = "onnx-int8" if quantize else "onnx"
+
+    def _model_dir(self, model_name: str) -> str:
+        return os.path.join(self.cache_dir, re.sub(r"[^\w.-]+", "__", model_name))
+
+    def _export(self, model_name: str, auto_model_cls) -> str:
+        """Экспортирует модель в ONNX (и int8-копию), если её ещё нет в кеше."""
+        model_dir = self._model_dir(model_name)
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        int8_path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(fp32_path):
+            os.makedirs(model_dir, exist_ok=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = auto_model_cls.from_pretrained(model_name)
+            model.eval()
+            sample = tokenizer(["export sample"], return_tensors="pt")
+            # ONNX inputs follow the order of forward() arguments, not of the dict
+            input_names = [
+                name
+                for name in inspect.signature(model.forward).parameters
+                if name in sample
+            ]
+            axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+            logits_axes = {0: "batch"}
+            if auto_model_cls is AutoModelForTokenClassification:
+                logits_axes[1] = "sequence"
+            _write_atomically(
+                fp32_path,
+                lambda tmp_path: torch.onnx.export(
+                    model,
+                    (dict(sample),),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=["logits"],
+                    dynamic_axes={**axes, "logits": logits_axes},
+                    opset_version=17,
+                    dynamo=False,
+                ),
+            )
+        if self.quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            _write_atomically(
+                int8_path,
+                lambda tmp_path: quantize_dynamic(
+                    fp32_path, tmp_path, weight_type=QuantType.QInt8
+                ),
+            )
+        return int8_path if self.quantize else fp32_path
+
+    def sequence_classifier(self, model_name: str) -> OnnxModel:
+        path = self._export(model_name, AutoModelForSequenceClassification)
+        return OnnxModel(path, AutoConfig.from_pretrained(model_name))
+
+    def token_model(self, model_name: str) -> OnnxModel:
+        path = self._export(model_name, AutoModelForTokenClassification)
+        return OnnxModel(path, AutoConfig.from_pretrained(model_name))
+
+    def token_classifier(self, model_name: str) -> Callable:
+        return OnnxTokenClassifier(
+            AutoTokenizer.from_pretrained(model_name), self.token_model(model_name)
+        )
+
+    def sentence_encoder(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        # sentence-transformers умеет экспортировать себя в ONNX (нужен optimum)
+        model_dir = self._model_dir(model_name)
+        fp32_file = os.path.join("onnx", "model.onnx")
+        int8_file = os.path.join("onnx", "model.int8.onnx")
+        if not os.path.exists(os.path.join(model_dir, fp32_file)):
+            os.makedirs(os.path.dirname(model_dir) or ".", exist_ok=True)
+            staging = tempfile.mkdtemp(
+                dir=os.path.dirname(model_dir) or ".", prefix=".export."
+            )
+            try:
+                SentenceTransformer(model_name, backend="onnx").save_pretrained(staging)
+                files = [
+                    os.path.relpath(os.path.join(root, name), staging)
+                    for root, _, names in os.walk(staging)
+                    for name in names
+                ]
+                # граф переносится последним: его наличие означает, что всё на месте
+                files.sort(key=lambda rel: rel == fp32_file)
+                for rel in files:
+                    target = os.path.join(model_dir, rel)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    _write_atomically(
+                        target,
+                        lambda tmp_path, rel=rel: shutil.copyfile(
+                            os.path.join(staging, rel), tmp_path
+                        ),
+                    )
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        if self.quantize and not os.path.exists(os.path.join(model_dir, int8_file)):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            _write_atomically(
+                os.path.join(model_dir, int8_file),
+                lambda tmp_path: quantize_dynamic(
+                    os.path.join(model_dir, fp32_file),
+                    tmp_path,
+                    weight_type=QuantType.QInt8,
+                ),
+            )
+        return SentenceTransformer(
+            model_dir,
+            backend="onnx",
+            model_kwargs={"file_name": int8_file if self.quantize else fp32_file},
+        )
+
+
+def get_backend(
+    name: str = "torch", cache_dir: str = "models/onnx"
+) -> InferenceBackend:
+    """Создаёт бэкенд по имени из настроек (`INFERENCE_BACKEND`)."""
+    if name == "torch":
+        return TorchBackend()
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(cache_dir=cache_dir, quantize=name == "onnx-int8")
+    raise ValueError(f"Unknown inference backend {name!r}, expected one of {BACKENDS}")
+
+
+def score_drift(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Расхождение выходов двух бэкендов на одних и тех же входах."""
+    diff = np.abs(np.asarray(reference, dtype=np.float64) - np.asarray(candidate))
+    return {
+        "max_abs_drift": float(diff.max()) if diff.size else 0.0,
+        "mean_abs_drift": float(diff.mean()) if diff.size else 0.0,
+    }
+
+
+def check_parity(
+    kind: str,
+    model_name: str,
+    texts: List[str],
+    backend: InferenceBackend,
+    reference: Optional[InferenceBackend] = None,
+) -> dict:
+    """Сравнивает выход бэкенда с torch-моделью на списке текстов.
+
+    Args:
+        kind: "sequence" (сигмоиды классификатора), "token" (softmax по токенам
+            NER) или "sentence" (эмбеддинги).
+        model_name: Имя модели на HuggingFace Hub или локальный путь.
+        texts: Тексты для сравнения.
+        backend: Проверяемый бэкенд.
+        reference: Эталон; по умолчанию TorchBackend.
+
+    Returns:
+        dict: max_abs_drift, mean_abs_drift и число текстов.
+    """
+    reference = reference or TorchBackend()
+    if kind == "sentence":
+        ref = reference.sentence_encoder(model_name).encode(texts)
+        cand = backend.sentence_encoder(model_name).encode(texts)
+        return {**score_drift(ref, cand), "texts": len(texts)}
+
+    if kind == "sequence":
+        load = lambda b: b.sequence_classifier(model_name)  # noqa: E731
+        activation = torch.sigmoid
+    elif kind == "token":
+        load = lambda b: b.token_model(model_name)  # noqa: E731
+        activation = lambda logits: torch.softmax(logits, dim=-1)  # noqa: E731
+    else:
+        raise ValueError(f"Unknown parity kind {kind!r}")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    ref_model, cand_model = load(reference), load(backend)
+    drifts = []
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", truncation=True)
+        with torch.no_grad():
+            ref = activation(ref_model(**inputs).logits).numpy()
+            cand = activation(cand_model(**inputs).logits).numpy()
+        drifts.append(score_drift(ref, cand))
+    return {
+        "max_abs_drift": max((d["max_abs_drift"] for d in drifts), default=0.0),
+        "mean_abs_drift": float(np.mean([d["mean_abs_drift"] for d in drifts]))
+        if drifts
+        else 0.0,
+        "texts": len(texts),
+    }
@@ -1,46 +1,344 @@
 # infrastructure/adapters/kafka_bus.py
+import asyncio
 import json
-from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
-from use_cases.ports.event_bus import EventBus, MessageHandler
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer, TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from aiokafka.admin import AIOKafkaAdminClient, NewTopic
+from aiokafka.errors import KafkaError
+from use_cases.ports.event_bus import (
+    EventBus,
+    DeliveryCallback,
+    MessageHandler,
+    OutgoingMessage,
+    PartitionsCallback,
+    PARTITION_HEADER,
+)
+from repositories.partition_dispatcher import PartitionDispatcher
 from entities.data import BotMessage
 
 
+class _RebalanceListener(ConsumerRebalanceListener):
+    def __init__(
+        self,
+        on_assign: Optional[PartitionsCallback],
+        on_revoke: Optional[PartitionsCallback],
+        before_revoke: Optional[Callable[[List[TopicPartition]], Awaitable]] = None,
+    ):
+        self.on_assign = on_assign
+        self.on_revoke = on_revoke
+        self.before_revoke = before_revoke
+
+    async def on_partitions_revoked(self, revoked):
+        if self.before_revoke is not None:
+            await self.before_revoke(list(revoked))
+        if self.on_revoke is not None:
+            await self.on_revoke(sorted(tp.partition for tp in revoked))
+
+    async def on_partitions_assigned(self, assigned):
+        if self.on_assign is not None:
+            await self.on_assign(sorted(tp.partition for tp in assigned))
+
+
 class KafkaEventBus(EventBus):
-    def __init__(self, brokers: str):
+    """Kafka-адаптер шины событий.
+
+    Args:
+        brokers: Адреса брокеров.
+        linger_ms: Сколько продюсер ждёт добора батча перед отправкой.
+        max_batch_size: Максимальный размер батча на партицию, в байтах.
+        compression_type: None, "gzip", "snappy", "lz4" или "zstd".
+        acks: 0, 1 или "all".
+    """
+
+    def __init__(
+        self,
+        brokers: str,
+        linger_ms: int = 0,
+        max_batch_size: int = 16384,
+        compression_type: Optional[str] = None,
+        acks: Union[int, str] = 1,
+    ):
         self.brokers = brokers
+        self.linger_ms = linger_ms
+        self.max_batch_size = max_batch_size
+        self.compression_type = compression_type or None
+        self.acks = int(acks) if str(acks).isdigit() else acks
         self._producer = None
+        self._starting: Optional[asyncio.Future] = None
+        self.delivered = 0
+        self.delivery_errors = 0
 
     async def _get_producer(self) -> AIOKafkaProducer:
         if self._producer is None:
-            p = AIOKafkaProducer(
-                bootstrap_servers=self.brokers,
-                value_serializer=lambda m: json.dumps(m).encode(),
-            )
-            await p.start()
-            self._producer = p
+            # concurrent first publishes share one producer
+            if self._starting is None:
+                self._starting = asyncio.ensure_future(self._start_producer())
+            try:
+                await asyncio.shield(self._starting)
+            except Exception:
+                self._starting = None
+                raise
         return self._producer
 
-    async def publish(self, topic: str, message: BotMessage, headers: dict) -> None:
+    async def _start_producer(self) -> None:
+        p = AIOKafkaProducer(
+            bootstrap_servers=self.brokers,
+            # None stays None: a tombstone for compacted topics
+            value_serializer=lambda m: None if m is None else json.dumps(m).encode(),
+            key_serializer=lambda k: None if k is None else k.encode(),
+            linger_ms=self.linger_ms,
+            max_batch_size=self.max_batch_size,
+            compression_type=self.compression_type,
+            acks=self.acks,
+        )
+        await p.start()
+        self._producer = p
+
+    async def close(self) -> None:
+        """Дожидается доставки отправленных сообщений и останавливает продюсер."""
+        if self._producer is not None:
+            await self._producer.stop()
+            self._producer = None
+            self._starting = None
+
+    async def _send(
+        self, topic: str, message: BotMessage, headers: dict, key: Optional[str]
+    ) -> asyncio.Future:
+        """Кладёт сообщение в буфер продюсера; ждёт, только если буфер полон."""
         producer = await self._get_producer()
-        await producer.send_and_wait(
+        return await producer.send(
             topic,
             message.model_dump(),
+            key=key,
             headers=[(k, str(v).encode()) for k, v in headers.items()],
         )
 
+    async def publish(
+        self,
+        topic: str,
+        message: BotMessage,
+        headers: dict,
+        key: Optional[str] = None,
+    ) -> None:
+        await (await self._send(topic, message, headers, key))
+
+    async def publish_many(self, messages: List[OutgoingMessage]) -> None:
+        """Отправляет сообщения одним заходом: они едут в общих батчах."""
+        futures = [await self._send(*m) for m in messages]
+        await asyncio.gather(*futures)
+
+    async def publish_nowait(
+        self,
+        topic: str,
+        message: BotMessage,
+        headers: dict,
+        key: Optional[str] = None,
+        on_delivery: Optional[DeliveryCallback] = None,
+    ) -> None:
+        """Не ждёт доставки: о результате сообщит `on_delivery`."""
+        future = await self._send(topic, message, headers, key)
+        future.add_done_callback(lambda f: self._delivered(f, topic, key, on_delivery))
+
+    def _delivered(
+        self,
+        future: asyncio.Future,
+        topic: str,
+        key: Optional[str],
+        on_delivery: Optional[DeliveryCallback],
+    ) -> None:
+        error = asyncio.CancelledError() if future.cancelled() else future.exception()
+        if error is None:
+            self.delivered += 1
+        else:
+            self.delivery_errors += 1
+            if on_delivery is None:
+                print(f"[kafka] Delivery to {topic} failed for key {key}: {error}")
+        if on_delivery is not None:
+            on_delivery(error)
+
+    async def publish_state(
+        self,
+        topic: str,
+        key: str,
+        value: Optional[dict],
+        partition: Optional[int] = None,
+    ) -> None:
+        """Пишет состояние по ключу в compacted-топик; None удаляет ключ."""
+        producer = await self._get_producer()
+        await producer.send_and_wait(topic, value, key=key, partition=partition)
+
+    async def read_state(self, topic: str, partition: int) -> Dict[str, dict]:
+        """Читает партицию compacted-топика до конца: последнее значение ключа."""
+        consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.brokers,
+            enable_auto_commit=False,
+            key_deserializer=lambda b: b.decode() if b is not None else None,
+            value_deserializer=lambda b: json.loads(b.decode()) if b else None,
+        )
+        await consumer.start()
+        state: Dict[str, dict] = {}
+        try:
+            tp = TopicPartition(topic, partition)
+            consumer.assign([tp])
+            await consumer.seek_to_beginning(tp)
+            end = (await consumer.end_offsets([tp]))[tp]
+            while await consumer.position(tp) < end:
+                batches = await consumer.getmany(tp, timeout_ms=1000)
+                for record in batches.get(tp, []):
+                    if record.value is None:
+                        state.pop(record.key, None)
+                    else:
+                        state[record.key] = record.value
+        finally:
+            await consumer.stop()
+        return state
+
+    async def ensure_topic(
+        self,
+        topic: str,
+        partitions: int,
+        compact: bool = False,
+        retention_ms: Optional[int] = None,
+    ) -> None:
+        """Создаёт топик с нужным числом партиций, если его ещё нет.
+
+        С `compact` и `retention_ms` ключи, которые не обновлялись дольше
+        `retention_ms`, удаляются целиком (cleanup.policy=compact,delete).
+        """
+        admin = AIOKafkaAdminClient(bootstrap_servers=self.brokers)
+        await admin.start()
+        try:
+            if topic in await admin.list_topics():
+                return
+            configs = None
+            if compact:
+                configs = {"cleanup.policy": "compact"}
+                if retention_ms is not None:
+                    configs = {
+                        "cleanup.policy": "compact,delete",
+                        "retention.ms": str(retention_ms),
+                    }
+            await admin.create_topics(
+                [
+                    NewTopic(
+                        topic, partitions, replication_factor=1, topic_configs=configs
+                    )
+                ]
+            )
+        finally:
+            await admin.close()
+
     async def subscribe(
-        self, topic: str, group_id: str, handler: MessageHandler
+        self,
+        topic: Union[str, List[str]],
+        group_id: str,
+        handler: MessageHandler,
+        on_assign: Optional[PartitionsCallback] = None,
+        on_revoke: Optional[PartitionsCallback] = None,
+        max_in_flight: int = 0,
+        commit_interval_ms: int = 1000,
     ) -> None:
+        """Без `max_in_flight` записи обрабатываются по одной, с авто-коммитом.
+
+        С `max_in_flight` партиции обрабатываются параллельно (по порядку внутри
+        партиции), смещение коммитится только после обработки записи, а при
+        `max_in_flight` записях в работе чтение ставится на паузу.
+
+        `topic` может быть списком: одна группа читает несколько топиков.
+        """
+        topics = [topic] if isinstance(topic, str) else list(topic)
+        if max_in_flight > 0:
+            await self._subscribe_concurrent(
+                topics,
+                group_id,
+                handler,
+                on_assign,
+                on_revoke,
+                max_in_flight,
+                commit_interval_ms,
+            )
+            return
         consumer = AIOKafkaConsumer(
-            topic,
             bootstrap_servers=self.brokers,
             group_id=group_id,
             value_deserializer=lambda b: json.loads(b.decode()),
         )
+        consumer.subscribe(topics, listener=_RebalanceListener(on_assign, on_revoke))
         await consumer.start()
         try:
             async for record in consumer:
-                hdrs = {k: v.decode() for k, v in record.headers or []}
-                await handler(record.value, hdrs)
+                await handler(record.value, self._headers(record))
+        finally:
+            await consumer.stop()
+
+    @staticmethod
+    def _headers(record) -> dict:
+        hdrs = {k: v.decode() for k, v in record.headers or []}
+        hdrs[PARTITION_HEADER] = str(record.partition)
+        return hdrs
+
+    async def _subscribe_concurrent(
+        self,
+        topics: List[str],
+        group_id: str,
+        handler: MessageHandler,
+        on_assign: Optional[PartitionsCallback],
+        on_revoke: Optional[PartitionsCallback],
+        max_in_flight: int,
+        commit_interval_ms: int,
+    ) -> None:
+        consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.brokers,
+            group_id=group_id,
+            enable_auto_commit=False,
+            value_deserializer=lambda b: json.loads(b.decode()),
+        )
+        dispatcher = PartitionDispatcher(
+            lambda record: handler(record.value, self._headers(record)),
+            max_in_flight,
+        )
+
+        async def before_revoke(partitions: List[TopicPartition]) -> None:
+            # finish what is running, commit it; the rest goes to the new owner
+            await self._commit(consumer, await dispatcher.revoke(partitions))
+
+        consumer.subscribe(
+            topics, listener=_RebalanceListener(on_assign, on_revoke, before_revoke)
+        )
+        await consumer.start()
+        loop = asyncio.get_running_loop()
+        interval = commit_interval_ms / 1000
+        next_commit = loop.time() + interval
+        try:
+            while dispatcher.error is None:
+                if dispatcher.full():
+                    # backpressure: stop fetching until handlers catch up
+                    consumer.pause(*consumer.assignment())
+                    await dispatcher.wait_for_capacity(interval)
+                else:
+                    if consumer.paused():
+                        consumer.resume(*consumer.paused())
+                    batches = await consumer.getmany(
+                        timeout_ms=commit_interval_ms, max_records=dispatcher.room()
+                    )
+                    for tp, records in batches.items():
+                        dispatcher.submit(tp, records)
+                if loop.time() >= next_commit:
+                    next_commit = loop.time() + interval
+                    await self._commit(consumer, dispatcher.take_offsets())
+            raise dispatcher.error
         finally:
+            await dispatcher.stop()
+            await self._commit(consumer, dispatcher.take_offsets())
             await consumer.stop()
+
+    @staticmethod
+    async def _commit(consumer: AIOKafkaConsumer, offsets: dict) -> None:
+        if not offsets:
+            return
+        try:
+            await consumer.commit(offsets)
+        except KafkaError as exc:
+            # e.g. mid-rebalance; those records will simply be read again
+            print(f"[kafka] Offset commit failed: {exc}")
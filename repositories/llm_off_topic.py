@@ -1,29 +1,101 @@
+import asyncio
 import os
-import requests
+import random
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения из файла .env
 load_dotenv()
 
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 class LLMOffTopic:
-    """Класс для взаимодействия с LLM через API OpenRouter.
+    """Асинхронный клиент LLM через API OpenRouter.
 
     Позволяет отправлять запросы к языковой модели и получать ответы.
     Использует API ключ из переменных окружения.
+
+    Один `httpx.AsyncClient` живёт всё время работы клиента, поэтому
+    TLS-соединения переиспользуются. Число одновременных запросов ограничено
+    семафором, у каждого запроса есть таймаут, а ответы 429/5xx и сетевые
+    ошибки повторяются с экспоненциальной задержкой со случайным джиттером.
+
+    Attributes:
+        max_concurrency: Максимум одновременных запросов к API.
+        max_retries: Сколько раз повторять запрос после первой неудачи.
     """
 
-    def __init__(self):
-        """Инициализация клиента OpenRouter API."""
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.model = "deepseek/deepseek-chat-v3-0324:free"  # Модель по умолчанию
-        self.url = "https://openrouter.ai/api/v1/chat/completions"  # URL API
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "deepseek/deepseek-chat-v3-0324:free",
+        url: str = "https://openrouter.ai/api/v1/chat/completions",
+        timeout_s: float = 30.0,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """Инициализация клиента OpenRouter API.
+
+        Args:
+            api_key: Ключ API. По умолчанию берётся из OPENROUTER_API_KEY.
+            model: Модель OpenRouter.
+            url: URL API.
+            timeout_s: Таймаут одного запроса (в секундах).
+            max_concurrency: Максимум одновременных запросов.
+            max_retries: Число повторов после первой неудачи.
+            backoff_base_s: Базовая задержка перед повтором; удваивается
+                с каждой попыткой.
+            backoff_max_s: Верхняя граница задержки.
+            transport: Транспорт httpx, например `httpx.MockTransport` в тестах.
+        """
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        self.model = model  # Модель по умолчанию
+        self.url = url  # URL API
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        self.timeout = httpx.Timeout(timeout_s)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.transport = transport
+        # создаются внутри event loop при первом запросе
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
 
-    def ask(self, prompt: str) -> str:
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Задержка перед повтором: Retry-After или "full jitter"."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max_s)
+        ceiling = min(self.backoff_max_s, self.backoff_base_s * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    async def ask(self, prompt: str) -> str:
         """Отправляет запрос к языковой модели и возвращает ответ.
 
         Args:
@@ -48,14 +120,28 @@ class LLMOffTopic:
             "temperature": 0.0,  # Параметр для детерминированных ответов
         }
 
-        # Отправка POST-запроса к API
-        response = requests.post(self.url, headers=self.headers, json=body)
-
-        # Проверка статуса ответа
-        if response.status_code != 200:
-            raise RuntimeError(
-                f"OpenRouter API error {response.status_code}: {response.text}"
-            )
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            # семафор держится только на время запроса, не на время ожидания
+            async with self._semaphore:
+                try:
+                    response = await client.post(self.url, json=body)
+                except httpx.TransportError as exc:  # таймауты, обрывы соединения
+                    error = f"OpenRouter API request failed: {exc!r}"
+            if response is not None:
+                if response.status_code == 200:
+                    # Извлечение и возврат текста ответа
+                    return response.json()["choices"][0]["message"]["content"].strip()
+                error = f"OpenRouter API error {response.status_code}: {response.text}"
+                if response.status_code not in RETRY_STATUSES:
+                    break
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response))
+        raise RuntimeError(error)
 
-        # Извлечение и возврат текста ответа
-        return response.json()["choices"][0]["message"]["content"].strip()
+    async def aclose(self) -> None:
+        """Закрывает пул соединений."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,6 +1,7 @@
 from entities.data import ServiceCheckResult, BotMessage
+from typing import Optional
 from use_cases.ports.ml_service import IMLServiceRepository
-from llm_off_topic import LLMOffTopic
+from repositories.llm_off_topic import LLMOffTopic
 
 
 class LLMOffTopicRepository(IMLServiceRepository):
@@ -10,11 +11,16 @@ class LLMOffTopicRepository(IMLServiceRepository):
     Возвращает результат проверки с оценкой релевантности от 0 до 1.
     """
 
-    def __init__(self):
-        """Инициализирует экземпляр LLM для оценки релевантности."""
-        self.llm = LLMOffTopic()
+    def __init__(self, llm: Optional[LLMOffTopic] = None):
+        """Инициализирует экземпляр LLM для оценки релевантности.
 
-    def process(self, message: BotMessage) -> ServiceCheckResult:
+        Args:
+            llm: Клиент LLM. По умолчанию создаётся клиент с настройками
+                по умолчанию.
+        """
+        self.llm = llm or LLMOffTopic()
+
+    async def process(self, message: BotMessage) -> ServiceCheckResult:
         """Обрабатывает сообщение и проверяет релевантность ответа.
 
         Args:
@@ -39,7 +45,7 @@ class LLMOffTopicRepository(IMLServiceRepository):
         error, is_safe, score = None, False, 0.0
 
         try:
-            response = self.llm.ask(prompt)
+            response = await self.llm.ask(prompt)
         except Exception as exc:
             error = f"Ошибка при запросе к LLM: {str(exc)}"
 
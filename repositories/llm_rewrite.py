@@ -1,15 +1,132 @@
+import asyncio
+from typing import Dict, Optional
+
 from entities.data import LLMRewriteResult, BotMessage, LLMRequest
 from use_cases.ports.ml_service import ILLMRewriteRepository
 from gigachat import GigaChat
+from ollama import AsyncClient as Client
 
 
 class GigachatRewriteRepository(ILLMRewriteRepository):
-    def __init__(self):
+    """Переписывание ответа через GigaChat.
+
+    Клиент GigaChat создаётся один раз на ключ API и живёт всё время работы
+    репозитория: пул соединений и OAuth-токен переиспользуются между
+    запросами. Запросы асинхронные (`achat`), их число ограничено семафором,
+    а каждый запрос — таймаутом.
+
+    Attributes:
+        timeout_s: Таймаут одного переписывания (в секундах).
+        max_concurrency: Максимум одновременных запросов к GigaChat.
+    """
+
+    def __init__(
+        self,
+        credentials: Optional[str] = None,
+        timeout_s: float = 30.0,
+        max_concurrency: int = 4,
+    ):
+        """
+        Args:
+            credentials: Ключ API по умолчанию; `LLMRequest.api_key`
+                его переопределяет.
+            timeout_s: Таймаут одного переписывания (в секундах).
+            max_concurrency: Максимум одновременных запросов.
+        """
         self.final_prompt = ""
+        self.credentials = credentials
+        self.timeout_s = timeout_s
+        self.max_concurrency = max(1, max_concurrency)
+        self._clients: Dict[Optional[str], GigaChat] = {}
+        # создаётся внутри event loop при первом запросе
+        self._semaphore: Optional[asyncio.Semaphore] = None
 
-    def process(self, request: LLMRequest) -> LLMRewriteResult:
-        client = GigaChat(credentials=request.api_key, verify_ssl_certs=False)
-        response = client.chat(request.prompt)
+    def _client(self, credentials: Optional[str]) -> GigaChat:
+        client = self._clients.get(credentials)
+        if client is None:
+            client = GigaChat(
+                credentials=credentials,
+                verify_ssl_certs=False,
+                timeout=self.timeout_s,
+                max_connections=self.max_concurrency,
+            )
+            self._clients[credentials] = client
+        return client
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        client = self._client(request.api_key or self.credentials)
+        self.final_prompt = request.prompt
+        async with self._semaphore:
+            # общий дедлайн: получение токена и сам запрос
+            response = await asyncio.wait_for(
+                client.achat(request.prompt), self.timeout_s
+            )
         return LLMRewriteResult(
             answer=response.choices[0].message.content,
         )
+
+    async def aclose(self) -> None:
+        """Закрывает клиентов и их пулы соединений."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+class OllamaRewriteRepository(ILLMRewriteRepository):
+    """Переписывание ответа локальной моделью через Ollama.
+
+    Как и для GigaChat, клиент (`ollama.AsyncClient`) создаётся один раз на
+    хост и переиспользуется; число одновременных запросов ограничено
+    семафором, каждый запрос — таймаутом.
+
+    Attributes:
+        host: Адрес Ollama по умолчанию; `LLMRequest.ollama_host` его
+            переопределяет.
+        model: Модель по умолчанию; `LLMRequest.model` её переопределяет.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        model: Optional[str] = None,
+        timeout_s: float = 30.0,
+        max_concurrency: int = 4,
+    ):
+        self.final_prompt = ""
+        self.host = host
+        self.model = model
+        self.timeout_s = timeout_s
+        self.max_concurrency = max(1, max_concurrency)
+        self._clients: Dict[Optional[str], Client] = {}
+        # создаётся внутри event loop при первом запросе
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _client(self, host: Optional[str]) -> Client:
+        client = self._clients.get(host)
+        if client is None:
+            client = Client(host=host)
+            self._clients[host] = client
+        return client
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        client = self._client(request.ollama_host or self.host)
+        self.final_prompt = request.prompt
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                client.chat(
+                    model=request.model or self.model,
+                    messages=[{"role": "user", "content": request.prompt}],
+                ),
+                self.timeout_s,
+            )
+        return LLMRewriteResult(answer=response["message"]["content"])
+
+    async def aclose(self) -> None:
+        """Закрывает клиентов и их пулы соединений."""
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Собирает входящие элементы в микробатчи и обрабатывает их одним вызовом.
+
+    Батч закрывается, как только набралось `max_batch_size` элементов или с
+    момента прихода первого элемента прошло `max_latency_ms` миллисекунд.
+    Синхронная `batch_fn` выполняется в пуле потоков, поэтому event loop
+    продолжает принимать новые элементы, пока модель считает текущий батч.
+
+    Attributes:
+        batch_fn: Функция, принимающая список элементов и возвращающая
+            список результатов в том же порядке.
+        max_batch_size: Максимальный размер батча.
+        max_latency: Максимальное время ожидания добора батча (в секундах).
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], List[R]],
+        max_batch_size: int = 16,
+        max_latency_ms: float = 10.0,
+        max_queue_size: int = 0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max(0.0, max_latency_ms) / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, item: T) -> "asyncio.Future[R]":
+        """Ставит элемент в очередь и возвращает future с его результатом.
+
+        Если очередь заполнена, ждёт освободившегося места (backpressure).
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return future
+
+    async def flush(self) -> None:
+        """Ждёт, пока будут обработаны все поставленные в очередь элементы."""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """Останавливает фоновую задачу сборки батчей."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _collect(self) -> List[Tuple[T, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.batch_fn, items)
+                if len(results) != len(batch):
+                    # results no longer line up with items: fail the whole batch
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results "
+                        f"for {len(batch)} items"
+                    )
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            for _ in batch:
+                self._queue.task_done()
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+"""
+PROCESS-WIDE MODEL REGISTRY
+
+Каждый артефакт модели загружается один раз на процесс и дальше берётся из
+реестра. Раз в `check_interval` секунд реестр сверяет mtime и размер файла
+(для каталога — всех файлов в нём); если они поменялись, считается sha256
+содержимого и при новой версии модель загружается заново.
+
+Новая модель подменяет старую одной записью в словаре уже после загрузки, а
+запросы в обработке продолжают работать с той `LoadedModel`, которую получили
+в начале. Пока идёт загрузка, остальные потоки обслуживаются старой версией;
+если загрузка упала (например, файл ещё дописывается), старая версия остаётся.
+Артефакты лучше выкладывать атомарно: запись во временный файл и `os.replace`.
+"""
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Загруженная модель и версия артефакта, из которого она получена."""
+
+    model: Any
+    version: str
+    signature: Optional[Tuple] = None
+
+
+def artifact_signature(path: str) -> Optional[Tuple]:
+    """Дешёвый отпечаток артефакта по mtime и размеру; None, если пути нет.
+
+    Имена моделей с HuggingFace Hub не являются путями, их отпечаток — None.
+    """
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return ((None, stat.st_mtime_ns, stat.st_size),)
+    if os.path.isdir(path):
+        files = []
+        for root, _, names in os.walk(path):
+            for name in names:
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                files.append(
+                    (
+                        os.path.relpath(file_path, path),
+                        stat.st_mtime_ns,
+                        stat.st_size,
+                    )
+                )
+        return tuple(sorted(files))
+    return None
+
+
+def artifact_version(path: str, signature: Optional[Tuple]) -> str:
+    """Версия артефакта: первые 12 символов sha256 содержимого."""
+    if signature is None:
+        return path
+    digest = hashlib.sha256()
+    for rel_path, _, _ in signature:
+        file_path = path if rel_path is None else os.path.join(path, rel_path)
+        if rel_path is not None:
+            digest.update(rel_path.encode())
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """Кеш загруженных моделей с горячей перезагрузкой.
+
+    Attributes:
+        check_interval: Как часто (в секундах) проверять, не сменился ли
+            артефакт. 0 — при каждом обращении.
+    """
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._entries: Dict[Hashable, LoadedModel] = {}
+        self._checked_at: Dict[Hashable, float] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(
+        self,
+        key: Hashable,
+        path: str,
+        loader: Callable[[str], Any],
+        signature: Optional[Tuple],
+    ) -> LoadedModel:
+        version = artifact_version(path, signature)
+        current = self._entries.get(key)
+        if current is not None and current.version == version:
+            # файл перезаписан тем же содержимым: перезагрузка не нужна
+            entry = LoadedModel(current.model, version, signature)
+        else:
+            entry = LoadedModel(loader(path), version, signature)
+            print(f"[model_registry] Loaded {path} (version {version})")
+        self._entries[key] = entry
+        self._checked_at[key] = time.monotonic()
+        return entry
+
+    def get(
+        self,
+        path: str,
+        loader: Callable[[str], Any],
+        key: Optional[Hashable] = None,
+    ) -> LoadedModel:
+        """Возвращает модель, при необходимости загружая или перезагружая её.
+
+        Args:
+            path: Путь к артефакту или имя модели на HuggingFace Hub.
+            loader: Функция, загружающая модель по `path`.
+            key: Ключ в реестре, если по одному пути грузятся разные модели
+                (например, для разных бэкендов инференса). По умолчанию `path`.
+
+        Returns:
+            LoadedModel: Модель и её версия. Вызывающий держит её до конца
+                обработки запроса, даже если реестр уже подменил модель.
+        """
+        key = path if key is None else key
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._key_lock(key):
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._load(key, path, loader, artifact_signature(path))
+            return entry
+
+        checked_at = self._checked_at.get(key, 0.0)
+        if entry.signature is None or (
+            time.monotonic() - checked_at < self.check_interval
+        ):
+            return entry
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            # артефакт уже проверяет (или грузит) другой поток
+            return entry
+        try:
+            self._checked_at[key] = time.monotonic()
+            signature = artifact_signature(path)
+            if signature is None or signature == entry.signature:
+                return entry
+            try:
+                return self._load(key, path, loader, signature)
+            except Exception as exc:
+                print(
+                    f"[model_registry] Reload of {path} failed, "
+                    f"keeping version {entry.version}: {exc}"
+                )
+                return entry
+        finally:
+            lock.release()
+
+    def versions(self) -> Dict[Hashable, str]:
+        """Версии всех загруженных моделей."""
+        return {key: entry.version for key, entry in self._entries.items()}
+
+
+# Общий реестр процесса; воркеры настраивают его check_interval из настроек
+default_registry = ModelRegistry()
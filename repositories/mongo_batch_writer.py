@@ -0,0 +1,216 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from entities.data import FinalCheckResult
+from repositories.file_db import result_update
+from use_cases.ports.db_connector import IDBRepository
+
+"""
+WRITE-BEHIND BATCHED MONGO WRITER
+
+`enqueue` только кладёт результат в очередь и отдаёт future; фоновая
+задача собирает батч (до `max_batch_size` документов или `max_latency_ms`
+с первого) и пишет его одним неупорядоченным `bulk_write` из upsert-ов в
+пуле потоков, не блокируя event loop агрегатора. Несколько сохранений одного
+request_id в батче схлопываются в одно: побеждает последнее, но
+деградированный результат не вытесняет полный. Деградированный результат
+пишется через `$setOnInsert` и не затирает уже сохранённый полный.
+
+Future резолвится, когда MongoDB подтвердила запись, и получает исключение,
+если документ записать не удалось; `save` ждёт именно этого. Вызывающий код
+может считать результат сохранённым (и, например, удалять его из changelog)
+только после успешного `save`.
+
+Если очередь заполнена, `enqueue` ждёт освободившегося места (backpressure).
+Неудачный батч повторяется с экспоненциальной задержкой; после
+`max_retries` повторов документы считаются потерянными, попадают в
+счётчик `failed`, а их future — в ошибку. `close` дописывает всё, что
+осталось в очереди.
+"""
+
+
+class BatchedMongoResultRepository(IDBRepository):
+    """Сохраняет FinalCheckResult в MongoDB батчами, в фоне.
+
+    Args:
+        collection: Коллекция pymongo, например `MongoResultRepository.collection`.
+        max_batch_size: Максимум документов в одном `bulk_write`.
+        max_latency_ms: Сколько ждать добора батча после первого документа.
+        max_queue_size: Размер очереди; при заполнении `enqueue` ждёт.
+        max_retries: Сколько раз повторять неудачный батч.
+        retry_backoff_s: Базовая задержка перед повтором; удваивается.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_batch_size: int = 500,
+        max_latency_ms: float = 50.0,
+        max_queue_size: int = 10000,
+        max_retries: int = 3,
+        retry_backoff_s: float = 0.5,
+    ):
+        self.collection = collection
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max(0.0, max_latency_ms) / 1000
+        self.max_queue_size = max(1, max_queue_size)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff_s = retry_backoff_s
+        # создаются внутри event loop при первом сохранении
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.write_seconds = 0.0
+
+    async def save(self, request_id: str, final_result: FinalCheckResult) -> None:
+        """Сохраняет результат; возвращается после подтверждения записи.
+
+        Raises:
+            PyMongoError: Документ не записан и после всех повторов.
+        """
+        await (await self.enqueue(request_id, final_result))
+
+    async def enqueue(
+        self, request_id: str, final_result: FinalCheckResult
+    ) -> asyncio.Future:
+        """Ставит результат в очередь записи; ждёт только при полной очереди.
+
+        Returns:
+            Future, который резолвится после подтверждения записи.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._run())
+            self._started_at = time.monotonic()
+        doc = {"request_id": request_id, "result": final_result.model_dump()}
+        acked = asyncio.get_running_loop().create_future()
+        await self._queue.put((request_id, doc, acked))
+        return acked
+
+    async def close(self) -> None:
+        """Дописывает очередь и останавливает фоновую задачу."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _collect(self) -> List[Tuple[str, dict, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            except Exception as exc:
+                # фоновая задача не должна умирать: иначе `save` повиснет
+                print(f"[mongo] Dropping {len(batch)} results: {exc}")
+                self.failed += len(batch)
+                for _, _, acked in batch:
+                    _resolve(acked, exc)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: List[Tuple[str, dict, asyncio.Future]]) -> None:
+        # последнее сохранение request_id в батче побеждает
+        docs: Dict[str, dict] = {}
+        waiters: Dict[str, List[asyncio.Future]] = {}
+        for request_id, doc, acked in batch:
+            previous = docs.get(request_id)
+            if not (
+                doc["result"].get("degraded")
+                and previous is not None
+                and not previous["result"].get("degraded")
+            ):
+                docs[request_id] = doc
+            waiters.setdefault(request_id, []).append(acked)
+        self.coalesced += len(batch) - len(docs)
+        request_ids = list(docs)
+        operations = [
+            UpdateOne(
+                {"request_id": request_id}, result_update(docs[request_id]), upsert=True
+            )
+            for request_id in request_ids
+        ]
+        errors: Dict[str, Exception] = {}
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            error: Optional[PyMongoError] = None
+            try:
+                await asyncio.to_thread(
+                    self.collection.bulk_write, operations, ordered=False
+                )
+            except PyMongoError as exc:
+                error = exc
+            self.write_seconds += time.perf_counter() - start
+            if error is None:
+                self.written += len(operations)
+            elif isinstance(error, BulkWriteError):
+                # неупорядоченный bulk_write: остальные документы записаны
+                for write_error in error.details.get("writeErrors", []):
+                    errors[request_ids[write_error["index"]]] = error
+                print(f"[mongo] {len(errors)} of {len(operations)} writes failed")
+                self.failed += len(errors)
+                self.written += len(operations) - len(errors)
+            elif attempt < self.max_retries:
+                await asyncio.sleep(self.retry_backoff_s * 2**attempt)
+                continue
+            else:
+                print(f"[mongo] Dropping {len(operations)} results: {error}")
+                self.failed += len(operations)
+                errors = dict.fromkeys(request_ids, error)
+            break
+        self.batches += 1
+        for request_id, futures in waiters.items():
+            for acked in futures:
+                _resolve(acked, errors.get(request_id))
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "written": self.written,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "avg_batch_size": self.written / self.batches if self.batches else 0.0,
+            "docs_per_s": self.written / elapsed if elapsed else 0.0,
+            "write_ms_per_batch": (
+                1000 * self.write_seconds / self.batches if self.batches else 0.0
+            ),
+        }
+
+
+def _resolve(acked: asyncio.Future, error: Optional[Exception]) -> None:
+    if acked.done():
+        return
+    if error is None:
+        acked.set_result(None)
+    else:
+        acked.set_exception(error)
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, List
+
+from entities.data import BotMessage, ServiceCheckResult
+from repositories.llm_off_topic_scorer import LLMOffTopicRepository
+from repositories.off_topic_scorer import OffTopicRepository
+from use_cases.ports.ml_service import IMLServiceRepository
+
+"""
+EMBEDDING-THEN-LLM CASCADE FOR OFF-TOPIC DETECTION
+
+1. Эмбеддинги (`OffTopicRepository`): дёшево, решают большую часть трафика.
+2. LLM (`LLMOffTopicRepository`): медленно и платно, вызывается, только если
+   косинусная оценка попала в полосу неопределённости [low, high] вокруг
+   порога.
+
+В результате `stage` называет стадию, принявшую решение ("embedding" / "llm").
+Если LLM вернула ошибку, остаётся решение эмбеддингов. `stage_report`
+показывает долю эскалаций и добавленную ими задержку, чтобы подбирать полосу
+под бюджет и p99.
+"""
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class OffTopicCascadeRepository(IMLServiceRepository):
+    """Каскад "эмбеддинги, затем LLM" для неуверенных случаев.
+
+    Args:
+        embedding: Репозиторий на эмбеддингах (первая стадия).
+        llm: Репозиторий на LLM (вторая стадия).
+        uncertain_low: Нижняя граница полосы неопределённости.
+        uncertain_high: Верхняя граница полосы неопределённости.
+        latency_window: Сколько последних задержек LLM хранить для перцентилей.
+    """
+
+    def __init__(
+        self,
+        embedding: OffTopicRepository,
+        llm: LLMOffTopicRepository,
+        uncertain_low: float = 0.4,
+        uncertain_high: float = 0.6,
+        latency_window: int = 1000,
+    ):
+        if uncertain_low > uncertain_high:
+            raise ValueError(
+                f"Empty uncertain band [{uncertain_low}, {uncertain_high}]"
+            )
+        self.embedding = embedding
+        self.llm = llm
+        self.uncertain_low = uncertain_low
+        self.uncertain_high = uncertain_high
+        self.stage_stats = {
+            stage: {"messages": 0, "seconds": 0.0} for stage in ("embedding", "llm")
+        }
+        self.llm_errors = 0
+        self._llm_latencies: Deque[float] = deque(maxlen=max(1, latency_window))
+
+    def is_uncertain(self, score: float) -> bool:
+        return self.uncertain_low <= score <= self.uncertain_high
+
+    async def process(self, message: BotMessage) -> ServiceCheckResult:
+        start = time.perf_counter()
+        # the encoder is CPU-bound: keep the event loop free for the LLM calls
+        result = await asyncio.to_thread(self.embedding.process, message)
+        self._record("embedding", start)
+        result.stage = "embedding"
+        if not self.is_uncertain(result.score):
+            return result
+
+        start = time.perf_counter()
+        llm_result = await self.llm.process(message)
+        self._llm_latencies.append(self._record("llm", start))
+        if llm_result.error is not None:
+            self.llm_errors += 1
+            return result
+        return llm_result.model_copy(
+            update={
+                "question": message.question,
+                "model_version": result.model_version,
+                "topic_matches": result.topic_matches,
+                "stage": "llm",
+            }
+        )
+
+    def stage_report(self) -> dict:
+        """Доля эскалаций в LLM и задержка, которую они добавляют."""
+        embedding, llm = self.stage_stats["embedding"], self.stage_stats["llm"]
+        total = embedding["messages"]
+        latencies = list(self._llm_latencies)
+        return {
+            "messages": total,
+            "escalation_rate": llm["messages"] / total if total else 0.0,
+            "llm_errors": self.llm_errors,
+            "embedding_ms_per_message": (
+                1000 * embedding["seconds"] / total if total else 0.0
+            ),
+            # средняя задержка, добавленная эскалациями, на одно сообщение
+            "added_ms_per_message": 1000 * llm["seconds"] / total if total else 0.0,
+            "llm_p50_ms": 1000 * _percentile(latencies, 0.5),
+            "llm_p99_ms": 1000 * _percentile(latencies, 0.99),
+        }
+
+    def _record(self, stage: str, start: float) -> float:
+        elapsed = time.perf_counter() - start
+        stats = self.stage_stats[stage]
+        stats["messages"] += 1
+        stats["seconds"] += elapsed
+        return elapsed
@@ -1,6 +1,15 @@
-from entities.data import ServiceCheckResult, BotMessage
+from entities.data import ServiceCheckResult, BotMessage, TopicMatch
 from use_cases.ports.ml_service import IMLServiceRepository
+from typing import Any, List, Optional
+import torch
 from sentence_transformers import SentenceTransformer, util
+from repositories.embedding_cache import EmbeddingCache
+from repositories.embedding_store import EmbeddingStore
+from repositories.inference_backend import InferenceBackend
+from repositories.model_registry import LoadedModel, ModelRegistry, default_registry
+from repositories.topic_index import TopicIndex
+
+MODES = ("pair", "topics", "both")
 
 
 class OffTopicRepository(IMLServiceRepository):
@@ -9,16 +18,132 @@ class OffTopicRepository(IMLServiceRepository):
     Использует модель Sentence Transformers для сравнения эмбеддингов текстов.
     Возвращает результат проверки с метрикой косинусного сходства.
 
+    Модель берётся из реестра моделей процесса: загружается один раз и
+    подменяется при изменении локального артефакта. Вопрос и ответ кодируются
+    одним батчем, повторяющиеся тексты берутся из LRU-кеша эмбеддингов и из
+    общего для реплик mmap-хранилища.
+
+    Кроме пары вопрос-ответ ответ можно сравнивать с индексом разрешённых тем
+    домена (`TopicIndex`): режим "topics" — только с темами, "both" — ответ
+    должен пройти обе проверки. Совпавшие темы попадают в `topic_matches`.
+
     Attributes:
         model: Модель для генерации текстовых эмбеддингов.
     """
 
-    def __init__(self, model_name: str):
-        """Инициализирует модель для генерации эмбеддингов."""
+    def __init__(
+        self,
+        model_name: str,
+        backend: Optional[InferenceBackend] = None,
+        registry: Optional[ModelRegistry] = None,
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[EmbeddingStore] = None,
+        topic_index: Optional[TopicIndex] = None,
+        mode: str = "pair",
+        topic_threshold: float = 0.5,
+    ):
+        """Инициализирует модель для генерации эмбеддингов.
+
+        Args:
+            model_name: Имя модели Sentence Transformers или путь к ней.
+            backend: Бэкенд инференса (torch / onnx / onnx-int8). По умолчанию
+                модель исполняется в PyTorch.
+            registry: Реестр моделей. По умолчанию общий реестр процесса.
+            cache: Кеш эмбеддингов. По умолчанию тексты не кешируются.
+            store: Общее для реплик дисковое хранилище эмбеддингов (второй
+                уровень после `cache`). По умолчанию не используется.
+            topic_index: Индекс разрешённых тем; нужен режимам "topics" и "both".
+            mode: "pair" (ответ против вопроса), "topics" (ответ против тем)
+                или "both".
+            topic_threshold: Минимальное сходство с лучшей темой.
+        """
+        if mode not in MODES:
+            raise ValueError(
+                f"Unknown off-topic mode {mode!r}, expected one of {MODES}"
+            )
+        if mode != "pair" and topic_index is None:
+            raise ValueError(f"Off-topic mode {mode!r} requires a topic index")
         self.model_name = model_name
-        self.model = SentenceTransformer(
+        self.backend = backend
+        self.registry = registry or default_registry
+        self.cache = cache
+        self.store = store
+        self.topic_index = topic_index
+        self.mode = mode
+        self.topic_threshold = topic_threshold
+        self._cache_version: Optional[str] = None
+        self._loaded()
+
+    def _load_model(self, model_name: str):
+        if self.backend is not None:
+            return self.backend.sentence_encoder(model_name)
+        return SentenceTransformer(model_name)  # Легкая модель для эмбеддингов
+
+    def _loaded(self) -> LoadedModel:
+        backend_name = self.backend.name if self.backend is not None else None
+        return self.registry.get(
             self.model_name,
-        )  # Легкая модель для эмбеддингов
+            self._load_model,
+            key=("sentence_encoder", backend_name, self.model_name),
+        )
+
+    def _namespace(self, loaded: LoadedModel) -> str:
+        """Векторы разных бэкендов и версий модели не взаимозаменяемы."""
+        backend_name = self.backend.name if self.backend is not None else "torch"
+        return f"{backend_name}:{loaded.version}"
+
+    @property
+    def model(self):
+        return self._loaded().model
+
+    def _encode(self, loaded: LoadedModel, texts: List[str]) -> List[Any]:
+        """Эмбеддинги текстов: из кешей, остальные — одним вызовом `encode`.
+
+        Порядок поиска: LRU-кеш процесса, затем общее mmap-хранилище узла.
+        """
+        if self.cache is not None and self._cache_version != loaded.version:
+            # эмбеддинги другой версии модели несравнимы с новыми
+            self.cache.clear()
+            self._cache_version = loaded.version
+        embeddings: List[Any] = []
+        for text in texts:
+            embedding = self.cache.get(text) if self.cache is not None else None
+            if embedding is None and self.store is not None:
+                vector = self.store.get(text, namespace=self._namespace(loaded))
+                if vector is not None:
+                    embedding = torch.from_numpy(vector)
+                    if self.cache is not None:
+                        self.cache.put(text, embedding)
+            embeddings.append(embedding)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = dict(
+                zip(unique, loaded.model.encode(unique, convert_to_tensor=True))
+            )
+            for text, embedding in encoded.items():
+                if self.cache is not None:
+                    self.cache.put(text, embedding)
+                if self.store is not None:
+                    self.store.put(
+                        text, embedding.cpu().numpy(), namespace=self._namespace(loaded)
+                    )
+            for i in missing:
+                embeddings[i] = encoded[texts[i]]
+        return embeddings
+
+    def _match_topics(self, loaded: LoadedModel, embedding: Any) -> List[TopicMatch]:
+        """Top-k тем для эмбеддинга ответа; индекс досчитывает новые темы."""
+        self.topic_index.build(
+            lambda texts: (
+                loaded.model.encode(texts, convert_to_tensor=True).cpu().numpy()
+            ),
+            self._namespace(loaded),
+        )
+        return [
+            TopicMatch(topic=topic, score=score)
+            for topic, score in self.topic_index.search(embedding.cpu().numpy())
+        ]
 
     def process(self, message: BotMessage) -> ServiceCheckResult:
         """Обрабатывает сообщение и проверяет релевантность ответа.
@@ -29,25 +154,44 @@ class OffTopicRepository(IMLServiceRepository):
         Returns:
             ServiceCheckResult: Результат проверки, содержащий:
                 - Флаг is_safe (True если ответ релевантен)
-                - Значение косинусного сходства
+                - Значение косинусного сходства (в режиме "both" — меньшее
+                  из сходства с вопросом и с лучшей темой)
                 - Исходный ответ
+                - Лучшие темы домена, если ответ сравнивался с темами
         """
         str1 = message.question
         str2 = message.answer
+        # Одна версия модели на весь запрос, даже если реестр её подменит
+        loaded = self._loaded()
+
+        if self.mode == "topics":
+            # вопрос не нужен: кодируем только ответ
+            (embedding2,) = self._encode(loaded, [str2])
+        else:
+            # Генерация векторных представлений текстов одним батчем
+            embedding1, embedding2 = self._encode(loaded, [str1, str2])
 
-        # Генерация векторных представлений текстов
-        embedding1 = self.model.encode(str1, convert_to_tensor=True)
-        embedding2 = self.model.encode(str2, convert_to_tensor=True)
+            # Вычисление метрики косинусного сходства между векторами
+            score = util.cos_sim(embedding1, embedding2).item()
 
-        # Вычисление метрики косинусного сходства между векторами
-        score = util.cos_sim(embedding1, embedding2).item()
+            # Пороговое значение для определения релевантности (0.5 - примерное значение)
+            is_safe = score >= 0.5
 
-        # Пороговое значение для определения релевантности (0.5 - примерное значение)
-        is_safe = score >= 0.5
+        topic_matches = None
+        if self.mode != "pair":
+            topic_matches = self._match_topics(loaded, embedding2)
+            topic_score = topic_matches[0].score if topic_matches else 0.0
+            topic_safe = topic_score >= self.topic_threshold
+            if self.mode == "topics":
+                score, is_safe = topic_score, topic_safe
+            else:
+                score, is_safe = min(score, topic_score), is_safe and topic_safe
 
         return ServiceCheckResult(
             safe=is_safe,
             score=score,
             masked_answer=message.answer,
             question=message.question,
+            model_version=loaded.version,
+            topic_matches=topic_matches,
         )
@@ -0,0 +1,142 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+"""
+PER-PARTITION ORDERED DISPATCHER
+
+Записи разных партиций обрабатываются параллельно, записи одной партиции —
+строго по порядку: у каждой партиции своя очередь и своя задача-обработчик.
+Смещение партиции становится готовым к коммиту только после того, как
+обработчик записи завершился, поэтому падение процесса не теряет работу:
+необработанные записи будут прочитаны заново (at-least-once).
+
+Число записей в работе (в очередях и в обработке) ограничено `max_in_flight`:
+когда предел достигнут, `full()` сообщает консьюмеру, что пора поставить
+партиции на паузу, а `wait_for_capacity` ждёт, пока место освободится.
+"""
+
+Partition = Any
+
+
+class PartitionDispatcher:
+    """Параллельная по партициям, упорядоченная внутри партиции обработка.
+
+    Args:
+        handler: Корутина, обрабатывающая одну запись (у записи есть `offset`).
+        max_in_flight: Предел записей в очередях и в обработке.
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[Any]], max_in_flight: int):
+        self.handler = handler
+        self.max_in_flight = max(1, max_in_flight)
+        self._queues: Dict[Partition, Deque] = {}
+        self._workers: Dict[Partition, asyncio.Task] = {}
+        # следующее смещение к коммиту: последняя обработанная запись + 1
+        self._offsets: Dict[Partition, int] = {}
+        self._capacity: Optional[asyncio.Event] = None
+        self.in_flight = 0
+        self.processed = 0
+        self.error: Optional[BaseException] = None
+
+    def full(self) -> bool:
+        return self.in_flight >= self.max_in_flight
+
+    def room(self) -> int:
+        return max(0, self.max_in_flight - self.in_flight)
+
+    def submit(self, partition: Partition, records: Iterable[Any]) -> None:
+        """Ставит записи партиции в её очередь и запускает обработчик партиции."""
+        queue = self._queues.setdefault(partition, deque())
+        for record in records:
+            queue.append(record)
+            self.in_flight += 1
+        if queue and partition not in self._workers:
+            self._workers[partition] = asyncio.create_task(self._work(partition))
+
+    async def _work(self, partition: Partition) -> None:
+        queue = self._queues[partition]
+        try:
+            while queue:
+                record = queue[0]
+                await self.handler(record)
+                queue.popleft()
+                self.in_flight -= 1
+                self.processed += 1
+                self._offsets[partition] = record.offset + 1
+                self._wake()
+        except Exception as exc:
+            # партиция встаёт: дальше этой записи коммитить нельзя
+            self.error = exc
+            self._wake()
+        finally:
+            self._workers.pop(partition, None)
+
+    def _wake(self) -> None:
+        if self._capacity is not None:
+            self._capacity.set()
+
+    async def wait_for_capacity(self, timeout: float) -> None:
+        """Ждёт, пока освободится место или упадёт обработчик, но не дольше timeout."""
+        if self._capacity is None:
+            self._capacity = asyncio.Event()
+        self._capacity.clear()
+        if not self.full() or self.error is not None:
+            return
+        try:
+            await asyncio.wait_for(self._capacity.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def take_offsets(self) -> Dict[Partition, int]:
+        """Смещения, готовые к коммиту с прошлого вызова."""
+        offsets, self._offsets = self._offsets, {}
+        return offsets
+
+    async def revoke(self, partitions: Iterable[Partition]) -> Dict[Partition, int]:
+        """Отдаёт партиции: ждёт текущие записи, остальные бросает.
+
+        Брошенные записи не закоммичены, их обработает новый владелец.
+
+        Returns:
+            Смещения этих партиций, готовые к коммиту.
+        """
+        partitions = list(partitions)
+        workers = []
+        for partition in partitions:
+            queue = self._queues.pop(partition, None)
+            worker = self._workers.get(partition)
+            if queue and worker is not None:
+                # первая запись уже в обработке — её дождёмся
+                self.in_flight -= len(queue) - 1
+                head = queue[0]
+                queue.clear()
+                queue.append(head)
+                workers.append(worker)
+            elif queue:
+                self.in_flight -= len(queue)
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        self._wake()
+        return {
+            partition: self._offsets.pop(partition)
+            for partition in partitions
+            if partition in self._offsets
+        }
+
+    async def stop(self) -> None:
+        """Останавливает обработку; незавершённые записи остаются незакоммиченными."""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queues.clear()
+        self.in_flight = 0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "partitions_busy": len(self._workers),
+            "processed": self.processed,
+        }
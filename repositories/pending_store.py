@@ -0,0 +1,168 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+"""
+BOUNDED PENDING STORE WITH DEADLINES
+
+Частичные результаты проверок по request_id, пока не пришли все проверки.
+У каждого запроса есть дедлайн (`ttl_s` с момента первого результата), а у
+хранилища — предел числа запросов:
+
+- дедлайны лежат в min-куче, поэтому поиск просроченных запросов стоит
+  O(log n) на запрос, без обхода всего хранилища. Из кучи записи удаляются
+  лениво: завершённый запрос просто пропускается, когда доходит до вершины;
+- при превышении `max_entries` вытесняется запрос с ближайшим дедлайном (он
+  же самый старый);
+- просроченные и вытесненные запросы отдаёт `pop_expired`, вызывающий код
+  финализирует их с тем, что успело прийти;
+- request_id закрытых запросов помнятся (не больше `max_entries`), чтобы
+  результат, опоздавший после финализации, не открыл запрос заново
+  (после перезапуска их восстанавливает `mark_closed`);
+- `discard` забывает запрос без закрытия: после ребалансировки его
+  финализирует другой экземпляр агрегатора, а здесь он может снова появиться.
+"""
+
+Parts = Dict[str, Any]
+
+
+class _Entry:
+    __slots__ = ("parts", "created_at", "deadline")
+
+    def __init__(self, created_at: float, deadline: float):
+        self.parts: Parts = {}
+        self.created_at = created_at
+        self.deadline = deadline
+
+
+class PendingStore:
+    """Ограниченное хранилище незавершённых запросов с дедлайнами.
+
+    Attributes:
+        ttl_s: Сколько ждать остальные проверки после первого результата.
+        max_entries: Максимум одновременно ожидающих запросов.
+    """
+
+    def __init__(
+        self,
+        ttl_s: float = 30.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        self._entries: Dict[str, _Entry] = {}
+        # (дедлайн, request_id); запись устаревает, когда запрос закрыт
+        self._heap: List[Tuple[float, str]] = []
+        self._evicted: List[Tuple[str, Parts]] = []
+        self._closed: "OrderedDict[str, None]" = OrderedDict()
+        self.completed = 0
+        self.timeouts = 0
+        self.evictions = 0
+        self.late_results = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, request_id: str) -> bool:
+        return request_id in self._entries
+
+    def add(self, request_id: str, check_type: str, result: Any) -> Optional[Parts]:
+        """Добавляет результат проверки.
+
+        Returns:
+            Все результаты запроса на текущий момент или None, если запрос уже
+            финализирован и результат опоздал.
+        """
+        entry = self._entries.get(request_id)
+        if entry is None:
+            if request_id in self._closed:
+                self.late_results += 1
+                return None
+            now = self.clock()
+            entry = _Entry(now, now + self.ttl_s)
+            self._entries[request_id] = entry
+            heapq.heappush(self._heap, (entry.deadline, request_id))
+            while len(self._entries) > self.max_entries:
+                evicted = self._pop_oldest()
+                self.evictions += 1
+                self._evicted.append(evicted)
+        entry.parts[check_type] = result
+        return entry.parts
+
+    def pop(self, request_id: str) -> Optional[Parts]:
+        """Забирает завершённый запрос."""
+        entry = self._entries.pop(request_id, None)
+        if entry is None:
+            return None
+        self._close(request_id)
+        self.completed += 1
+        return entry.parts
+
+    def mark_closed(self, request_id: str) -> None:
+        """Помечает запрос закрытым (например, восстановленный из changelog)."""
+        if request_id not in self._entries:
+            self._close(request_id)
+
+    def discard(self, request_id: str) -> Optional[Parts]:
+        """Забывает запрос, не закрывая его: его финализирует другой владелец."""
+        entry = self._entries.pop(request_id, None)
+        return entry.parts if entry is not None else None
+
+    def pop_expired(self) -> List[Tuple[str, Parts]]:
+        """Забирает запросы с истёкшим дедлайном и вытесненные запросы."""
+        expired, self._evicted = self._evicted, []
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, request_id = heapq.heappop(self._heap)
+            entry = self._entries.get(request_id)
+            if entry is None or entry.deadline != deadline:
+                continue  # запрос уже закрыт
+            del self._entries[request_id]
+            self._close(request_id)
+            self.timeouts += 1
+            expired.append((request_id, entry.parts))
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        """Ближайший дедлайн (по `clock`) или None, если ждать нечего."""
+        if self._evicted:
+            return self.clock()
+        top = self._peek()
+        return top.deadline if top is not None else None
+
+    def _peek(self) -> Optional[_Entry]:
+        """Самый старый открытый запрос; устаревшие записи кучи выбрасываются."""
+        while self._heap:
+            deadline, request_id = self._heap[0]
+            entry = self._entries.get(request_id)
+            if entry is not None and entry.deadline == deadline:
+                return entry
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_oldest(self) -> Tuple[str, Parts]:
+        self._peek()
+        _, request_id = heapq.heappop(self._heap)
+        entry = self._entries.pop(request_id)
+        self._close(request_id)
+        return request_id, entry.parts
+
+    def _close(self, request_id: str) -> None:
+        self._closed[request_id] = None
+        while len(self._closed) > self.max_entries:
+            self._closed.popitem(last=False)
+
+    def stats(self) -> dict:
+        oldest = self._peek()
+        return {
+            "pending": len(self._entries),
+            "max_entries": self.max_entries,
+            "oldest_age_s": self.clock() - oldest.created_at if oldest else 0.0,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "evictions": self.evictions,
+            "late_results": self.late_results,
+        }
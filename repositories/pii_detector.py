@@ -1,8 +1,13 @@
 from entities.data import ServiceCheckResult, BotMessage
 from use_cases.ports.ml_service import IMLServiceRepository
+import bisect
 import re
-from typing import List
-from transformers import pipeline
+import threading
+from typing import Iterable, List, Optional
+from repositories.inference_backend import InferenceBackend, TorchBackend
+from repositories.pii_scanner import KeywordMatcher, RegexScanner, mask_spans
+
+NER_MODEL_NAME = "Gherman/bert-base-NER-Russian"
 
 
 class PIIDetectorRepository(IMLServiceRepository):
@@ -28,54 +33,175 @@ class PIIDetectorRepository(IMLServiceRepository):
     PASSPORT_REGEX = re.compile(r"(\b\d{4}\s?\d{6}\b|\b\d{10}\b)")
     PASSPORT_SERIES_REGEX = re.compile(r"серия\s*\d{4}", re.IGNORECASE)
     PASSPORT_NUMBER_REGEX = re.compile(r"номер\s*\d{6}", re.IGNORECASE)
-    print("PIIDetector initialized with regex patterns")
-    # --- HuggingFace NER pipeline initialization ---
-    _ner_pipe = pipeline("ner", model="Gherman/bert-base-NER-Russian")
-    print("NER pipeline initialized")
+    WORD_REGEX = re.compile(r"\w+")
+    DIGIT_REGEX = re.compile(r"\d")
+    # Разделитель текстов при пакетном поиске: не \w, не \s и не "." / "-"
+    TEXT_SEPARATOR = "\x00"
+    # Все регулярки ищутся одним проходом; паспортные — только при ключевом слове
+    SCANNER = RegexScanner(
+        [
+            ("PHONE", PHONE_REGEX.pattern),
+            ("EMAIL", EMAIL_REGEX.pattern),
+            ("PASSPORT", PASSPORT_REGEX.pattern),
+            ("PASSPORT_SERIES", f"(?i:{PASSPORT_SERIES_REGEX.pattern})"),
+            ("PASSPORT_NUMBER", f"(?i:{PASSPORT_NUMBER_REGEX.pattern})"),
+        ],
+        # email не может начинаться в середине своей же локальной части
+        anchors={"EMAIL": r"(?<![\w\.-])"},
+    )
+    KEYWORDS = KeywordMatcher({"PASSPORT": PASSPORT_WORDS, "PHONE": PHONE_WORDS})
+    MASKED_TYPES = frozenset(
+        [
+            "PASSPORT",
+            "PASSPORT_SERIES",
+            "PASSPORT_NUMBER",
+            "PHONE",
+            "EMAIL",
+            "LAST_NAME",
+            "MIDDLE_NAME",
+        ]
+    )  # FIRST_NAME is deliberately skipped
+    # Каскад перед NER: слово с заглавной буквы (кириллица/латиница)
+    NAME_CANDIDATE_REGEX = re.compile(r"\b[A-ZА-ЯЁ][A-Za-zА-Яа-яЁё]+\b")
+    # Слова, которые с заглавной буквы стоят в начале предложения и именем не являются
+    SENTENCE_STOP_WORDS = frozenset(
+        [
+            "а", "благодарим", "будьте", "в", "вам", "ваш", "ваша", "ваше",
+            "ваши", "вот", "все", "всё", "вы", "где", "да", "добрый", "доброе",
+            "для", "если", "есть", "здравствуйте", "и", "извините", "к",
+            "как", "когда", "конечно", "на", "нет", "но", "по", "пожалуйста",
+            "привет", "с", "спасибо", "так", "также", "то", "тогда", "у",
+            "уважаемый", "уважаемая", "чтобы", "что", "это", "я", "мы",
+            "a", "and", "are", "dear", "do", "hello", "hi", "i", "if", "in",
+            "it", "no", "please", "thank", "thanks", "the", "this", "to",
+            "we", "what", "yes", "you", "your",
+        ]
+    )  # fmt: skip
+    # Частые имена: ловят имена, написанные со строчной буквы
+    NAME_DICTIONARY = frozenset(
+        [
+            "александр", "алексей", "анастасия", "андрей", "анна", "владимир",
+            "дмитрий", "екатерина", "елена", "иван", "мария", "михаил",
+            "наталья", "ольга", "павел", "сергей", "татьяна", "юлия",
+        ]
+    )  # fmt: skip
 
-    def _find_phone(self, text: str) -> List[dict]:
-        found = []
-        for match in self.PHONE_REGEX.finditer(text):
-            found.append(
-                {"type": "PHONE", "match": match.group(), "span": match.span()}
+    def __init__(
+        self,
+        backend: Optional[InferenceBackend] = None,
+        name_dictionary: Optional[Iterable[str]] = None,
+        ner_batch_size: int = 16,
+    ):
+        self.backend = backend or TorchBackend()
+        self.ner_batch_size = max(1, ner_batch_size)
+        self.name_dictionary = frozenset(
+            w.lower()
+            for w in (
+                self.NAME_DICTIONARY if name_dictionary is None else name_dictionary
             )
-        return found
+        )
+        # NER-модель грузится при первом тексте, где каскад нашёл кандидатов
+        self._ner = None
+        self._ner_lock = threading.Lock()
+        self.ner_stats = {"calls": 0, "skipped": 0}
 
-    def _find_email(self, text: str) -> List[dict]:
-        return [
-            {"type": "EMAIL", "match": m.group(), "span": m.span()}
-            for m in self.EMAIL_REGEX.finditer(text)
-        ]
+    @property
+    def _ner_pipe(self):
+        if self._ner is None:
+            with self._ner_lock:
+                if self._ner is None:
+                    self._ner = self.backend.token_classifier(NER_MODEL_NAME)
+                    print("NER pipeline initialized")
+        return self._ner
 
-    def _find_passport(self, text: str) -> List[dict]:
-        found = []
-        if any(word in text.lower() for word in self.PASSPORT_WORDS):
-            for match in self.PASSPORT_REGEX.finditer(text):
-                found.append(
-                    {"type": "PASSPORT", "match": match.group(), "span": match.span()}
-                )
-            for match in self.PASSPORT_SERIES_REGEX.finditer(text):
-                found.append(
-                    {
-                        "type": "PASSPORT_SERIES",
-                        "match": match.group(),
-                        "span": match.span(),
-                    }
-                )
-            for match in self.PASSPORT_NUMBER_REGEX.finditer(text):
-                found.append(
-                    {
-                        "type": "PASSPORT_NUMBER",
-                        "match": match.group(),
-                        "span": match.span(),
-                    }
-                )
+    def ner_skip_ratio(self) -> float:
+        """Share of texts for which the cascade skipped the NER pass."""
+        total = self.ner_stats["calls"] + self.ner_stats["skipped"]
+        return self.ner_stats["skipped"] / total if total else 0.0
+
+    def _has_name_candidates(self, text: str) -> bool:
+        """Cheap pre-check: can the text contain a name at all?
+
+        A candidate is a capitalized word that is not a sentence-initial stop
+        word, or any word from the name dictionary.
+        """
+        for match in self.NAME_CANDIDATE_REGEX.finditer(text):
+            before = text[: match.start()].rstrip(" \t\"'«(-—")
+            sentence_start = not before or before[-1] in ".!?…\n"
+            if not (
+                sentence_start and match.group().lower() in self.SENTENCE_STOP_WORDS
+            ):
+                return True
+        return any(
+            w in self.name_dictionary for w in self.WORD_REGEX.findall(text.lower())
+        )
+
+    def _regex_types(self, text: str) -> List[str]:
+        """Entity types that can match at all; phones and passports need digits."""
+        types = []
+        has_digits = self.DIGIT_REGEX.search(text) is not None
+        if has_digits:
+            types.append("PHONE")
+        if "@" in text:
+            types.append("EMAIL")
+        if has_digits and "PASSPORT" in self.KEYWORDS.find(text):
+            types += ["PASSPORT", "PASSPORT_SERIES", "PASSPORT_NUMBER"]
+        return types
+
+    def _find_regex(self, text: str) -> List[dict]:
+        """Phones, emails and (next to a passport keyword) passport data."""
+        return self.SCANNER.scan(text, self._regex_types(text))
+
+    def _find_regex_batch(self, texts: List[str]) -> List[List[dict]]:
+        """`_find_regex` for several texts with one scan over their concatenation.
+
+        No pattern can match across the separator, and to every pattern it
+        looks like the start or the end of a string, so the per-text results
+        are the same as scanning each text separately.
+        """
+        if any(self.TEXT_SEPARATOR in text for text in texts):
+            return [self._find_regex(text) for text in texts]
+        allowed = [set(self._regex_types(text)) for text in texts]
+        found: List[List[dict]] = [[] for _ in texts]
+        types = set().union(*allowed)
+        if not types:
+            return found
+        offsets = []
+        pos = 0
+        for text in texts:
+            offsets.append(pos)
+            pos += len(text) + len(self.TEXT_SEPARATOR)
+        joined = self.TEXT_SEPARATOR.join(texts)
+        for match in self.SCANNER.scan(joined, types):
+            start, end = match["span"]
+            i = bisect.bisect_right(offsets, start) - 1
+            if match["type"] in allowed[i]:
+                match["span"] = (start - offsets[i], end - offsets[i])
+                found[i].append(match)
         return found
 
     def _find_fio(self, text: str) -> List[dict]:
-        results = self._ner_pipe(text)
-        print("NER results:", results)  # For debugging
+        return self._find_fio_batch([text])[0]
+
+    def _find_fio_batch(self, texts: List[str]) -> List[List[dict]]:
+        """Names in several texts with a single NER call over the candidates."""
+        found: List[List[dict]] = [[] for _ in texts]
+        candidates = [
+            i for i, text in enumerate(texts) if self._has_name_candidates(text)
+        ]
+        self.ner_stats["skipped"] += len(texts) - len(candidates)
+        if not candidates:
+            return found
+        self.ner_stats["calls"] += len(candidates)
+        results = self._ner_pipe(
+            [texts[i] for i in candidates], batch_size=self.ner_batch_size
+        )
+        for i, text_results in zip(candidates, results):
+            found[i] = self._merge_entities(text_results)
+        return found
 
+    def _merge_entities(self, results: List[dict]) -> List[dict]:
+        """Склеивает wordpiece-токены NER в сущности ФИО одного текста."""
         found = []
         current = None
 
@@ -104,50 +230,58 @@ class PIIDetectorRepository(IMLServiceRepository):
         return found
 
     def _mask_text(self, text: str, pii_matches: List[dict]) -> str:
-        masked = list(text)
-        for match in pii_matches:
-            start, end = match["span"]
-            mtype = match["type"]
-
-            if mtype in ["PASSPORT", "PASSPORT_SERIES", "PASSPORT_NUMBER", "PHONE"]:
-                for i in range(start, end):
-                    masked[i] = "*"
-            elif mtype == "EMAIL":
-                for i in range(start, end):
-                    masked[i] = "*"
-            elif mtype in ["LAST_NAME", "MIDDLE_NAME"]:  # Mask only these
-                for i in range(start, end):
-                    masked[i] = "*"
-            # FIRST_NAME is deliberately skipped
-        return "".join(masked)
+        return mask_spans(
+            text, (m["span"] for m in pii_matches if m["type"] in self.MASKED_TYPES)
+        )
 
     def _pii_word_ratio(self, text: str, pii_matches: List[dict]) -> float:
-        words = re.findall(r"\w+", text)
+        words = self.WORD_REGEX.findall(text)
         if not words:
             return 0.0
         pii_words = set()
         for match in pii_matches:
-            for w in re.findall(r"\w+", match["match"]):
-                pii_words.add(w)
+            pii_words.update(self.WORD_REGEX.findall(match["match"]))
         count = sum(1 for w in words if w in pii_words)
-        return count / len(words) if words else 0.0
+        return count / len(words)
 
     def process(self, message: BotMessage) -> ServiceCheckResult:
+        return self.process_batch([message])[0]
+
+    def process_batch(self, messages: List[BotMessage]) -> List[ServiceCheckResult]:
+        """Проверяет пачку сообщений: один проход регулярок и один вызов NER.
+
+        Args:
+            messages: Сообщения для проверки.
+
+        Returns:
+            List[ServiceCheckResult]: Результаты в порядке сообщений.
+        """
+        texts = [t for m in messages for t in (m.question, m.answer)]
+        regex_matches = self._find_regex_batch(texts)
+        fio_matches = self._find_fio_batch(texts)
+        return [
+            self._build_result(
+                message,
+                [
+                    regex_matches[2 * i] + fio_matches[2 * i],
+                    regex_matches[2 * i + 1] + fio_matches[2 * i + 1],
+                ],
+            )
+            for i, message in enumerate(messages)
+        ]
+
+    def _build_result(
+        self, message: BotMessage, field_matches: List[List[dict]]
+    ) -> ServiceCheckResult:
         from entities.data import Violation, ViolationLevel
 
-        print("Processing message:", message)
         texts = [("question", message.question), ("answer", message.answer)]
         all_matches = []
         violations = []
         masked_answer = message.answer
         max_ratio = 0.0
         censored_types = set()
-        for field, text in texts:
-            matches = []
-            matches += self._find_phone(text)
-            matches += self._find_email(text)
-            matches += self._find_passport(text)
-            matches += self._find_fio(text)
+        for (field, text), matches in zip(texts, field_matches):
             if matches:
                 all_matches.extend(matches)
                 ratio = self._pii_word_ratio(text, matches)
@@ -0,0 +1,176 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+"""
+SINGLE-PASS SCANNERS FOR THE PII DETECTOR
+
+- KeywordMatcher — находит все вхождения набора ключевых слов за один проход.
+  Слова собираются в префиксное дерево, дерево компилируется в одну регулярку
+  (аналог автомата Ахо — Корасик на движке `re`).
+- RegexScanner — ищет все типы сущностей одним `finditer`. Каждый тип стоит в
+  отдельном lookahead-е, поэтому совпадения разных типов могут пересекаться,
+  а внутри типа сохраняется семантика отдельного `finditer` (совпадения не
+  пересекаются, берётся самое левое).
+"""
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Собирает слова в префиксное дерево и возвращает его в виде регулярки."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        if list(node) == [""]:
+            return ""
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        pattern = (
+            branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        )
+        if "" in node:
+            # слово может закончиться здесь, а может продолжиться
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Поиск групп ключевых слов в тексте без учёта регистра.
+
+    Args:
+        groups: Имя группы -> ключевые слова группы.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.word_groups: Dict[str, Set[str]] = {}
+        for group, words in groups.items():
+            for word in words:
+                self.word_groups.setdefault(word.lower(), set()).add(group)
+        # Находясь в начале длинного слова, регулярка вернёт только его, поэтому
+        # ему достаются и группы всех ключевых слов, которые в нём содержатся
+        for word, word_groups in self.word_groups.items():
+            for other, other_groups in self.word_groups.items():
+                if other != word and other in word:
+                    word_groups |= other_groups
+        self.regex = re.compile(
+            "(?=(" + _trie_regex(self.word_groups) + "))", re.IGNORECASE
+        )
+
+    def find(self, text: str) -> Set[str]:
+        """Группы, хотя бы одно слово которых встречается в тексте."""
+        found: Set[str] = set()
+        for match in self.regex.finditer(text):
+            found |= self.word_groups[match.group(1).lower()]
+        return found
+
+
+class RegexScanner:
+    """Поиск нескольких типов регулярных сущностей за один проход.
+
+    Для каждого набора типов, который реально запрашивают, собирается и
+    кешируется своя объединённая регулярка.
+
+    Args:
+        patterns: Пары (тип сущности, регулярка) в порядке выдачи результатов.
+            Флаги задаются внутри регулярки, например `(?i:...)`.
+        anchors: Необязательные lookbehind-условия на начало совпадения по
+            типам. Они отсекают позиции, с которых совпадение возможно только
+            вместе с совпадением на позицию левее (например, середина слова для
+            email), и сильно удешевляют проход. Позицию сразу после предыдущего
+            совпадения того же типа сканер проверяет отдельно, поэтому
+            результат совпадает с обычным `finditer`.
+    """
+
+    def __init__(
+        self,
+        patterns: List[Tuple[str, str]],
+        anchors: Optional[Dict[str, str]] = None,
+    ):
+        self.patterns = dict(patterns)
+        self.anchors = anchors or {}
+        self._plain = {t: re.compile(p) for t, p in self.patterns.items()}
+        self._compiled: Dict[Tuple[str, ...], re.Pattern] = {}
+
+    def _regex(self, types: Tuple[str, ...]) -> re.Pattern:
+        regex = self._compiled.get(types)
+        if regex is None:
+            patterns = [self.anchors.get(t, "") + self.patterns[t] for t in types]
+            guard = "|".join(f"(?:{pattern})" for pattern in patterns)
+            groups = "".join(
+                f"(?:(?=(?P<g{i}>{pattern})))?" for i, pattern in enumerate(patterns)
+            )
+            regex = self._compiled[types] = re.compile(f"(?=(?:{guard})){groups}")
+        return regex
+
+    def scan(
+        self,
+        text: str,
+        types: Optional[Iterable[str]] = None,
+        pos: int = 0,
+        endpos: Optional[int] = None,
+    ) -> List[dict]:
+        """Возвращает совпадения, сгруппированные по типам в порядке `patterns`.
+
+        Args:
+            text: Текст для поиска.
+            types: Какие типы искать; по умолчанию все.
+            pos: Начало области поиска.
+            endpos: Конец области поиска; за него регулярки не заглядывают.
+        """
+        wanted = set(self.patterns if types is None else types)
+        types = tuple(t for t in self.patterns if t in wanted)
+        if not types:
+            return []
+        endpos = len(text) if endpos is None else endpos
+        found: List[List[dict]] = [[] for _ in types]
+        last_end = [pos] * len(types)
+
+        def accept(i: int, start: int, end: int) -> None:
+            found[i].append(
+                {"type": types[i], "match": text[start:end], "span": (start, end)}
+            )
+            last_end[i] = end
+            if types[i] in self.anchors:
+                # сразу за совпадением якорь не действует: проверяем позицию явно
+                follow = self._plain[types[i]].match(text, end, endpos)
+                if follow is not None and follow.end() > follow.start():
+                    accept(i, *follow.span())
+
+        for match in self._regex(types).finditer(text, pos, endpos):
+            for i in range(len(types)):
+                start, end = match.span(f"g{i}")
+                if start >= last_end[i]:
+                    accept(i, start, end)
+        return [match for per_type in found for match in per_type]
+
+
+def merge_spans(spans: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Объединяет пересекающиеся и соседние интервалы."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def mask_spans(text: str, spans: Iterable[Tuple[int, int]], char: str = "*") -> str:
+    """Заменяет символы внутри интервалов на `char`, собирая строку из срезов."""
+    parts = []
+    pos = 0
+    for start, end in merge_spans(spans):
+        parts.append(text[pos:start])
+        parts.append(char * (end - start))
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
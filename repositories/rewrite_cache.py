@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from pymongo import ASCENDING, MongoClient
+
+from entities.data import LLMRequest, LLMRewriteResult
+from repositories.embedding_cache import normalize_text
+from use_cases.ports.ml_service import ILLMRewriteRepository
+
+"""
+REWRITE RESULT CACHE
+
+Бот часто отвечает шаблонно, и один и тот же ответ раз за разом проваливает
+одни и те же проверки. Кеш перед `ILLMRewriteRepository` отдаёт уже готовое
+переписывание, не вызывая LLM.
+
+Ключ (`rewrite_cache_key`) — blake2b от версии промпта, маскированного
+текста, списка проваленных проверок и вопроса; его считает вызывающий код и
+передаёт в `LLMRequest.cache_key`. Запросы без ключа идут в LLM напрямую.
+Тексты нормализуются как в `normalize_text`: ответы, которые отличаются
+только пробелами, получают одно и то же переписывание.
+
+Одинаковые переписывания, запущенные одновременно, ждут один вызов LLM.
+Кешируются только успешные ответы.
+
+Бэкенды:
+- `MemoryRewriteCache` — LRU в памяти процесса с TTL;
+- `MongoRewriteCache` — коллекция MongoDB, общая для реплик: TTL-индекс и
+  вытеснение самых старых записей при превышении размера.
+"""
+
+
+def rewrite_cache_key(
+    masked_text: str, problems: Iterable[str], question: str, prompt_version: str
+) -> str:
+    """Ключ кеша переписываний: hex blake2b.
+
+    Args:
+        masked_text: Текст, который нужно переписать.
+        problems: Проваленные проверки; порядок не важен.
+        question: Вопрос пользователя.
+        prompt_version: Версия шаблона промпта: при его смене ключи меняются.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (
+        prompt_version,
+        normalize_text(masked_text),
+        ",".join(sorted(set(problems))),
+        normalize_text(question or ""),
+    ):
+        digest.update(part.encode("utf-8") + b"\x00")
+    return digest.hexdigest()
+
+
+class RewriteCacheBackend(ABC):
+    """Хранилище готовых переписываний."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def set(self, key: str, answer: str) -> None: ...
+
+
+class MemoryRewriteCache(RewriteCacheBackend):
+    """LRU-кеш в памяти процесса с TTL.
+
+    Attributes:
+        max_size: Максимальное число записей.
+        ttl_s: Время жизни записи (в секундах).
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_s: float = 86400.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max(1, max_size)
+        self.ttl_s = ttl_s
+        self.clock = clock
+        # key -> (ответ, момент истечения)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    async def set(self, key: str, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = (answer, self.clock() + self.ttl_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoRewriteCache(RewriteCacheBackend):
+    """Кеш в коллекции MongoDB, общий для всех реплик агрегатора.
+
+    Просроченные записи удаляет TTL-индекс по `created_at` (и не отдаёт
+    `get`, пока фоновая задача MongoDB до них не добралась). Раз в
+    `trim_every` записей самые старые документы сверх `max_size` удаляются.
+    Вызовы pymongo выполняются в пуле потоков.
+    """
+
+    def __init__(
+        self,
+        mongo_uri: str,
+        db_name: str = "app_db",
+        collection_name: str = "rewrite_cache",
+        max_size: int = 100000,
+        ttl_s: float = 86400.0,
+        trim_every: int = 100,
+    ):
+        self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        self.collection = self.client[db_name][collection_name]
+        self.max_size = max(1, max_size)
+        self.ttl_s = ttl_s
+        self.trim_every = max(1, trim_every)
+        self._writes = 0
+        self.collection.create_index(
+            [("created_at", ASCENDING)], expireAfterSeconds=int(ttl_s)
+        )
+
+    def _get(self, key: str) -> Optional[str]:
+        oldest = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_s)
+        doc = self.collection.find_one(
+            {"_id": key, "created_at": {"$gt": oldest}}, {"answer": 1}
+        )
+        return doc["answer"] if doc else None
+
+    def _set(self, key: str, answer: str) -> None:
+        self.collection.replace_one(
+            {"_id": key},
+            {"answer": answer, "created_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+        self._writes += 1
+        if self._writes % self.trim_every == 0:
+            self._trim()
+
+    def _trim(self) -> None:
+        excess = self.collection.estimated_document_count() - self.max_size
+        if excess <= 0:
+            return
+        oldest = (
+            self.collection.find({}, {"_id": 1})
+            .sort("created_at", ASCENDING)
+            .limit(excess)
+        )
+        self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, answer: str) -> None:
+        await asyncio.to_thread(self._set, key, answer)
+
+
+class CachedRewriteRepository(ILLMRewriteRepository):
+    """Кеширующая обёртка над репозиторием переписывания.
+
+    Args:
+        rewriter: Репозиторий, который действительно вызывает LLM.
+        backend: Хранилище готовых ответов.
+    """
+
+    def __init__(self, rewriter: ILLMRewriteRepository, backend: RewriteCacheBackend):
+        self.rewriter = rewriter
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        key = request.cache_key
+        if key is None:
+            return await self.rewriter.process(request)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._lookup(key, request))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # отмена одного ожидающего не должна отменять вызов для остальных
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: str, request: LLMRequest) -> LLMRewriteResult:
+        # недоступный кеш не должен ломать переписывание: работаем без него
+        try:
+            answer = await self.backend.get(key)
+        except Exception as exc:
+            print(f"[rewrite_cache] Lookup failed: {exc}")
+            answer = None
+        if answer is not None:
+            self.hits += 1
+            return LLMRewriteResult(answer=answer)
+        self.misses += 1
+        result = await self.rewriter.process(request)
+        try:
+            await self.backend.set(key, result.answer)
+        except Exception as exc:
+            print(f"[rewrite_cache] Store failed: {exc}")
+        return result
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
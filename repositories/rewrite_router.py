@@ -0,0 +1,198 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from entities.data import LLMRequest, LLMRewriteResult
+from use_cases.ports.ml_service import ILLMRewriteRepository
+
+"""
+LATENCY-AWARE ROUTING BETWEEN REWRITE BACKENDS
+
+Несколько бэкендов переписывания (например, локальная Ollama и GigaChat).
+Для каждого в скользящем окне из последних `window` запросов хранятся
+задержка и исход. Запрос уходит в самый быстрый здоровый бэкенд:
+
+- здоровый — доля ошибок в окне не выше `max_error_rate`. Нездоровый бэкенд
+  получает пробный запрос не чаще раза в `recovery_s` секунд, иначе он
+  никогда бы не вернулся в ротацию;
+- быстрый — меньше средняя задержка успешных запросов в окне; бэкенд без
+  истории считается самым быстрым, чтобы его попробовали.
+
+Если бэкенд ответил ошибкой, запрос переходит к следующему (failover), пока
+не истёк общий `deadline_s`. Если задан `hedge_after_s` и первый бэкенд не
+ответил за это время, параллельно отправляется второй запрос в следующий
+бэкенд (hedging); побеждает первый ответ, второй запрос отменяется.
+"""
+
+
+class _BackendStats:
+    def __init__(self, window: int):
+        # (задержка в секундах, успех)
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.last_attempt = float("-inf")
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency(self) -> float:
+        latencies = [latency for latency, ok in self.samples if ok]
+        if latencies:
+            return sum(latencies) / len(latencies)
+        return float("inf") if self.samples else 0.0
+
+
+class RoutingRewriteRepository(ILLMRewriteRepository):
+    """Маршрутизатор переписываний с failover и hedging.
+
+    Args:
+        backends: Бэкенды по именам; порядок задаёт приоритет при равенстве.
+        deadline_s: Общий дедлайн на запрос, включая повторы.
+        hedge_after_s: Через сколько секунд без ответа дублировать запрос в
+            следующий бэкенд. None отключает hedging.
+        window: Размер скользящего окна статистики бэкенда.
+        max_error_rate: Доля ошибок, выше которой бэкенд считается нездоровым.
+        recovery_s: Как часто давать пробный запрос нездоровому бэкенду.
+    """
+
+    def __init__(
+        self,
+        backends: Dict[str, ILLMRewriteRepository],
+        deadline_s: float = 30.0,
+        hedge_after_s: Optional[float] = None,
+        window: int = 50,
+        max_error_rate: float = 0.5,
+        recovery_s: float = 30.0,
+    ):
+        if not backends:
+            raise ValueError("At least one rewrite backend is required")
+        self.backends = dict(backends)
+        self.deadline_s = deadline_s
+        self.hedge_after_s = hedge_after_s
+        self.max_error_rate = max_error_rate
+        self.recovery_s = recovery_s
+        self._stats = {name: _BackendStats(max(1, window)) for name in backends}
+        self.hedges = 0
+        self.failovers = 0
+
+    def _healthy(self, name: str, now: float) -> bool:
+        stats = self._stats[name]
+        return (
+            stats.error_rate() <= self.max_error_rate
+            or now - stats.last_attempt >= self.recovery_s
+        )
+
+    def ranked(self) -> List[str]:
+        """Бэкенды в порядке попыток: здоровые по задержке, затем остальные."""
+        now = time.monotonic()
+        order = list(self.backends)
+        return sorted(
+            order,
+            key=lambda name: (
+                not self._healthy(name, now),
+                self._stats[name].latency(),
+                order.index(name),
+            ),
+        )
+
+    def _record(self, name: str, start: float, ok: bool) -> None:
+        self._stats[name].samples.append((time.monotonic() - start, ok))
+
+    async def _attempt(self, name: str, request: LLMRequest) -> LLMRewriteResult:
+        start = self._stats[name].last_attempt = time.monotonic()
+        try:
+            result = await self.backends[name].process(request)
+        except asyncio.CancelledError:
+            # отменённые попытки учитывает `process`
+            raise
+        except Exception:
+            self._record(name, start, ok=False)
+            raise
+        self._record(name, start, ok=True)
+        return result
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.deadline_s
+        queue = self.ranked()
+        # задача -> (бэкенд, время старта)
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        errors: List[str] = []
+        hedged = False
+
+        def launch() -> None:
+            name = queue.pop(0)
+            task = asyncio.ensure_future(self._attempt(name, request))
+            running[task] = (name, time.monotonic())
+
+        launch()
+        try:
+            while running:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                can_hedge = (
+                    not hedged and self.hedge_after_s is not None and bool(queue)
+                )
+                if can_hedge:
+                    timeout = min(timeout, max(0.0, start + self.hedge_after_s - now))
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if can_hedge and loop.time() >= start + self.hedge_after_s:
+                        hedged = True
+                        self.hedges += 1
+                        launch()
+                    continue
+                for task in done:
+                    name, _ = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as exc:
+                        errors.append(f"{name}: {exc!r}")
+                        continue
+                    # проигравший hedge не ответил как минимум столько времени:
+                    # эта нижняя оценка задержки тоже идёт в статистику
+                    for loser, started in running.values():
+                        self._record(loser, started, ok=True)
+                    return result
+                if not running and queue:
+                    self.failovers += 1
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+        if running:
+            for name, started in running.values():
+                self._record(name, started, ok=False)
+            raise asyncio.TimeoutError(
+                f"No rewrite backend answered within {self.deadline_s}s: {errors}"
+            )
+        raise RuntimeError(f"All rewrite backends failed: {errors}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "backends": {
+                name: {
+                    "requests": len(stats.samples),
+                    "error_rate": stats.error_rate(),
+                    "latency_ms": 1000 * stats.latency(),
+                    "healthy": self._healthy(name, now),
+                }
+                for name, stats in self._stats.items()
+            },
+        }
+
+    async def aclose(self) -> None:
+        for backend in self.backends.values():
+            close = getattr(backend, "aclose", None)
+            if close is not None:
+                await close()
@@ -1,9 +1,10 @@
+import threading
 import torch
-import time
-import torch.nn.functional as F
+from typing import Dict, Iterable, List, Optional, Tuple
 from entities.data import ServiceCheckResult, BotMessage
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from transformers import AutoTokenizer
 from use_cases.ports.ml_service import IMLServiceRepository
+from repositories.inference_backend import InferenceBackend, TorchBackend
 from lingua import Language, LanguageDetectorBuilder
 
 """
@@ -23,6 +24,10 @@ Pipeline Overview:
    - For English: uses softmax on logits to obtain the probability of toxic content.
    - For Russian: uses sigmoid activation to evaluate multiple toxicity labels, then takes the highest probability among toxic labels.
 4. Thresholding — if the toxicity score is above 0.1, the message is considered harmful.
+
+Models are loaded lazily, on first use of each language (see `get_model`), so a
+deployment that only serves Russian never loads the English model. They run on
+the inference backend given to the repository (torch, onnx or onnx-int8).
 """
 
 detector = LanguageDetectorBuilder.from_languages(
@@ -42,22 +47,106 @@ def detect_language(text: str) -> str:
 EN_MODEL_NAME = "ujjawalsah/bert-toxicity-classifier"
 RU_MODEL_NAME = "cointegrated/rubert-tiny-toxicity"
 
-en_tokenizer = AutoTokenizer.from_pretrained(EN_MODEL_NAME)
-en_model = AutoModelForSequenceClassification.from_pretrained(EN_MODEL_NAME)
-en_model.eval()
-
-ru_tokenizer = AutoTokenizer.from_pretrained(RU_MODEL_NAME)
-ru_model = AutoModelForSequenceClassification.from_pretrained(RU_MODEL_NAME)
-ru_model.eval()
+MODEL_NAMES = {"en": EN_MODEL_NAME, "ru": RU_MODEL_NAME}
+SUPPORTED_LANGUAGES = tuple(MODEL_NAMES)
 
 # Метки моделей
 EN_LABELS = ["toxic", "obscene", "insult", "threat", "identity_hate"]
 RU_LABELS = ["non-toxic", "insult", "obscenity", "threat", "dangerous"]
+LABELS = {"en": EN_LABELS, "ru": RU_LABELS}
+
+DEFAULT_BACKEND = TorchBackend()
+
+# Загруженные модели: (backend, lang) -> (tokenizer, model)
+_models: Dict[Tuple[str, str], Tuple] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(lang: str, backend: Optional[InferenceBackend] = None) -> Tuple:
+    """Returns (tokenizer, model) for the language, loading them on first use."""
+    backend = backend or DEFAULT_BACKEND
+    key = (backend.name, lang)
+    loaded = _models.get(key)
+    if loaded is None:
+        with _models_lock:
+            loaded = _models.get(key)
+            if loaded is None:
+                tokenizer = AutoTokenizer.from_pretrained(MODEL_NAMES[lang])
+                model = backend.sequence_classifier(MODEL_NAMES[lang])
+                loaded = _models[key] = (tokenizer, model)
+    return loaded
+
+
+def loaded_languages() -> List[str]:
+    """Languages whose models are already resident in memory."""
+    return sorted({lang for _, lang in _models})
+
+
+# Сколько слов прогоняем через модель за один forward при маскировании
+MASK_BATCH_SIZE = 32
+
+
+def score_words(words: List[str], tokenizer, model, batch_size: int) -> Dict[str, list]:
+    """Scores every unique word with padded batched forward passes.
+
+    Args:
+        words: Words to score; duplicates are scored once.
+        tokenizer: Tokenizer of the language model.
+        model: Sequence classification model.
+        batch_size: Maximum number of words per forward pass.
+
+    Returns:
+        Dict[str, list]: Sigmoid probabilities of every label for each word.
+    """
+    unique = list(dict.fromkeys(words))
+    scores = {}
+    for start in range(0, len(unique), batch_size):
+        chunk = unique[start : start + batch_size]
+        inputs = tokenizer(chunk, return_tensors="pt", truncation=True, padding=True)
+        with torch.no_grad():
+            probs = torch.sigmoid(model(**inputs).logits).tolist()
+        scores.update(zip(chunk, probs))
+    return scores
 
 
 class SafetyClassifierRepository(IMLServiceRepository):
-    def __init__(self, mask: bool = True):
+    def __init__(
+        self,
+        mask: bool = True,
+        mask_batch_size: int = MASK_BATCH_SIZE,
+        batch_size: int = 16,
+        languages: Iterable[str] = SUPPORTED_LANGUAGES,
+        preload_languages: Optional[Iterable[str]] = None,
+        backend: Optional[InferenceBackend] = None,
+    ):
         self.mask = mask
+        self.mask_batch_size = max(1, mask_batch_size)
+        self.batch_size = max(1, batch_size)
+        self.backend = backend or DEFAULT_BACKEND
+        # Messages in other languages are treated as "unknown" and never load a model
+        self.languages = [lang for lang in languages if lang in MODEL_NAMES]
+        self.preload_languages = [
+            lang
+            for lang in (
+                self.languages if preload_languages is None else preload_languages
+            )
+            if lang in self.languages
+        ]
+
+    def detect_language(self, text: str) -> str:
+        lang = detect_language(text)
+        return lang if lang in self.languages else "unknown"
+
+    def warmup(self) -> None:
+        """Loads the preload languages and runs one forward pass through each."""
+        for lang in self.preload_languages:
+            predict_toxicity_batch(["warmup"], lang, backend=self.backend)
+
+    def is_ready(self) -> bool:
+        """True once every preload language has its model resident."""
+        return all(
+            (self.backend.name, lang) in _models for lang in self.preload_languages
+        )
 
     def mask_toxic_fragments(self, text: str, lang: str, threshold: float = 0.2) -> str:
         if lang not in {"en", "ru"}:
@@ -91,31 +180,27 @@ class SafetyClassifierRepository(IMLServiceRepository):
                 text = text.replace(ex, protect(ex))
 
             words = text.split()
+            scores = score_words(
+                [w for w in words if w not in protected_map],
+                *get_model("en", self.backend),
+                self.mask_batch_size,
+            )
             masked_words = []
             for word in words:
                 if word in protected_map:
                     masked_words.append(word)
                     continue
-                inputs = en_tokenizer(
-                    word, return_tensors="pt", truncation=True, padding=True
-                )
-                with torch.no_grad():
-                    logits = en_model(**inputs).logits.squeeze()
-                    probs = torch.sigmoid(logits).tolist()
-                score = max(probs)
+                score = max(scores[word])
                 masked_words.append("***" if score > threshold else word)
 
         elif lang == "ru":
             words = text.split()
+            scores = score_words(
+                words, *get_model("ru", self.backend), self.mask_batch_size
+            )
             masked_words = []
             for word in words:
-                inputs = ru_tokenizer(
-                    word, return_tensors="pt", truncation=True, padding=True
-                )
-                with torch.no_grad():
-                    logits = ru_model(**inputs).logits.squeeze()
-                    probs = torch.sigmoid(logits).tolist()
-                score = max(probs[1:])
+                score = max(scores[word][1:])
                 masked_words.append("*" * len(word) if score > threshold else word)
 
         # Восстанавливаем защищённые фразы
@@ -127,17 +212,49 @@ class SafetyClassifierRepository(IMLServiceRepository):
 
     def process(self, message: BotMessage) -> ServiceCheckResult:
         txt = message.answer
-        lang = detect_language(txt)
+        lang = self.detect_language(txt)
 
         if lang == "en":
-            score_map = predict_toxicity_en(txt)
+            score_map = predict_toxicity_en(txt, self.backend)
+        elif lang == "ru":
+            score_map = predict_toxicity_ru(txt, self.backend)
+        else:
+            score_map = {"unknown": 0.0}
+        return self._build_result(message, lang, score_map)
+
+    def process_batch(self, messages: List[BotMessage]) -> List[ServiceCheckResult]:
+        """Classifies a batch of messages with one padded forward per language.
+
+        Messages are grouped by detected language and sorted by token length
+        inside each group, so padding stays small. Results are returned in the
+        order of `messages`.
+        """
+        langs = [self.detect_language(m.answer) for m in messages]
+        score_maps: List[dict] = [{"unknown": 0.0} for _ in messages]
+        for lang in ("en", "ru"):
+            idx = [i for i, message_lang in enumerate(langs) if message_lang == lang]
+            if not idx:
+                continue
+            texts = [messages[i].answer for i in idx]
+            for i, score_map in zip(
+                idx, predict_toxicity_batch(texts, lang, self.batch_size, self.backend)
+            ):
+                score_maps[i] = score_map
+        return [
+            self._build_result(message, lang, score_map)
+            for message, lang, score_map in zip(messages, langs, score_maps)
+        ]
+
+    def _build_result(
+        self, message: BotMessage, lang: str, score_map: dict
+    ) -> ServiceCheckResult:
+        txt = message.answer
+        if lang == "en":
             tox_score = max(score_map.values())
         elif lang == "ru":
-            score_map = predict_toxicity_ru(txt)
             tox_score = max([v for k, v in score_map.items() if k != "non-toxic"])
         else:
             tox_score = 0.0
-            score_map = {"unknown": 0.0}
         safe = is_safe(tox_score)
         masked_message = txt
         if not (safe) and self.mask:
@@ -159,7 +276,8 @@ def is_safe(score) -> bool:
         return True
 
 
-def predict_toxicity_en(text: str) -> dict:
+def predict_toxicity_en(text: str, backend: Optional[InferenceBackend] = None) -> dict:
+    en_tokenizer, en_model = get_model("en", backend)
     inputs = en_tokenizer(
         text, return_tensors="pt", truncation=True, padding=True, max_length=512
     )
@@ -169,7 +287,8 @@ def predict_toxicity_en(text: str) -> dict:
     return dict(zip(EN_LABELS, probs))
 
 
-def predict_toxicity_ru(text: str) -> dict:
+def predict_toxicity_ru(text: str, backend: Optional[InferenceBackend] = None) -> dict:
+    ru_tokenizer, ru_model = get_model("ru", backend)
     inputs = ru_tokenizer(
         text, return_tensors="pt", truncation=True, padding=True, max_length=512
     )
@@ -177,3 +296,31 @@ def predict_toxicity_ru(text: str) -> dict:
         logits = ru_model(**inputs).logits.squeeze()
         probs = torch.sigmoid(logits).tolist()
     return dict(zip(RU_LABELS, probs))
+
+
+def predict_toxicity_batch(
+    texts: List[str],
+    lang: str,
+    batch_size: int = 16,
+    backend: Optional[InferenceBackend] = None,
+) -> list:
+    """Batched version of predict_toxicity_en / predict_toxicity_ru.
+
+    Texts are sorted by token length and padded per chunk of `batch_size`.
+    """
+    tokenizer, model = get_model(lang, backend)
+    labels = LABELS[lang]
+    encodings = tokenizer(texts, truncation=True, max_length=512)
+    order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]))
+    results: list = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        chunk = order[start : start + batch_size]
+        inputs = tokenizer.pad(
+            {key: [encodings[key][i] for i in chunk] for key in encodings.keys()},
+            return_tensors="pt",
+        )
+        with torch.no_grad():
+            probs = torch.sigmoid(model(**inputs).logits).tolist()
+        for i, row in zip(chunk, probs):
+            results[i] = dict(zip(labels, row))
+    return results
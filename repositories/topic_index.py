@@ -0,0 +1,235 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from repositories.embedding_cache import text_key
+
+"""
+TOPIC INDEX FOR DOMAIN-LEVEL OFF-TOPIC SCORING
+
+Матрица эмбеддингов разрешённых тем домена бота. Ответ сравнивается со всей
+матрицей одним умножением (векторы нормированы, так что это косинусное
+сходство), оценка темы — максимум по её примерам, в результат идут top-k тем.
+
+Темы задаются JSON-файлом:
+
+    [{"name": "Доставка", "texts": ["Сроки доставки заказа", "Курьер не приехал"]}]
+
+Посчитанные векторы кешируются рядом, в `<topics>.index.npz`, с ключом
+blake2b(версия модели + текст). При добавлении тем в файл (или через
+`add_topics`) перекодируются только новые и изменённые тексты; при смене
+версии модели — все.
+
+Несколько реплик могут делить один каталог: пересборка идёт под `flock` на
+`<index>.lock`, а файлы пишутся во временный файл с уникальным именем рядом
+и подменяются через `os.replace`, так что читатель видит либо старый, либо
+новый файл целиком.
+"""
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+
+@dataclass(frozen=True)
+class Topic:
+    name: str
+    texts: List[str] = field(default_factory=list)
+
+    def all_texts(self) -> List[str]:
+        """Название темы тоже служит её примером."""
+        return [self.name] + [text for text in self.texts if text != self.name]
+
+
+def load_topics(path: str) -> List[Topic]:
+    with open(path, "r", encoding="utf-8") as file:
+        return [Topic(t["name"], list(t.get("texts", []))) for t in json.load(file)]
+
+
+def _atomic_write(path: str, write: Callable, mode: str = "wb", **kwargs) -> None:
+    """Пишет файл через уникальный временный файл в том же каталоге."""
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as file:
+            write(file)
+        # mkstemp создаёт файл 0600, а кеш читают и другие реплики
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TopicIndex:
+    """Матрица эмбеддингов тем с top-k поиском.
+
+    Args:
+        topics_path: JSON-файл с темами.
+        index_path: Кеш векторов; по умолчанию `<topics_path>.index.npz`.
+        top_k: Сколько тем возвращать по умолчанию.
+    """
+
+    def __init__(
+        self, topics_path: str, index_path: Optional[str] = None, top_k: int = 3
+    ):
+        self.topics_path = topics_path
+        self.index_path = index_path or f"{topics_path}.index.npz"
+        self.top_k = max(1, top_k)
+        self.version: Optional[str] = None
+        self._topics_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._topics: List[Topic] = []
+        # (нормированная матрица, первая строка каждой темы, ключи строк);
+        # строки одной темы идут подряд
+        self._index: Tuple[np.ndarray, np.ndarray, List[bytes]] = (
+            np.zeros((0, 0), dtype=np.float32),
+            np.zeros(0, dtype=np.int64),
+            [],
+        )
+
+    @property
+    def topics(self) -> List[str]:
+        return [topic.name for topic in self._topics]
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Сериализует пересборку между процессами и потоками."""
+        with self._lock, open(f"{self.index_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_cache(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with np.load(self.index_path) as data:
+                return dict(zip((bytes(k) for k in data["keys"]), data["vectors"]))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as exc:
+            # битый кеш только стоит перекодирования
+            print(f"[topic_index] Ignoring unreadable {self.index_path}: {exc}")
+            return {}
+
+    def _write_cache(self, keys: List[bytes], matrix: np.ndarray) -> None:
+        _atomic_write(
+            self.index_path,
+            lambda file: np.savez(
+                file, keys=np.array(keys, dtype="S16"), vectors=matrix
+            ),
+        )
+
+    def _rebuild(self, topics: List[Topic], encode: Encoder, version: str) -> int:
+        """Пересобирает матрицу, кодируя только тексты без готового вектора."""
+        rows = [
+            (i, text) for i, topic in enumerate(topics) for text in topic.all_texts()
+        ]
+        keys = [text_key(text, version) for _, text in rows]
+        known = {}
+        matrix, _, old_keys = self._index
+        if self.version == version:
+            known.update(zip(old_keys, matrix))
+        else:
+            known.update(self._read_cache())
+        missing = list(
+            dict.fromkeys(t for (_, t), k in zip(rows, keys) if k not in known)
+        )
+        if missing:
+            for text, vector in zip(missing, _normalize_rows(encode(missing))):
+                known[text_key(text, version)] = vector
+        new_matrix = (
+            np.stack([known[key] for key in keys]).astype(np.float32)
+            if keys
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+        starts = np.flatnonzero(np.diff([-1] + [i for i, _ in rows]))
+        if missing or self.version != version:
+            self._write_cache(keys, new_matrix)
+        # подмена одной ссылкой: идущие поиски дорабатывают со старой матрицей
+        self._topics = topics
+        self._index = (new_matrix, starts, keys)
+        self.version = version
+        return len(missing)
+
+    def build(self, encode: Encoder, version: str) -> int:
+        """Загружает темы из файла и пересобирает индекс, если что-то изменилось.
+
+        Args:
+            encode: Функция "список текстов -> матрица эмбеддингов".
+            version: Версия модели; при её смене векторы считаются заново.
+
+        Returns:
+            int: Сколько текстов пришлось закодировать.
+        """
+        mtime = os.stat(self.topics_path).st_mtime_ns
+        if mtime == self._topics_mtime and version == self.version:
+            return 0
+        with self._file_lock():
+            mtime = os.stat(self.topics_path).st_mtime_ns
+            if mtime == self._topics_mtime and version == self.version:
+                return 0
+            encoded = self._rebuild(load_topics(self.topics_path), encode, version)
+            self._topics_mtime = mtime
+            return encoded
+
+    def add_topics(self, topics: List[Topic], encode: Encoder, version: str) -> int:
+        """Добавляет темы в файл и в индекс, кодируя только новые тексты."""
+        with self._file_lock():
+            current = {topic.name: topic for topic in load_topics(self.topics_path)}
+            for topic in topics:
+                current[topic.name] = topic
+            merged = list(current.values())
+            _atomic_write(
+                self.topics_path,
+                lambda file: json.dump(
+                    [{"name": t.name, "texts": t.texts} for t in merged],
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                mode="w",
+                encoding="utf-8",
+            )
+            encoded = self._rebuild(merged, encode, version)
+            self._topics_mtime = os.stat(self.topics_path).st_mtime_ns
+            return encoded
+
+    def search_batch(
+        self, embeddings: np.ndarray, k: Optional[int] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Top-k тем для каждого эмбеддинга одним матричным умножением."""
+        matrix, starts, _ = self._index
+        topics = self._topics
+        queries = _normalize_rows(np.atleast_2d(embeddings))
+        if not len(matrix):
+            return [[] for _ in queries]
+        # оценка темы — максимум по её строкам
+        scores = np.maximum.reduceat(queries @ matrix.T, starts, axis=1)
+        k = min(k or self.top_k, len(topics))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, candidates in enumerate(best):
+            ordered = candidates[np.argsort(-scores[q, candidates])]
+            results.append([(topics[i].name, float(scores[q, i])) for i in ordered])
+        return results
+
+    def search(self, embedding, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top-k тем для одного эмбеддинга."""
+        return self.search_batch(np.asarray(embedding, dtype=np.float32), k)[0]
@@ -0,0 +1,139 @@
+# tests/repositories/test_ad_model_artifact.py
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+from entities.data import BotMessage
+from repositories.ad_filter import AdFilterRepository
+from repositories import ad_model_artifact
+from repositories.ad_rules import AdRuleEngine
+from repositories.ad_model_artifact import (
+    LinearAdModel,
+    export_ad_model,
+    is_artifact,
+)
+from repositories.model_registry import ModelRegistry
+
+ADS = [
+    "скидка 50% только сегодня, переходите по ссылке",
+    "купите наш товар со скидкой и бесплатной доставкой",
+    "промокод на первый заказ, успейте до конца недели",
+    "лучшие цены у партнёра, оформите кредит онлайн",
+    "акция: второй товар в подарок, звоните прямо сейчас",
+    "подпишитесь на канал и получите бонус",
+]
+PLAIN = [
+    "ваш заказ передан в доставку и приедет завтра",
+    "чтобы сменить пароль, откройте настройки профиля",
+    "мы проверили платёж, деньги вернутся в течение трёх дней",
+    "оператор ответит вам в рабочее время",
+    "документы можно загрузить в личном кабинете",
+    "спасибо за обращение, вопрос решён",
+]
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    pipe = Pipeline(
+        [
+            ("tfidf", TfidfVectorizer(max_df=0.9, ngram_range=(1, 2))),
+            ("clf", CalibratedClassifierCV(LinearSVC(), cv=3)),
+        ]
+    )
+    return pipe.fit(ADS + PLAIN, [1] * len(ADS) + [0] * len(PLAIN))
+
+
+@pytest.fixture
+def artifact(pipeline, tmp_path):
+    path = str(tmp_path / "ad_filter.bin")
+    export_ad_model(pipeline, path)
+    return path
+
+
+def test_artifact_scores_match_predict_proba_exactly(pipeline, artifact):
+    texts = (
+        ADS
+        + PLAIN
+        + [
+            "",
+            "!!!",
+            "СКИДКА скидка скидка на доставку",
+            "совсем другой текст без знакомых слов",
+            "Купите. Звоните! Оформите кредит онлайн",
+        ]
+    )
+
+    model = LinearAdModel(artifact)
+
+    assert np.array_equal(model.predict_proba(texts), pipeline.predict_proba(texts))
+
+
+def test_failed_export_leaves_the_old_artifact_and_no_temp_files(
+    pipeline, artifact, monkeypatch
+):
+    with open(artifact, "rb") as file:
+        exported = file.read()
+
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ad_model_artifact.os, "replace", crash)
+    with pytest.raises(OSError):
+        export_ad_model(pipeline, artifact)
+
+    assert os.listdir(os.path.dirname(artifact)) == ["ad_filter.bin"]
+    with open(artifact, "rb") as file:
+        assert file.read() == exported
+
+
+def test_repository_reads_the_artifact_without_pickle(pipeline, artifact):
+    repo = AdFilterRepository(artifact, registry=ModelRegistry())
+    message = BotMessage(question="Q?", answer=ADS[0])
+
+    result = repo.process(message)
+
+    assert is_artifact(artifact)
+    assert isinstance(repo.model, LinearAdModel)
+    assert result.score == pipeline.predict_proba([ADS[0]])[0, 1]
+    assert result.safe is (result.score < 0.5)
+
+
+def test_process_batch_matches_process(artifact):
+    repo = AdFilterRepository(artifact, registry=ModelRegistry())
+    messages = [BotMessage(question="Q?", answer=text) for text in ADS + PLAIN]
+
+    batched = repo.process_batch(messages)
+
+    assert [r.model_dump() for r in batched] == [
+        repo.process(m).model_dump() for m in messages
+    ]
+    assert repo.process_batch([]) == []
+
+
+def test_rules_decide_obvious_messages_without_the_model(artifact):
+    repo = AdFilterRepository(artifact, registry=ModelRegistry(), rules=AdRuleEngine())
+    messages = [
+        BotMessage(question="Q?", answer="Подробнее на https://example.com/sale"),
+        BotMessage(question="Q?", answer="Введите промокод SALE2024 при заказе"),
+        BotMessage(question="Q?", answer="Да, конечно."),
+        BotMessage(question="Q?", answer=ADS[1]),
+    ]
+
+    results = repo.process_batch(messages)
+
+    assert [(r.safe, r.stage) for r in results[:3]] == [
+        (False, "rules"),
+        (False, "rules"),
+        (True, "rules"),
+    ]
+    assert results[3].stage == "model"
+    assert results[3].model_version is not None
+    report = repo.stage_report()
+    assert report["rules_hit_rate"] == pytest.approx(0.75)
+    assert report["rule_hits"] == {"url": 1, "promo_code": 1, "short_plain_answer": 1}
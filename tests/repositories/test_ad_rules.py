@@ -0,0 +1,40 @@
+# tests/repositories/test_ad_rules.py
+
+import json
+
+import pytest
+from repositories.ad_rules import AdRuleEngine, load_ad_rules
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Подробнее на https://shop.example.com/x", ("unsafe", "url")),
+        ("Подписывайтесь: t.me/channel", ("unsafe", "messenger_link")),
+        ("Наш сайт example.рф", ("unsafe", "domain")),
+        ("Используйте купон ABCD", ("unsafe", "promo_code")),
+        ("Спасибо за обращение, вопрос решён!", ("safe", "short_plain_answer")),
+        ("", ("safe", "short_plain_answer")),
+        # left to the classifier
+        ("Пишите на ivan@mail.ru", None),
+        ("Купите наш товар", None),
+        ("Ваш заказ 12345 передан в доставку", None),
+    ],
+)
+def test_default_rules(text, expected):
+    assert AdRuleEngine().decide(text) == expected
+
+
+def test_rules_are_loaded_from_json(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            [{"name": "competitor", "verdict": "unsafe", "pattern": "(?i:конкурент)"}]
+        ),
+        encoding="utf-8",
+    )
+
+    engine = AdRuleEngine(load_ad_rules(str(path)))
+
+    assert engine.decide("У Конкурента дешевле") == ("unsafe", "competitor")
+    assert engine.decide("Да, конечно.") is None
@@ -0,0 +1,74 @@
+# tests/repositories/test_embedding_store.py
+
+import numpy as np
+import pytest
+from repositories.embedding_store import EmbeddingStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store" / "embeddings")
+
+
+def test_vectors_survive_reopening(path):
+    EmbeddingStore(path).put("What is AI?", np.arange(4))
+
+    reopened = EmbeddingStore(path)
+
+    assert reopened.get("What   is AI? ").tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert reopened.get("What is ML?") is None
+    assert reopened.stats()["hits"] == 1
+
+
+def test_namespaces_keep_model_versions_apart(path):
+    store = EmbeddingStore(path)
+    store.put("question", np.ones(4), namespace="v1")
+
+    assert store.get("question", namespace="v2") is None
+    assert store.get("question", namespace="v1") is not None
+
+
+def test_size_is_capped_by_eviction(path):
+    store = EmbeddingStore(path, capacity=16, ways=4)
+
+    for i in range(100):
+        store.put(f"text {i}", np.full(4, i))
+
+    assert len(store) == 16
+    assert store.stats()["evictions"] == 100 - 16
+    # a write never leaves a half-updated slot behind
+    for i in range(100):
+        vector = store.get(f"text {i}")
+        assert vector is None or vector.tolist() == [float(i)] * 4
+
+
+def test_vectors_of_another_width_are_rejected(path):
+    store = EmbeddingStore(path)
+    assert store.put("a", np.zeros(4)) is True
+
+    assert store.put("b", np.zeros(8)) is False
+    assert store.get("b") is None
+
+
+def test_slot_left_half_written_by_a_crash_is_rewritten(path):
+    store = EmbeddingStore(path)
+    store.put("question", np.ones(4))
+    # a writer died between the two seq updates
+    slots = store._slots["seq"]
+    slots[slots != 0] += 1
+
+    assert store.get("question") is None
+    assert len(store) == 0
+
+    assert store.put("question", np.full(4, 2.0))
+    assert store.get("question").tolist() == [2.0] * 4
+    assert len(store) == 1
+
+
+def test_only_whitespace_is_normalized(path):
+    store = EmbeddingStore(path)
+    store.put("ﬁle №1", np.ones(4))
+
+    # NFKC would fold these into "file No1", but the tokenizer sees them apart
+    assert store.get("file No1") is None
+    assert store.get(" ﬁle\t№1\n") is not None
@@ -0,0 +1,121 @@
+# tests/repositories/test_inference_backend.py
+
+import os
+
+import pytest
+import torch
+from transformers import (
+    BertConfig,
+    BertForSequenceClassification,
+    BertForTokenClassification,
+    BertTokenizerFast,
+)
+
+from repositories.inference_backend import (
+    OnnxBackend,
+    TorchBackend,
+    check_parity,
+    get_backend,
+)
+
+pytest.importorskip("onnxruntime")
+
+WORDS = ["звонил", "иванов", "петр", "вчера", "в", "офис", "москва", "##ва"]
+TEXTS = ["Звонил Иванов вчера", "Петр в офис, Москва", "вчера"]
+LABELS = {0: "O", 1: "B-PER", 2: "I-PER", 3: "B-LOC"}
+
+
+def tiny_config(**kwargs) -> BertConfig:
+    return BertConfig(
+        vocab_size=5 + len(WORDS),
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+        max_position_embeddings=64,
+        **kwargs,
+    )
+
+
+def save_tiny_model(path, model_cls, **config) -> str:
+    """A randomly initialised one-layer BERT with its own tokenizer, saved locally."""
+    os.makedirs(path)
+    vocab = os.path.join(path, "vocab.txt")
+    with open(vocab, "w", encoding="utf-8") as file:
+        file.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    BertTokenizerFast(vocab_file=vocab).save_pretrained(path)
+    torch.manual_seed(0)
+    model_cls(tiny_config(**config)).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def token_model(tmp_path_factory):
+    return save_tiny_model(
+        tmp_path_factory.mktemp("models") / "ner",
+        BertForTokenClassification,
+        id2label=LABELS,
+        label2id={label: i for i, label in LABELS.items()},
+    )
+
+
+@pytest.fixture(scope="module")
+def sequence_model(tmp_path_factory):
+    return save_tiny_model(
+        tmp_path_factory.mktemp("models") / "cls",
+        BertForSequenceClassification,
+        num_labels=3,
+        problem_type="multi_label_classification",
+    )
+
+
+def test_get_backend_parses_the_mode(tmp_path):
+    assert isinstance(get_backend("torch"), TorchBackend)
+    onnx = get_backend("onnx", str(tmp_path))
+    int8 = get_backend("onnx-int8", str(tmp_path))
+    assert (onnx.name, onnx.quantize, onnx.cache_dir) == ("onnx", False, str(tmp_path))
+    assert (int8.name, int8.quantize) == ("onnx-int8", True)
+    with pytest.raises(ValueError):
+        get_backend("tensorrt")
+
+
+@pytest.mark.parametrize("kind", ["sequence", "token"])
+def test_onnx_export_matches_torch(kind, sequence_model, token_model, tmp_path):
+    model = sequence_model if kind == "sequence" else token_model
+
+    report = check_parity(kind, model, TEXTS, OnnxBackend(str(tmp_path)))
+
+    assert report["texts"] == len(TEXTS)
+    assert report["max_abs_drift"] < 1e-4
+    # exported once, atomically: no temp files left next to the graph
+    model_dir = OnnxBackend(str(tmp_path))._model_dir(model)
+    assert os.listdir(model_dir) == ["model.onnx"]
+
+
+def test_int8_parity_is_reported(sequence_model, tmp_path):
+    report = check_parity(
+        "sequence", sequence_model, TEXTS, OnnxBackend(str(tmp_path), quantize=True)
+    )
+
+    # quantization moves scores, but only a little
+    assert 0 <= report["mean_abs_drift"] <= report["max_abs_drift"] < 0.1
+
+
+def test_onnx_token_classifier_matches_the_ner_pipeline(token_model, tmp_path):
+    expected = TorchBackend().token_classifier(token_model)(TEXTS)
+    actual = OnnxBackend(str(tmp_path)).token_classifier(token_model)(
+        TEXTS, batch_size=2
+    )
+
+    assert len(actual) == len(TEXTS)
+    assert any(actual), "the tiny model should tag at least one token"
+    for want, got in zip(expected, actual):
+        assert [{k: e[k] for k in e if k != "score"} for e in got] == [
+            {k: e[k] for k in e if k != "score"} for e in want
+        ]
+        assert [e["score"] for e in got] == pytest.approx(
+            [float(e["score"]) for e in want], abs=1e-4
+        )
+    # a single string gives a single list, like the pipeline
+    single = OnnxBackend(str(tmp_path)).token_classifier(token_model)(TEXTS[0])
+    assert single == actual[0]
@@ -0,0 +1,91 @@
+# tests/repositories/test_kafka_bus.py
+
+import asyncio
+
+from aiokafka.errors import KafkaTimeoutError
+
+from entities.data import BotMessage
+from repositories.kafka_bus import KafkaEventBus
+from use_cases.ports.event_bus import OutgoingMessage
+
+
+class FakeProducer:
+    """Records sends; each returns a delivery future settled by the test."""
+
+    def __init__(self):
+        self.sent = []
+        self.deliveries = []
+
+    async def send(self, topic, value=None, key=None, headers=None):
+        self.sent.append((topic, key, dict(headers)))
+        future = asyncio.get_running_loop().create_future()
+        self.deliveries.append(future)
+        return future
+
+
+def make_bus():
+    bus = KafkaEventBus(brokers="kafka:9092")
+    bus._producer = FakeProducer()
+    return bus
+
+
+def message() -> BotMessage:
+    return BotMessage(question="q", answer="a")
+
+
+def test_publish_many_sends_everything_before_waiting():
+    bus = make_bus()
+    producer = bus._producer
+
+    async def scenario():
+        publish = asyncio.create_task(
+            bus.publish_many(
+                [
+                    OutgoingMessage(
+                        "check-requests", message(), {"check_type": ct}, "r1"
+                    )
+                    for ct in ["pii", "safety", "ad"]
+                ]
+            )
+        )
+        await asyncio.sleep(0)
+        # all three are in flight at once, none delivered yet
+        in_flight = len(producer.sent)
+        for future in producer.deliveries:
+            future.set_result(None)
+        await publish
+        return in_flight
+
+    assert asyncio.run(scenario()) == 3
+    assert [headers["check_type"] for _, _, headers in producer.sent] == [
+        b"pii",
+        b"safety",
+        b"ad",
+    ]
+
+
+def test_publish_nowait_reports_delivery_through_the_callback():
+    bus = make_bus()
+    producer = bus._producer
+    reports = []
+
+    async def scenario():
+        for request_id in ["r1", "r2"]:
+            await bus.publish_nowait(
+                "check-results",
+                message(),
+                {"request_id": request_id},
+                key=request_id,
+                on_delivery=reports.append,
+            )
+        # returned before either message was delivered
+        assert reports == []
+        producer.deliveries[0].set_result(None)
+        producer.deliveries[1].set_exception(KafkaTimeoutError())
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert reports[0] is None
+    assert isinstance(reports[1], KafkaTimeoutError)
+    assert (bus.delivered, bus.delivery_errors) == (1, 1)
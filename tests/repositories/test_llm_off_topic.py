@@ -0,0 +1,100 @@
+# tests/repositories/test_llm_off_topic.py
+
+import asyncio
+
+import httpx
+import pytest
+from entities.data import BotMessage
+from repositories.llm_off_topic import LLMOffTopic
+from repositories.llm_off_topic_scorer import LLMOffTopicRepository
+
+
+def completion(content: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def make_llm(handler, **kwargs) -> LLMOffTopic:
+    kwargs.setdefault("backoff_base_s", 0.0)
+    return LLMOffTopic(
+        api_key="test-key", transport=httpx.MockTransport(handler), **kwargs
+    )
+
+
+def test_rate_limited_and_failed_calls_are_retried():
+    statuses = [429, 503]
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if statuses:
+            return httpx.Response(statuses.pop(0))
+        return completion("  is_relevant: да  ")
+
+    async def scenario():
+        llm = make_llm(handler)
+        answer = await llm.ask("prompt")
+        await llm.aclose()
+        return answer
+
+    assert asyncio.run(scenario()) == "is_relevant: да"
+    assert len(requests) == 3
+    assert requests[0].headers["Authorization"] == "Bearer test-key"
+
+
+def test_client_errors_are_not_retried():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(401, text="bad key")
+
+    with pytest.raises(RuntimeError, match="401: bad key"):
+        asyncio.run(make_llm(handler).ask("prompt"))
+    assert len(requests) == 1
+
+
+def test_timeouts_give_up_after_max_retries():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with pytest.raises(RuntimeError, match="ReadTimeout"):
+        asyncio.run(make_llm(handler, max_retries=2).ask("prompt"))
+    assert len(requests) == 3
+
+
+def test_concurrent_calls_are_bounded():
+    in_flight, peak = 0, 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return completion("ok")
+
+    async def scenario():
+        llm = make_llm(handler, max_concurrency=2)
+        answers = await asyncio.gather(*(llm.ask(str(i)) for i in range(6)))
+        await llm.aclose()
+        return answers
+
+    assert asyncio.run(scenario()) == ["ok"] * 6
+    assert peak == 2
+
+
+def test_repository_parses_the_llm_verdict():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return completion("is_relevant: да\nscore: 0.9")
+
+    repo = LLMOffTopicRepository(llm=make_llm(handler))
+    msg = BotMessage(question="What is AI?", answer="Artificial Intelligence.")
+
+    result = asyncio.run(repo.process(msg))
+
+    assert result.safe is True
+    assert result.score == pytest.approx(0.9)
+    assert result.error is None
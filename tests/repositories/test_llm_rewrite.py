@@ -1,16 +1,22 @@
 # tests/infrastructure/adapters/test_ollama_rewrite.py
+import asyncio
+
 import pytest
 
-from entities.data import BotMessage, LLMRequest, ServiceCheckResult
+from entities.data import LLMRequest, LLMRewriteResult
 from repositories.llm_rewrite import OllamaRewriteRepository
 
+# hosts of the clients created by the repository
+hosts = []
+
 
 class DummyClient:
     def __init__(self, host: str):
         # capture the host passed in
         self.host = host
+        hosts.append(host)
 
-    def chat(self, model: str, messages: list[dict]):
+    async def chat(self, model: str, messages: list[dict]):
         # Assert that the model and message content are forwarded correctly
         assert model == "test-model"
         # messages is a list of dicts with "role" and "content"
@@ -22,34 +28,46 @@ class DummyClient:
 @pytest.fixture(autouse=True)
 def patch_ollama_client(monkeypatch):
     """
-    Monkeypatch ollama.Client to use our DummyClient instead of
+    Monkeypatch ollama.AsyncClient to use our DummyClient instead of
     making real network calls.
     """
+    hosts.clear()
     monkeypatch.setattr("repositories.llm_rewrite.Client", DummyClient)
 
 
 def test_process_rewrites_and_returns_correct_result():
-    # Arrange: create repository, message and request
+    # Arrange: create repository and request
     repo = OllamaRewriteRepository()
-    msg = BotMessage(
-        question="Q?",
-        answer="original answer",
-    )
     req = LLMRequest(
-        prompt="PROMPT: {answer}",
+        prompt="PROMPT: original answer",
         model="test-model",
         ollama_host="https://fake-ollama",
         api_key="fake-key",
     )
 
     # Act
-    result: ServiceCheckResult = repo.process(msg, req)
+    async def scenario():
+        return [await repo.process(req), await repo.process(req)]
+
+    results = asyncio.run(scenario())
 
-    # Assert: prompt was rendered correctly
+    # Assert: prompt was forwarded as is
     assert repo.final_prompt == "PROMPT: original answer"
 
-    # Assert: correct ServiceCheckResult fields
-    assert isinstance(result, ServiceCheckResult)
-    assert result.safe is True
-    assert result.score == 1
-    assert result.masked_answer == "rewritten answer"
+    # Assert: correct LLMRewriteResult fields
+    assert all(isinstance(result, LLMRewriteResult) for result in results)
+    assert [result.answer for result in results] == ["rewritten answer"] * 2
+    # one long-lived client per host
+    assert hosts == ["https://fake-ollama"]
+
+
+def test_slow_rewrites_time_out(monkeypatch):
+    class HangingClient(DummyClient):
+        async def chat(self, model: str, messages: list[dict]):
+            await asyncio.sleep(10)
+
+    monkeypatch.setattr("repositories.llm_rewrite.Client", HangingClient)
+    repo = OllamaRewriteRepository(model="test-model", timeout_s=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(repo.process(LLMRequest(prompt="PROMPT: original answer")))
@@ -0,0 +1,82 @@
+# tests/repositories/test_micro_batcher.py
+
+import asyncio
+
+import pytest
+from repositories.micro_batcher import MicroBatcher
+
+
+def test_items_are_grouped_and_results_routed_back():
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        return [item * 10 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(batch_fn, max_batch_size=4, max_latency_ms=50)
+        futures = [await batcher.submit(i) for i in range(6)]
+        results = await asyncio.gather(*futures)
+        await batcher.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    # every caller gets its own result back, in submission order
+    assert results == [0, 10, 20, 30, 40, 50]
+    # the first batch is capped by max_batch_size, the rest is flushed by latency
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_batch_error_is_propagated_to_every_item():
+    def batch_fn(items):
+        raise RuntimeError("model failed")
+
+    async def scenario():
+        batcher = MicroBatcher(batch_fn, max_batch_size=2, max_latency_ms=1)
+        futures = [await batcher.submit(i) for i in range(2)]
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        await batcher.close()
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+
+    assert len(outcomes) == 2
+    for outcome in outcomes:
+        with pytest.raises(RuntimeError):
+            raise outcome
+
+
+def test_short_result_list_fails_every_item_instead_of_hanging():
+    def batch_fn(items):
+        return [item * 10 for item in items[:-1]]
+
+    async def scenario():
+        batcher = MicroBatcher(batch_fn, max_batch_size=3, max_latency_ms=1)
+        futures = [await batcher.submit(i) for i in range(3)]
+        outcomes = await asyncio.wait_for(
+            asyncio.gather(*futures, return_exceptions=True), 1.0
+        )
+        await batcher.close()
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+
+    # with one result missing, none of them can be matched to its item
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert "2 results for 3 items" in str(outcomes[0])
+
+
+def test_flush_waits_for_queued_items():
+    def batch_fn(items):
+        return list(items)
+
+    async def scenario():
+        batcher = MicroBatcher(batch_fn, max_batch_size=2, max_latency_ms=50)
+        futures = [await batcher.submit(i) for i in range(3)]
+        await batcher.flush()
+        done = [future.done() for future in futures]
+        await batcher.close()
+        return done
+
+    assert asyncio.run(scenario()) == [True, True, True]
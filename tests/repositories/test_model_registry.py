@@ -0,0 +1,81 @@
+# tests/repositories/test_model_registry.py
+
+import os
+import pickle
+
+import pytest
+from entities.data import BotMessage
+from repositories.ad_filter import AdFilterRepository
+from repositories.model_registry import ModelRegistry
+
+
+class ConstantModel:
+    """Pickle-able stand-in for the ad classifier."""
+
+    def __init__(self, proba: float):
+        self.proba = proba
+
+    def predict_proba(self, texts):
+        import numpy as np
+
+        return np.array([[1 - self.proba, self.proba] for _ in texts])
+
+
+def write_model(path, proba: float, mtime_ns: int):
+    with open(path, "wb") as file:
+        pickle.dump(ConstantModel(proba), file)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "ad_filter.pkl"
+    write_model(path, 0.9, 1_000_000_000)
+    return str(path)
+
+
+def test_artifact_is_loaded_once_per_registry(model_path):
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        return object()
+
+    registry = ModelRegistry(check_interval=0)
+
+    first = registry.get(model_path, loader)
+    second = registry.get(model_path, loader)
+
+    assert loads == [model_path]
+    assert first is second
+    assert len(first.version) == 12
+
+
+def test_changed_artifact_is_swapped_in(model_path):
+    registry = ModelRegistry(check_interval=0)
+    repo = AdFilterRepository(model_path, registry=registry)
+    message = BotMessage(question="Q?", answer="Купите наш товар со скидкой!")
+
+    before = repo.process(message)
+    in_flight = repo._loaded()
+    write_model(model_path, 0.1, 2_000_000_000)
+    after = repo.process(message)
+
+    assert before.safe is False and after.safe is True
+    assert before.model_version != after.model_version
+    # a request that already holds the old model keeps using it
+    assert in_flight.model.proba == pytest.approx(0.9)
+
+
+def test_broken_artifact_keeps_the_current_model(model_path):
+    registry = ModelRegistry(check_interval=0)
+    repo = AdFilterRepository(model_path, registry=registry)
+    version = repo._loaded().version
+
+    with open(model_path, "wb") as file:
+        file.write(b"half-written")
+    os.utime(model_path, ns=(3_000_000_000, 3_000_000_000))
+
+    result = repo.process(BotMessage(question="Q?", answer="text"))
+    assert result.model_version == version
+    assert result.score == pytest.approx(0.9)
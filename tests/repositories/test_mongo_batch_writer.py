@@ -0,0 +1,155 @@
+# tests/repositories/test_mongo_batch_writer.py
+
+import asyncio
+import threading
+
+from pymongo.errors import AutoReconnect
+
+from entities.data import FinalCheckResult
+from repositories.mongo_batch_writer import BatchedMongoResultRepository
+
+
+class FakeCollection:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def bulk_write(self, operations, ordered: bool = True):
+        assert ordered is False
+        self.release.wait()
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("primary stepped down")
+        self.batches.append(
+            [
+                (op._filter["request_id"], next(iter(op._doc.values()))["result"])
+                for op in operations
+            ]
+        )
+        self.updates = [next(iter(op._doc)) for op in operations]
+
+
+def result(answer: str, degraded: bool = False) -> FinalCheckResult:
+    return FinalCheckResult(
+        final_verdict_safe=not degraded,
+        violations=[],
+        masked_answer=answer,
+        all_checks={},
+        degraded=degraded,
+    )
+
+
+def answers(batch):
+    return [(request_id, doc["masked_answer"]) for request_id, doc in batch]
+
+
+def test_saves_are_coalesced_into_bulk_upserts_and_flushed_on_close():
+    collection = FakeCollection()
+    repo = BatchedMongoResultRepository(
+        collection, max_batch_size=3, max_latency_ms=1000
+    )
+
+    async def scenario():
+        acks = [
+            await repo.enqueue(request_id, result(answer))
+            for request_id, answer in [
+                ("r1", "a"),
+                ("r2", "b"),
+                ("r1", "c"),
+                ("r3", "d"),
+            ]
+        ]
+        # the second batch is still waiting for more documents
+        await repo.close()
+        # every save is acknowledged, coalesced ones included
+        await asyncio.gather(*acks)
+
+    asyncio.run(scenario())
+
+    # the first batch is capped by size; the last save of "r1" wins
+    assert [answers(batch) for batch in collection.batches] == [
+        [("r1", "c"), ("r2", "b")],
+        [("r3", "d")],
+    ]
+    stats = repo.stats()
+    assert (stats["written"], stats["coalesced"], stats["batches"]) == (3, 1, 2)
+    assert stats["queue_depth"] == 0
+
+
+def test_full_queue_applies_backpressure():
+    collection = FakeCollection()
+    collection.release.clear()  # Mongo is stuck
+    repo = BatchedMongoResultRepository(
+        collection, max_batch_size=1, max_latency_ms=0, max_queue_size=2
+    )
+
+    async def scenario():
+        # one document is being written, two more fill the queue
+        for i in range(3):
+            await repo.enqueue(f"r{i}", result("a"))
+            await asyncio.sleep(0.01)
+        blocked = asyncio.create_task(repo.enqueue("r3", result("a")))
+        await asyncio.sleep(0.05)
+        was_blocked = not blocked.done()
+        collection.release.set()
+        await blocked
+        await repo.close()
+        return was_blocked
+
+    assert asyncio.run(scenario()) is True
+    assert repo.stats()["written"] == 4
+
+
+def test_failed_batches_are_retried():
+    collection = FakeCollection(failures=2)
+    repo = BatchedMongoResultRepository(
+        collection, max_latency_ms=0, retry_backoff_s=0.001
+    )
+
+    async def scenario():
+        await repo.save("r1", result("a"))
+        await repo.close()
+
+    asyncio.run(scenario())
+
+    assert [answers(batch) for batch in collection.batches] == [[("r1", "a")]]
+    assert repo.stats()["failed"] == 0
+
+
+def test_save_fails_when_the_batch_is_dropped():
+    collection = FakeCollection(failures=2)
+    repo = BatchedMongoResultRepository(
+        collection, max_latency_ms=0, max_retries=1, retry_backoff_s=0.001
+    )
+
+    async def scenario():
+        try:
+            await repo.save("r1", result("a"))
+        except AutoReconnect:
+            return "failed"
+        finally:
+            await repo.close()
+        return "saved"
+
+    # the caller learns the result is not stored, so it keeps its own copy
+    assert asyncio.run(scenario()) == "failed"
+    assert repo.stats()["failed"] == 1
+
+
+def test_degraded_result_never_replaces_a_complete_one():
+    collection = FakeCollection()
+    repo = BatchedMongoResultRepository(collection, max_latency_ms=1000)
+
+    async def scenario():
+        await repo.enqueue("r1", result("complete"))
+        await repo.enqueue("r1", result("degraded", degraded=True))
+        await repo.enqueue("r2", result("degraded", degraded=True))
+        await repo.close()
+
+    asyncio.run(scenario())
+
+    assert answers(collection.batches[0]) == [("r1", "complete"), ("r2", "degraded")]
+    # a degraded result is only inserted, never written over a stored one
+    assert collection.updates == ["$set", "$setOnInsert"]
@@ -0,0 +1,96 @@
+# tests/repositories/test_off_topic_cascade.py
+
+import asyncio
+import threading
+
+import pytest
+from entities.data import BotMessage, ServiceCheckResult
+from repositories.off_topic_cascade import OffTopicCascadeRepository
+
+
+class FakeEmbedding:
+    """Scores are looked up by answer."""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.threads = []
+
+    def process(self, message: BotMessage) -> ServiceCheckResult:
+        self.threads.append(threading.get_ident())
+        score = self.scores[message.answer]
+        return ServiceCheckResult(
+            safe=score >= 0.5,
+            score=score,
+            masked_answer=message.answer,
+            question=message.question,
+            model_version="v1",
+        )
+
+
+class FakeLLM:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    async def process(self, message: BotMessage) -> ServiceCheckResult:
+        self.calls.append(message.answer)
+        return ServiceCheckResult(
+            safe=False, score=0.1, masked_answer=message.answer, error=self.error
+        )
+
+
+def run(cascade, answers):
+    async def scenario():
+        return [
+            await cascade.process(BotMessage(question="q", answer=answer))
+            for answer in answers
+        ]
+
+    return asyncio.run(scenario())
+
+
+def test_only_uncertain_scores_are_escalated():
+    llm = FakeLLM()
+    cascade = OffTopicCascadeRepository(
+        FakeEmbedding({"on": 0.9, "off": 0.1, "unsure": 0.55}),
+        llm,
+        uncertain_low=0.4,
+        uncertain_high=0.6,
+    )
+
+    on, off, unsure = run(cascade, ["on", "off", "unsure"])
+
+    assert llm.calls == ["unsure"]
+    assert (on.safe, on.stage) == (True, "embedding")
+    assert (off.safe, off.stage) == (False, "embedding")
+    # the LLM overrules the embedding verdict
+    assert (unsure.safe, unsure.score, unsure.stage) == (False, 0.1, "llm")
+    assert unsure.question == "q"
+    assert unsure.model_version == "v1"
+
+    report = cascade.stage_report()
+    assert report["messages"] == 3
+    assert report["escalation_rate"] == pytest.approx(1 / 3)
+    assert report["llm_p99_ms"] >= report["llm_p50_ms"] > 0
+
+
+def test_llm_errors_keep_the_embedding_verdict():
+    cascade = OffTopicCascadeRepository(
+        FakeEmbedding({"unsure": 0.55}), FakeLLM(error="rate limited")
+    )
+
+    (result,) = run(cascade, ["unsure"])
+
+    assert (result.safe, result.score, result.stage) == (True, 0.55, "embedding")
+    assert result.error is None
+    assert cascade.stage_report()["llm_errors"] == 1
+
+
+def test_embedding_stage_runs_off_the_event_loop():
+    embedding = FakeEmbedding({"on": 0.9})
+    cascade = OffTopicCascadeRepository(embedding, FakeLLM())
+
+    run(cascade, ["on"])
+
+    # the encoder must not block the loop, nor the LLM calls in flight
+    assert embedding.threads != [threading.get_ident()]
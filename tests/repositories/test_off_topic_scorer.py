@@ -2,6 +2,8 @@
 
 import pytest
 from entities.data import BotMessage, ServiceCheckResult
+from repositories.embedding_cache import EmbeddingCache
+from repositories.model_registry import ModelRegistry
 from repositories.off_topic_scorer import OffTopicRepository
 
 
@@ -14,18 +16,25 @@ class DummyTensor:
         return self._value
 
 
+# Batches passed to DummyModel.encode
+encoded = []
+
+
 # Fixture to patch SentenceTransformer and util.cos_sim
 @pytest.fixture(autouse=True)
 def patch_sentence_transformers_and_util(monkeypatch):
+    encoded.clear()
+
     # Stub out the SentenceTransformer so it returns a dummy model
     class DummyModel:
         def __init__(self, model_name: str):
             # verify that the repository passes the correct model_name
             assert model_name == "test-model"
 
-        def encode(self, text: str, convert_to_tensor: bool = True):
-            # Return the text itself so we can inspect it if needed
-            return f"vec-{text}"
+        def encode(self, texts, convert_to_tensor: bool = True):
+            # Return the texts themselves so we can inspect them if needed
+            encoded.append(list(texts))
+            return [f"vec-{text}" for text in texts]
 
     monkeypatch.setattr("repositories.off_topic_scorer.SentenceTransformer", DummyModel)
 
@@ -72,3 +81,117 @@ def test_process_marks_off_topic_as_unsafe(monkeypatch):
     assert result.safe is False
     assert result.score == pytest.approx(0.3)
     assert result.masked_answer == msg.answer
+
+
+def test_question_and_answer_are_encoded_in_one_batch():
+    repo = OffTopicRepository(model_name="test-model", registry=ModelRegistry())
+
+    repo.process(BotMessage(question="What is AI?", answer="Artificial Intelligence."))
+
+    assert encoded == [["What is AI?", "Artificial Intelligence."]]
+
+
+def test_repeated_texts_come_from_the_cache():
+    cache = EmbeddingCache(max_size=2)
+    repo = OffTopicRepository(
+        model_name="test-model", registry=ModelRegistry(), cache=cache
+    )
+
+    repo.process(BotMessage(question="What is AI?", answer="A field of CS."))
+    repo.process(BotMessage(question="What  is AI? ", answer="Machine learning."))
+
+    # the normalized question hits the cache, only the new answer is encoded
+    assert encoded == [["What is AI?", "A field of CS."], ["Machine learning."]]
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "hit_rate": 0.25,
+        "size": 2,
+        "max_size": 2,
+        "evictions": 1,
+    }
+
+
+def test_embeddings_are_shared_through_the_store(tmp_path, monkeypatch):
+    import torch
+    from repositories.embedding_store import EmbeddingStore
+
+    monkeypatch.setattr(
+        "repositories.off_topic_scorer.util.cos_sim", lambda a, b: DummyTensor(0.9)
+    )
+
+    class VectorModel:
+        def encode(self, texts, convert_to_tensor: bool = True):
+            encoded.append(list(texts))
+            return torch.tensor([[float(len(t)), 1.0] for t in texts])
+
+    class VectorBackend:
+        name = "vector"
+
+        def sentence_encoder(self, model_name: str):
+            return VectorModel()
+
+    def make_repo():
+        return OffTopicRepository(
+            model_name="test-model",
+            backend=VectorBackend(),
+            registry=ModelRegistry(),
+            store=EmbeddingStore(str(tmp_path / "embeddings")),
+        )
+
+    message = BotMessage(question="What is AI?", answer="A field of CS.")
+    make_repo().process(message)
+    # e.g. another replica, or the same worker after a restart
+    make_repo().process(message)
+
+    assert encoded == [["What is AI?", "A field of CS."]]
+
+    # a replica on another backend does not reuse these vectors
+    VectorBackend.name = "vector-int8"
+    make_repo().process(message)
+    assert len(encoded) == 2
+
+
+def test_topics_mode_scores_the_answer_against_the_topic_index(tmp_path):
+    import json
+    import torch
+    from repositories.topic_index import TopicIndex
+
+    vectors = {
+        "Доставка": [1.0, 0.0],
+        "Оплата": [0.0, 1.0],
+        "Где мой заказ?": [0.8, 0.6],
+    }
+
+    class VectorModel:
+        def encode(self, texts, convert_to_tensor: bool = True):
+            encoded.append(list(texts))
+            return torch.tensor([vectors[t] for t in texts])
+
+    class VectorBackend:
+        name = "vector"
+
+        def sentence_encoder(self, model_name: str):
+            return VectorModel()
+
+    topics_path = tmp_path / "topics.json"
+    topics_path.write_text(json.dumps([{"name": "Доставка"}, {"name": "Оплата"}]))
+    repo = OffTopicRepository(
+        model_name="test-model",
+        backend=VectorBackend(),
+        registry=ModelRegistry(),
+        topic_index=TopicIndex(str(topics_path), top_k=2),
+        mode="topics",
+        topic_threshold=0.7,
+    )
+
+    result = repo.process(BotMessage(question="Привет", answer="Где мой заказ?"))
+
+    assert result.safe is True
+    assert result.score == pytest.approx(0.8)
+    assert [(m.topic, round(m.score, 4)) for m in result.topic_matches] == [
+        ("Доставка", 0.8),
+        ("Оплата", 0.6),
+    ]
+    # the question is not needed in this mode
+    assert encoded == [["Где мой заказ?"], ["Доставка", "Оплата"]]
@@ -0,0 +1,88 @@
+# tests/repositories/test_partition_dispatcher.py
+
+import asyncio
+from collections import namedtuple
+
+from repositories.partition_dispatcher import PartitionDispatcher
+
+Record = namedtuple("Record", "partition offset")
+
+
+def records(partition, offsets):
+    return [Record(partition, offset) for offset in offsets]
+
+
+def test_partitions_run_concurrently_in_order_within_each():
+    handled = []
+    release = {}
+
+    async def handler(record):
+        # records of partition 0 block until released
+        if record.partition == 0:
+            await release[0].wait()
+        handled.append(record)
+
+    async def scenario():
+        release[0] = asyncio.Event()
+        dispatcher = PartitionDispatcher(handler, max_in_flight=10)
+        dispatcher.submit(0, records(0, [0, 1]))
+        dispatcher.submit(1, records(1, [5, 6, 7]))
+        await asyncio.sleep(0.01)
+        # the slow partition does not hold up the other one
+        assert dispatcher.take_offsets() == {1: 8}
+        assert dispatcher.in_flight == 2
+        release[0].set()
+        await asyncio.sleep(0.01)
+        return dispatcher
+
+    dispatcher = asyncio.run(scenario())
+
+    assert [r.offset for r in handled if r.partition == 0] == [0, 1]
+    assert [r.offset for r in handled if r.partition == 1] == [5, 6, 7]
+    assert dispatcher.take_offsets() == {0: 2}
+    assert dispatcher.stats()["processed"] == 5
+
+
+def test_failed_record_is_never_committed():
+    async def handler(record):
+        if record.offset == 1:
+            raise RuntimeError("boom")
+
+    async def scenario():
+        dispatcher = PartitionDispatcher(handler, max_in_flight=10)
+        dispatcher.submit(0, records(0, [0, 1, 2]))
+        await dispatcher.wait_for_capacity(0.01)
+        await asyncio.sleep(0.01)
+        return dispatcher
+
+    dispatcher = asyncio.run(scenario())
+
+    assert isinstance(dispatcher.error, RuntimeError)
+    assert dispatcher.take_offsets() == {0: 1}
+
+
+def test_full_dispatcher_waits_and_revoke_drops_queued_records():
+    started = []
+
+    async def handler(record):
+        started.append(record.offset)
+        await asyncio.sleep(0.02)
+
+    async def scenario():
+        dispatcher = PartitionDispatcher(handler, max_in_flight=3)
+        dispatcher.submit(0, records(0, [0, 1, 2]))
+        assert dispatcher.full() and dispatcher.room() == 0
+        await dispatcher.wait_for_capacity(1.0)
+        assert not dispatcher.full()
+
+        dispatcher.submit(0, records(0, [3]))
+        await asyncio.sleep(0)
+        # the record being handled finishes, the queued ones are left to the next owner
+        offsets = await dispatcher.revoke([0])
+        return dispatcher, offsets
+
+    dispatcher, offsets = asyncio.run(scenario())
+
+    assert offsets == {0: 2}
+    assert started == [0, 1]
+    assert dispatcher.in_flight == 0
@@ -0,0 +1,88 @@
+# tests/repositories/test_pending_store.py
+
+from repositories.pending_store import PendingStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_requests_expire_at_their_deadline_with_partial_results():
+    clock = Clock()
+    store = PendingStore(ttl_s=10, clock=clock)
+    store.add("r1", "pii", "pii-result")
+    clock.now = 5
+    store.add("r2", "ad", "ad-result")
+    store.add("r1", "safety", "safety-result")
+
+    clock.now = 9.9
+    assert store.pop_expired() == []
+    assert store.next_deadline() == 10
+
+    clock.now = 10
+    assert store.pop_expired() == [
+        ("r1", {"pii": "pii-result", "safety": "safety-result"})
+    ]
+    assert store.stats()["oldest_age_s"] == 5
+    # a result arriving after the request was finalized does not reopen it
+    assert store.add("r1", "ad", "late") is None
+    assert "r1" not in store
+
+
+def test_completed_requests_never_expire():
+    clock = Clock()
+    store = PendingStore(ttl_s=10, clock=clock)
+    store.add("r1", "pii", "pii-result")
+
+    assert store.pop("r1") == {"pii": "pii-result"}
+    clock.now = 100
+    assert store.pop_expired() == []
+    assert store.next_deadline() is None
+
+
+def test_oldest_request_is_evicted_when_full():
+    clock = Clock()
+    store = PendingStore(ttl_s=10, max_entries=2, clock=clock)
+    for i, request_id in enumerate(["r1", "r2", "r3"]):
+        clock.now = i
+        store.add(request_id, "pii", request_id)
+
+    assert len(store) == 2
+    assert store.next_deadline() == clock.now
+    assert store.pop_expired() == [("r1", {"pii": "r1"})]
+    assert store.stats() == {
+        "pending": 2,
+        "max_entries": 2,
+        "oldest_age_s": 1,
+        "completed": 0,
+        "timeouts": 0,
+        "evictions": 1,
+        "late_results": 0,
+    }
+
+
+def test_discarded_requests_can_come_back():
+    clock = Clock()
+    store = PendingStore(ttl_s=10, clock=clock)
+    store.add("r1", "pii", "pii-result")
+
+    # handed over to another aggregator: neither finalized nor closed
+    assert store.discard("r1") == {"pii": "pii-result"}
+    clock.now = 100
+    assert store.pop_expired() == []
+    assert store.add("r1", "ad", "ad-result") == {"ad": "ad-result"}
+    assert store.stats()["late_results"] == 0
+
+
+def test_requests_closed_elsewhere_reject_redelivered_results():
+    store = PendingStore(ttl_s=10, clock=Clock())
+    # restored from the changelog after a restart
+    store.mark_closed("r1")
+
+    assert store.add("r1", "pii", "redelivered") is None
+    assert "r1" not in store
+    assert store.stats()["late_results"] == 1
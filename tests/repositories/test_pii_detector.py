@@ -0,0 +1,151 @@
+# tests/repositories/test_pii_detector.py
+
+import pytest
+from entities.data import BotMessage, ServiceCheckResult
+from repositories.pii_detector import PIIDetectorRepository
+
+
+class DummyNER:
+    """Tags "Иванов" as a last name, like the HF pipeline would."""
+
+    def __init__(self):
+        self.texts = []
+        self.batches = []
+
+    def __call__(self, texts, batch_size=1):
+        self.batches.append((list(texts), batch_size))
+        self.texts.extend(texts)
+        return [self._tag(text) for text in texts]
+
+    def _tag(self, text):
+        start = text.find("Иванов")
+        if start < 0:
+            return []
+        return [
+            {
+                "entity": "B-LAST_NAME",
+                "word": "Иванов",
+                "start": start,
+                "end": start + len("Иванов"),
+            }
+        ]
+
+
+class DummyBackend:
+    name = "dummy"
+
+    def __init__(self):
+        self.loaded = 0
+        self.ner = DummyNER()
+
+    def token_classifier(self, model_name: str):
+        self.loaded += 1
+        return self.ner
+
+
+@pytest.fixture
+def backend():
+    return DummyBackend()
+
+
+def test_ner_is_not_loaded_until_a_name_candidate_appears(backend):
+    repo = PIIDetectorRepository(backend=backend)
+
+    repo.process(BotMessage(question="как дела?", answer="Всё хорошо, спасибо."))
+    assert backend.loaded == 0
+
+    repo.process(BotMessage(question="кто звонил?", answer="Звонил Иванов."))
+    assert backend.loaded == 1
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Спасибо за вопрос. Как вам помочь?", False),
+        ("это ответ без имён и заглавных букв", False),
+        ("Передайте документы Петрову завтра", True),
+        ("Иванов придёт завтра", True),
+        ("передайте, что звонил сергей", True),
+    ],
+)
+def test_name_candidate_precheck(backend, text, expected):
+    repo = PIIDetectorRepository(backend=backend)
+
+    assert repo._has_name_candidates(text) is expected
+
+
+def test_skipped_ner_passes_are_counted(backend):
+    repo = PIIDetectorRepository(backend=backend)
+
+    result: ServiceCheckResult = repo.process(
+        BotMessage(
+            question="как связаться?",
+            answer="Звонил Иванов, номер телефона 89161234567",
+        )
+    )
+
+    # the question has no candidates, the answer has one
+    assert repo.ner_stats == {"calls": 1, "skipped": 1}
+    assert repo.ner_skip_ratio() == pytest.approx(0.5)
+    assert backend.ner.texts == ["Звонил Иванов, номер телефона 89161234567"]
+    assert result.safe is False
+    assert result.masked_answer == "Звонил ******, номер телефона ***********"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "номер телефона +79161234567, почта ivan.petrov@mail.ru",
+        "паспорт серия 4510 номер 123456, или 4510123456",
+        "пишите на a@b.ru@c.com или x.y-z@host.example.org",
+        "без данных, только цифры 12345",
+    ],
+)
+def test_single_pass_scan_matches_separate_regexes(backend, text):
+    repo = PIIDetectorRepository(backend=backend)
+    # the original detector: one finditer per regex, passports only by keyword
+    passport = any(word in text.lower() for word in repo.PASSPORT_WORDS)
+    checks = [
+        ("PHONE", repo.PHONE_REGEX, True),
+        ("EMAIL", repo.EMAIL_REGEX, True),
+        ("PASSPORT", repo.PASSPORT_REGEX, passport),
+        ("PASSPORT_SERIES", repo.PASSPORT_SERIES_REGEX, passport),
+        ("PASSPORT_NUMBER", repo.PASSPORT_NUMBER_REGEX, passport),
+    ]
+    expected = [
+        {"type": mtype, "match": m.group(), "span": m.span()}
+        for mtype, regex, enabled in checks
+        if enabled
+        for m in regex.finditer(text)
+    ]
+
+    assert repo._find_regex(text) == expected
+
+
+def test_process_batch_runs_ner_once_and_matches_process(backend):
+    messages = [
+        BotMessage(question="кто звонил?", answer="Звонил Иванов, почта a@b.ru"),
+        BotMessage(
+            question="как дела?", answer="всё хорошо, номер телефона 89161234567"
+        ),
+        BotMessage(
+            question="паспорт?", answer="серия 4510 номер 123456, спросите Иванов"
+        ),
+    ]
+    repo = PIIDetectorRepository(backend=backend, ner_batch_size=4)
+
+    batched = repo.process_batch(messages)
+
+    assert backend.ner.batches == [
+        (
+            [
+                "Звонил Иванов, почта a@b.ru",
+                "серия 4510 номер 123456, спросите Иванов",
+            ],
+            4,
+        )
+    ]
+    single = PIIDetectorRepository(backend=DummyBackend())
+    assert [r.model_dump() for r in batched] == [
+        single.process(m).model_dump() for m in messages
+    ]
@@ -0,0 +1,105 @@
+# tests/repositories/test_rewrite_cache.py
+
+import asyncio
+
+from entities.data import LLMRequest, LLMRewriteResult
+from repositories.rewrite_cache import (
+    CachedRewriteRepository,
+    MemoryRewriteCache,
+    rewrite_cache_key,
+)
+
+
+class SlowRewriter:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.prompts = []
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        self.prompts.append(request.prompt)
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("LLM is down")
+        return LLMRewriteResult(answer=f"rewritten {request.prompt}")
+
+
+def request(prompt: str, key: str = "k1") -> LLMRequest:
+    return LLMRequest(prompt=prompt, cache_key=key)
+
+
+def test_key_ignores_whitespace_and_problem_order_but_not_prompt_version():
+    key = rewrite_cache_key("Купите  у нас", ["ad", "off_topic"], "Где заказ?", "1")
+
+    assert key == rewrite_cache_key(
+        "Купите у нас ", ["off_topic", "ad"], "Где заказ?", "1"
+    )
+    assert key != rewrite_cache_key("Купите у нас", ["ad"], "Где заказ?", "1")
+    assert key != rewrite_cache_key(
+        "Купите у нас", ["ad", "off_topic"], "Где заказ?", "2"
+    )
+
+
+def test_concurrent_identical_rewrites_share_one_llm_call():
+    rewriter = SlowRewriter()
+    cached = CachedRewriteRepository(rewriter, MemoryRewriteCache())
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(cached.process(request("p")) for _ in range(5))
+        )
+        # later calls are served from the cache
+        results.append(await cached.process(request("p")))
+        # requests without a key bypass the cache
+        await cached.process(LLMRequest(prompt="uncached"))
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [r.answer for r in results] == ["rewritten p"] * 6
+    assert rewriter.prompts == ["p", "uncached"]
+    assert cached.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "coalesced": 4,
+        "hit_rate": 0.5,
+    }
+    assert cached._inflight == {}
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    rewriter = SlowRewriter(fail=True)
+    cached = CachedRewriteRepository(rewriter, MemoryRewriteCache())
+
+    async def scenario():
+        outcomes = await asyncio.gather(
+            *(cached.process(request("p")) for _ in range(3)), return_exceptions=True
+        )
+        rewriter.fail = False
+        outcomes.append(await cached.process(request("p")))
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+
+    assert all(isinstance(o, RuntimeError) for o in outcomes[:3])
+    assert outcomes[3].answer == "rewritten p"
+    assert rewriter.prompts == ["p", "p"]
+
+
+def test_memory_backend_expires_and_evicts_entries():
+    now = [0.0]
+    cache = MemoryRewriteCache(max_size=2, ttl_s=10, clock=lambda: now[0])
+
+    async def scenario():
+        await cache.set("a", "A")
+        await cache.set("b", "B")
+        assert await cache.get("a") == "A"  # "b" is now the least recently used
+        await cache.set("c", "C")
+        found = [await cache.get(key) for key in "abc"]
+        now[0] = 10.0
+        return found, await cache.get("a")
+
+    found, expired = asyncio.run(scenario())
+
+    assert found == ["A", None, "C"]
+    assert expired is None
+    assert len(cache) == 1
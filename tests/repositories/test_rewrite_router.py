@@ -0,0 +1,86 @@
+# tests/repositories/test_rewrite_router.py
+
+import asyncio
+
+import pytest
+from entities.data import LLMRequest, LLMRewriteResult
+from repositories.rewrite_router import RoutingRewriteRepository
+
+
+class FakeBackend:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def process(self, request: LLMRequest) -> LLMRewriteResult:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return LLMRewriteResult(answer=self.name)
+
+
+def rewrite(router, times: int = 1):
+    async def scenario():
+        return [
+            (await router.process(LLMRequest(prompt="p"))).answer for _ in range(times)
+        ]
+
+    return asyncio.run(scenario())
+
+
+def test_requests_go_to_the_fastest_backend():
+    slow, fast = FakeBackend("slow", delay=0.03), FakeBackend("fast", delay=0.0)
+    router = RoutingRewriteRepository({"slow": slow, "fast": fast})
+
+    answers = rewrite(router, times=4)
+
+    # both are tried once while they have no history, then "fast" wins
+    assert answers == ["slow", "fast", "fast", "fast"]
+    assert router.ranked() == ["fast", "slow"]
+
+
+def test_errors_fail_over_and_mark_the_backend_unhealthy():
+    broken, backup = FakeBackend("broken", fail=True), FakeBackend("backup")
+    router = RoutingRewriteRepository(
+        {"broken": broken, "backup": backup}, recovery_s=60
+    )
+
+    assert rewrite(router, times=3) == ["backup"] * 3
+    assert broken.calls == 1
+    assert router.failovers == 1
+    assert router.stats()["backends"]["broken"]["healthy"] is False
+
+
+def test_slow_first_backend_is_hedged():
+    stuck, quick = FakeBackend("stuck", delay=1.0), FakeBackend("quick", delay=0.0)
+    router = RoutingRewriteRepository(
+        {"stuck": stuck, "quick": quick}, hedge_after_s=0.01
+    )
+
+    assert rewrite(router) == ["quick"]
+    assert router.hedges == 1
+    # the cancelled attempt still counts as at least 10 ms of latency
+    assert router.ranked() == ["quick", "stuck"]
+
+
+def test_deadline_bounds_the_whole_request():
+    router = RoutingRewriteRepository(
+        {"a": FakeBackend("a", delay=1.0), "b": FakeBackend("b", delay=1.0)},
+        deadline_s=0.02,
+    )
+
+    with pytest.raises(asyncio.TimeoutError):
+        rewrite(router)
+    assert router.stats()["backends"]["a"]["error_rate"] == 1.0
+
+
+def test_all_backends_failing_raises():
+    router = RoutingRewriteRepository(
+        {"a": FakeBackend("a", fail=True), "b": FakeBackend("b", fail=True)}
+    )
+
+    with pytest.raises(RuntimeError, match="All rewrite backends failed"):
+        rewrite(router)
@@ -0,0 +1,141 @@
+# tests/repositories/test_safety_classifier.py
+
+import pytest
+import torch
+import repositories.inference_backend as inference_backend
+import repositories.safety_classifier as safety_classifier
+from entities.data import BotMessage
+from repositories.safety_classifier import SafetyClassifierRepository
+
+TOXIC_WORDS = {"дурак", "idiot"}
+TOXIC_ID, PLAIN_ID, PAD_ID = 1, 2, 0
+
+
+class DummyTokenizer:
+    """Maps every word to one token id: toxic words to 1, the rest to 2."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _encode(self, text: str) -> list:
+        return [TOXIC_ID if w in TOXIC_WORDS else PLAIN_ID for w in text.split()] or [
+            PLAIN_ID
+        ]
+
+    def pad(self, encodings: dict, return_tensors: str = "pt") -> dict:
+        width = max(len(ids) for ids in encodings["input_ids"])
+        ids = [row + [PAD_ID] * (width - len(row)) for row in encodings["input_ids"]]
+        mask = [
+            [1] * len(row) + [0] * (width - len(row)) for row in encodings["input_ids"]
+        ]
+        return {"input_ids": torch.tensor(ids), "attention_mask": torch.tensor(mask)}
+
+    def __call__(self, texts, return_tensors=None, **kwargs):
+        self.calls += 1
+        batch = [texts] if isinstance(texts, str) else list(texts)
+        encodings = {"input_ids": [self._encode(t) for t in batch]}
+        if return_tensors is None:
+            return encodings
+        return self.pad(encodings)
+
+
+class DummyOutput:
+    def __init__(self, logits):
+        self.logits = logits
+
+
+class DummyModel:
+    """Five labels that all fire when the text contains a toxic token."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, attention_mask):
+        self.calls += 1
+        toxic = (input_ids == TOXIC_ID).any(dim=1, keepdim=True).float()
+        return DummyOutput((20 * toxic - 10).repeat(1, 5))
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    """Replaces the HF loaders with dummies and records what was loaded."""
+    loaded = {}
+
+    class DummyAutoTokenizer:
+        @staticmethod
+        def from_pretrained(name):
+            return DummyTokenizer()
+
+    class DummyAutoModel:
+        @staticmethod
+        def from_pretrained(name):
+            loaded[name] = DummyModel()
+            return loaded[name]
+
+    monkeypatch.setattr(safety_classifier, "AutoTokenizer", DummyAutoTokenizer)
+    monkeypatch.setattr(
+        inference_backend, "AutoModelForSequenceClassification", DummyAutoModel
+    )
+    monkeypatch.setattr(safety_classifier, "_models", {})
+    return loaded
+
+
+def test_models_are_loaded_per_language_on_first_use(loaded):
+    repo = SafetyClassifierRepository(languages=["ru"])
+
+    assert loaded == {}
+    result = repo.process(BotMessage(question="Q?", answer="ты дурак и больше ничего"))
+
+    assert list(loaded) == [safety_classifier.RU_MODEL_NAME]
+    assert result.safe is False
+    assert result.masked_answer == "ты ***** и больше ничего"
+
+
+def test_disallowed_language_is_treated_as_unknown(loaded):
+    repo = SafetyClassifierRepository(languages=["ru"])
+
+    result = repo.process(BotMessage(question="Q?", answer="you are an idiot, sir"))
+
+    assert loaded == {}
+    assert result.safe is True
+    assert result.score == 0.0
+
+
+def test_warmup_loads_only_preload_languages(loaded):
+    repo = SafetyClassifierRepository(preload_languages=["ru"])
+
+    assert repo.is_ready() is False
+    repo.warmup()
+
+    assert repo.is_ready() is True
+    assert safety_classifier.loaded_languages() == ["ru"]
+
+
+def test_masking_runs_batched_and_keeps_protected_phrases(loaded):
+    repo = SafetyClassifierRepository(mask_batch_size=2)
+    text = "you are such an idiot and you know it idiot"
+
+    masked = repo.mask_toxic_fragments(text, "en")
+
+    assert masked == "you are such an *** and you know it ***"
+    # 6 unique non-protected words -> 3 padded batches of at most 2 words
+    assert loaded[safety_classifier.EN_MODEL_NAME].calls == 3
+
+
+def test_process_batch_matches_process(loaded):
+    repo = SafetyClassifierRepository(batch_size=2)
+    messages = [
+        BotMessage(question="Q?", answer="ты дурак и больше ничего"),
+        BotMessage(question="Q?", answer="you are an idiot, really an idiot"),
+        BotMessage(question="Q?", answer="спасибо за вопрос, хорошего дня"),
+        BotMessage(question="Q?", answer="thank you for the question, have a nice day"),
+    ]
+
+    batched = repo.process_batch(messages)
+
+    assert [r.model_dump() for r in batched] == [
+        repo.process(m).model_dump() for m in messages
+    ]
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from repositories.topic_index import Topic, TopicIndex
+
+# one axis per "meaning", so cosine similarities are easy to predict
+VECTORS = {
+    "Доставка": [1.0, 0.0, 0.0],
+    "Курьер не приехал": [0.9, 0.1, 0.0],
+    "Оплата": [0.0, 1.0, 0.0],
+    "Возврат": [0.0, 0.0, 1.0],
+}
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([VECTORS[text] for text in texts])
+
+
+@pytest.fixture
+def topics_path(tmp_path):
+    path = tmp_path / "topics.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"name": "Доставка", "texts": ["Курьер не приехал"]},
+                {"name": "Оплата"},
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_search_returns_top_k_topics_by_best_example(topics_path):
+    index = TopicIndex(topics_path, top_k=2)
+    index.build(CountingEncoder(), "v1")
+
+    matches = index.search(np.array([0.1, 0.9, 0.0]))
+
+    assert [topic for topic, _ in matches] == ["Оплата", "Доставка"]
+    assert matches[0][1] == pytest.approx(0.9 / np.hypot(0.1, 0.9))
+    # "Доставка" is scored by its closest example, not the first one
+    assert matches[1][1] == pytest.approx(
+        (0.09 + 0.09) / (np.hypot(0.1, 0.9) * np.hypot(0.9, 0.1))
+    )
+    assert index.search_batch(np.eye(3)[:2], k=1) == [
+        [("Доставка", pytest.approx(1.0))],
+        [("Оплата", pytest.approx(1.0))],
+    ]
+
+
+def test_index_is_rebuilt_incrementally(topics_path):
+    encode = CountingEncoder()
+    index = TopicIndex(topics_path)
+
+    assert index.build(encode, "v1") == 3
+    assert index.build(encode, "v1") == 0
+    # only the new topic is encoded
+    assert index.add_topics([Topic("Возврат")], encode, "v1") == 1
+    assert index.topics == ["Доставка", "Оплата", "Возврат"]
+    # another process picks the vectors up from the index file
+    assert TopicIndex(topics_path).build(encode, "v1") == 0
+    # a new model version makes every vector stale
+    assert index.build(encode, "v2") == 4
+
+    assert encode.calls == [
+        ["Доставка", "Курьер не приехал", "Оплата"],
+        ["Возврат"],
+        ["Доставка", "Курьер не приехал", "Оплата", "Возврат"],
+    ]
+
+
+def test_replicas_sharing_files_rebuild_one_at_a_time(topics_path, tmp_path):
+    replicas = [TopicIndex(topics_path) for _ in range(4)]
+    new_topics = [[Topic("Возврат")], [Topic("Оплата", ["Возврат"])]] * 2
+
+    threads = [
+        threading.Thread(
+            target=replica.add_topics, args=(topics, CountingEncoder(), "v1")
+        )
+        for replica, topics in zip(replicas, new_topics)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every update survived and the shared cache is whole, with no temp files left
+    fresh = TopicIndex(topics_path)
+    encode = CountingEncoder()
+    fresh.build(encode, "v1")
+    assert sorted(fresh.topics) == ["Возврат", "Доставка", "Оплата"]
+    assert encode.calls == []
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
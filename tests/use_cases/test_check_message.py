@@ -0,0 +1,74 @@
+# tests/use_cases/test_check_message.py
+
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from config import Settings
+from entities.data import BotMessage
+from use_cases.check_message import (
+    CheckMessageUseCase,
+    check_request_topic,
+    check_request_topics,
+)
+
+CHECKS = ["pii", "safety", "ad", "off_topic"]
+
+
+class FakeBus:
+    """Records what is published, in one call per publish_many."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def publish_many(self, messages):
+        self.calls.append(list(messages))
+
+
+def enqueue(routing):
+    bus = FakeBus()
+    use_case = CheckMessageUseCase(bus, checks=CHECKS, routing=routing)
+    request_id = asyncio.run(use_case.enqueue(BotMessage(question="q", answer="a")))
+    (sent,) = bus.calls
+    return request_id, sent
+
+
+def test_broadcast_sends_every_check_to_the_shared_topic():
+    request_id, sent = enqueue("broadcast")
+
+    assert [m.topic for m in sent] == ["check-requests"] * len(CHECKS)
+    assert [m.headers["check_type"] for m in sent] == CHECKS
+    assert {m.key for m in sent} == {request_id}
+
+
+def test_per_check_sends_one_record_per_check_topic():
+    request_id, sent = enqueue("per_check")
+
+    assert [(m.topic, m.headers["check_type"]) for m in sent] == [
+        (f"check-requests.{ct}", ct) for ct in CHECKS
+    ]
+    assert {m.headers["request_id"] for m in sent} == {request_id}
+
+
+def test_workers_read_both_layouts_so_they_can_switch_before_the_api():
+    assert check_request_topics("pii", "broadcast") == ["check-requests"]
+    # the shared topic is still read until the API has switched as well
+    assert check_request_topics("pii", "per_check") == [
+        "check-requests.pii",
+        "check-requests",
+    ]
+    # whatever the API publishes, a per_check worker reads it
+    for routing in ("broadcast", "per_check"):
+        assert check_request_topic("pii", routing) in check_request_topics(
+            "pii", "per_check"
+        )
+
+
+def test_unknown_routing_is_rejected():
+    with pytest.raises(ValueError, match="per-check"):
+        check_request_topic("pii", "per-check")
+    with pytest.raises(ValueError):
+        CheckMessageUseCase(FakeBus(), routing="per-check")
+    with pytest.raises(ValidationError, match="CHECK_TOPIC_ROUTING"):
+        Settings(CHECK_TOPIC_ROUTING="per-check")
@@ -0,0 +1,284 @@
+# tests/workers/test_aggregator.py
+
+import asyncio
+
+from entities.data import LLMRewriteResult, ServiceCheckResult
+from repositories.pending_store import PendingStore
+from use_cases.ports.event_bus import PARTITION_HEADER
+from workers.aggregator.aggregator import (
+    CLOSED_STATE,
+    DEGRADED_ANSWER,
+    AggregatorService,
+)
+
+CHECKS = ["pii", "safety", "ad", "off_topic"]
+
+
+class FakeBus:
+    """Records published final results."""
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, topic, message, headers, key=None):
+        self.published.append((topic, key, message))
+
+
+class FakeRepo:
+    def __init__(self):
+        self.saved = {}
+
+    async def save(self, request_id, result):
+        self.saved[request_id] = result
+
+
+class FakeRewriter:
+    def __init__(self):
+        self.prompts = []
+
+    async def process(self, request):
+        self.prompts.append(request.prompt)
+        return LLMRewriteResult(answer="rewritten")
+
+
+def ok(answer="Ваш заказ в пути"):
+    return ServiceCheckResult(safe=True, score=0.1, masked_answer=answer, question="q")
+
+
+def failed(check_type):
+    return ServiceCheckResult(
+        safe=False,
+        score=0.0,
+        masked_answer="",
+        question="q",
+        error=f"Batch failed: {check_type} is down",
+    )
+
+
+def make_aggregator(**kwargs):
+    bus, repo, rewriter = FakeBus(), FakeRepo(), FakeRewriter()
+    return AggregatorService(repo, rewriter, bus, checks=CHECKS, **kwargs), bus, repo
+
+
+async def deliver(aggregator, request_id, parts):
+    for check_type, result in parts.items():
+        await aggregator.handle(
+            result, {"request_id": request_id, "check_type": check_type}
+        )
+    await aggregator.drain()
+
+
+def test_errored_check_is_missing_not_a_violation():
+    aggregator, bus, repo = make_aggregator()
+    parts = {"pii": ok(), "safety": ok(), "ad": failed("ad"), "off_topic": ok()}
+
+    asyncio.run(deliver(aggregator, "r1", parts))
+
+    final = repo.saved["r1"]
+    assert final.violations == []
+    # the ad check never ran: nothing to rewrite
+    assert aggregator.rewriter.prompts == []
+    assert final.degraded and final.missing_checks == ["ad"]
+    assert not final.final_verdict_safe
+    assert final.masked_answer == "Ваш заказ в пути"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_request_is_finalized_once_every_check_arrives():
+    aggregator, bus, repo = make_aggregator()
+    parts = {ct: ok() for ct in CHECKS}
+
+    async def scenario():
+        for check_type in CHECKS[:-1]:
+            await aggregator.handle(
+                parts[check_type], {"request_id": "r1", "check_type": check_type}
+            )
+        await aggregator.drain()
+        # still waiting for off_topic
+        assert repo.saved == {}
+        await deliver(aggregator, "r1", {"off_topic": parts["off_topic"]})
+
+    asyncio.run(scenario())
+
+    final = repo.saved["r1"]
+    assert final.final_verdict_safe and not final.degraded
+    assert final.masked_answer == "Ваш заказ в пути"
+    assert set(final.all_checks) == set(CHECKS)
+    assert [(topic, key) for topic, key, _ in bus.published] == [
+        ("final-results", "r1")
+    ]
+
+
+def test_expired_request_is_finalized_as_degraded():
+    clock = FakeClock()
+    aggregator, bus, repo = make_aggregator(
+        pending=PendingStore(ttl_s=30.0, clock=clock)
+    )
+
+    async def scenario():
+        await deliver(aggregator, "r1", {"ad": ok(), "off_topic": ok()})
+        await deliver(aggregator, "r2", {"pii": ok("[MASK]"), "safety": ok()})
+        clock.now = 29.0
+        assert aggregator.expire() == 0
+        clock.now = 31.0
+        assert aggregator.expire() == 2
+        await aggregator.drain()
+
+    asyncio.run(scenario())
+
+    # the answer was never checked for PII or toxicity: it is not published
+    unchecked = repo.saved["r1"]
+    assert unchecked.degraded and not unchecked.final_verdict_safe
+    assert unchecked.missing_checks == ["pii", "safety"]
+    assert unchecked.masked_answer == DEGRADED_ANSWER
+    # only ad and off_topic are missing: the masked answer is kept
+    masked = repo.saved["r2"]
+    assert masked.degraded and masked.missing_checks == ["ad", "off_topic"]
+    assert masked.masked_answer == "[MASK]"
+
+
+def test_late_and_duplicate_results_do_not_reopen_a_request():
+    aggregator, bus, repo = make_aggregator()
+
+    async def scenario():
+        await deliver(aggregator, "r1", {ct: ok() for ct in CHECKS})
+        # a redelivered result, then one that arrives after the close
+        await deliver(aggregator, "r1", {"pii": ok(), "ad": failed("ad")})
+
+    asyncio.run(scenario())
+
+    assert len(bus.published) == 1
+    assert not repo.saved["r1"].degraded
+    assert len(aggregator._pending) == 0
+    assert aggregator._pending.stats()["late_results"] == 2
+
+
+def test_oldest_request_is_evicted_when_the_store_is_full():
+    clock = FakeClock()
+    aggregator, bus, repo = make_aggregator(
+        pending=PendingStore(ttl_s=30.0, max_entries=2, clock=clock)
+    )
+
+    async def scenario():
+        for i, request_id in enumerate(["r1", "r2", "r3"]):
+            clock.now = float(i)
+            await deliver(aggregator, request_id, {"pii": ok(), "safety": ok()})
+
+    asyncio.run(scenario())
+
+    # r1 made room for r3 and was finalized with what it had
+    assert list(repo.saved) == ["r1"]
+    assert repo.saved["r1"].missing_checks == ["ad", "off_topic"]
+    assert "r1" not in aggregator._pending
+    assert aggregator._pending.stats()["evictions"] == 1
+
+
+class FakeChangelogBus(FakeBus):
+    """Keeps the changelog as a log per partition, replayed like Kafka does."""
+
+    def __init__(self):
+        super().__init__()
+        self.log = {}
+
+    async def publish_state(self, topic, key, value, partition=None):
+        self.log.setdefault(partition, []).append((key, value))
+
+    async def read_state(self, topic, partition):
+        state = {}
+        for key, value in self.log.get(partition, []):
+            if value is None:
+                state.pop(key, None)
+            else:
+                state[key] = value
+        return state
+
+
+def make_restartable(bus):
+    return AggregatorService(
+        FakeRepo(), FakeRewriter(), bus, checks=CHECKS, changelog_topic="changelog"
+    )
+
+
+def test_changelog_mirrors_each_part_and_closes_the_request():
+    bus = FakeChangelogBus()
+    aggregator = make_restartable(bus)
+
+    async def scenario():
+        for check_type in CHECKS:
+            await aggregator.handle(
+                ok(),
+                {"request_id": "r1", "check_type": check_type, PARTITION_HEADER: "3"},
+            )
+        await aggregator.drain()
+
+    asyncio.run(scenario())
+
+    writes = bus.log[3]
+    assert [key for key, _ in writes] == ["r1"] * 5
+    # the bucket grows with each part, the complete one included
+    assert [sorted(value) for _, value in writes[:4]] == [
+        sorted(CHECKS[: i + 1]) for i in range(4)
+    ]
+    assert writes[4][1] == CLOSED_STATE
+
+
+def test_pending_requests_are_rebuilt_on_assign():
+    bus = FakeChangelogBus()
+    bus.log[1] = [
+        ("r1", {"pii": ok("[MASK]").model_dump()}),
+        ("r1", {ct: ok("[MASK]").model_dump() for ct in ["pii", "safety"]}),
+        # complete, but the previous owner died before saving it
+        ("r2", {ct: ok().model_dump() for ct in CHECKS}),
+    ]
+    aggregator = make_restartable(bus)
+
+    async def scenario():
+        await aggregator.on_assign([1])
+        await aggregator.drain()
+        assert "r1" in aggregator._pending
+        await deliver(
+            aggregator,
+            "r1",
+            {"ad": ok(), "off_topic": ok()},
+        )
+
+    asyncio.run(scenario())
+
+    saved = aggregator.repo.saved
+    assert set(saved) == {"r1", "r2"}
+    assert set(saved["r1"].all_checks) == set(CHECKS)
+    assert not saved["r1"].degraded
+    assert saved["r1"].masked_answer == "[MASK]"
+
+
+def test_request_closed_in_the_changelog_is_not_reopened():
+    bus = FakeChangelogBus()
+    bus.log[0] = [
+        ("r1", {"pii": ok().model_dump()}),
+        ("r1", CLOSED_STATE),
+    ]
+    aggregator = make_restartable(bus)
+
+    async def scenario():
+        await aggregator.on_assign([0])
+        # a result redelivered after the restart
+        await aggregator.handle(
+            ok(), {"request_id": "r1", "check_type": "safety", PARTITION_HEADER: "0"}
+        )
+        await aggregator.drain()
+
+    asyncio.run(scenario())
+
+    assert "r1" not in aggregator._pending
+    assert aggregator.repo.saved == {}
+    assert bus.published == []
+    assert aggregator._pending.stats()["late_results"] == 1
+    # nothing new was written for the closed request
+    assert bus.log[0][-1] == ("r1", CLOSED_STATE)
@@ -1,33 +1,71 @@
 # use_cases/check_message.py
 from uuid import uuid4
 from entities.data import BotMessage
-from use_cases.ports.event_bus import EventBus
+from use_cases.ports.event_bus import EventBus, OutgoingMessage
+
+REQUEST_TOPIC = "check-requests"
+# per_check: every check has its own topic; broadcast: all checks share
+# REQUEST_TOPIC and workers drop what is not theirs (the old layout).
+# Switching to per_check: workers first (they keep reading REQUEST_TOPIC,
+# see check_request_topics), then the API
+ROUTING_MODES = ("per_check", "broadcast")
+
+
+def check_request_topic(
+    check_type: str, routing: str = "broadcast", base: str = REQUEST_TOPIC
+) -> str:
+    """Topic that carries the requests for one check under the given routing."""
+    if routing not in ROUTING_MODES:
+        raise ValueError(f"Unknown check routing {routing!r}, expected {ROUTING_MODES}")
+    return f"{base}.{check_type}" if routing == "per_check" else base
+
+
+def check_request_topics(
+    check_type: str, routing: str = "broadcast", base: str = REQUEST_TOPIC
+) -> list[str]:
+    """Topics a worker of one check reads under the given routing.
+
+    A per_check worker also reads the shared topic, so requests published
+    there by an API not yet switched over are still checked.
+    """
+    topic = check_request_topic(check_type, routing, base)
+    return [topic] if topic == base else [topic, base]
 
 
 class CheckMessageUseCase:
     """
     Instead of running all checks here, we simply
-    publish one message per check_type into Kafka.
+    publish one message per check_type into Kafka,
+    each to the topic of its check (see check_request_topic).
     """
 
     def __init__(
         self,
         event_bus: EventBus,
-        request_topic: str = "check-requests",
+        request_topic: str = REQUEST_TOPIC,
         checks: list[str] = ["pii", "safety", "ad", "off_topic"],
+        routing: str = "broadcast",
     ):
         self.event_bus = event_bus
         self.request_topic = request_topic
         self.checks = checks
+        self.topics = {
+            ct: check_request_topic(ct, routing, request_topic) for ct in checks
+        }
 
     async def enqueue(self, message: BotMessage) -> str:
         # Generate a unique correlation ID
         request_id = str(uuid4())
-        # Scatter: publish one message PER check
-        for check_type in self.checks:
-            await self.event_bus.publish(
-                topic=self.request_topic,
-                message=message,
-                headers={"request_id": request_id, "check_type": check_type},
-            )
+        # Scatter: one message PER check, sent together and awaited together
+        await self.event_bus.publish_many(
+            [
+                OutgoingMessage(
+                    topic=self.topics[check_type],
+                    message=message,
+                    headers={"request_id": request_id, "check_type": check_type},
+                    key=request_id,
+                )
+                for check_type in self.checks
+            ]
+        )
         return request_id
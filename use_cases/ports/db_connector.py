@@ -8,8 +8,9 @@ class IDBRepository(ABC):
     """
 
     @abstractmethod
-    def save(self, request_id: str, final_result: FinalCheckResult) -> None:
+    async def save(self, request_id: str, final_result: FinalCheckResult) -> None:
         """
         Persist the FinalCheckResult for the given request_id.
+        Returns only once the result is stored; raises if it could not be.
         """
         ...
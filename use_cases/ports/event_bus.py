@@ -1,15 +1,85 @@
 from abc import ABC, abstractmethod
-from typing import Any, Awaitable, Callable
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
 from entities.data import BotMessage
 
 MessageHandler = Callable[[BotMessage, dict], Awaitable[Any]]
+# called with the partitions assigned to / revoked from this consumer
+PartitionsCallback = Callable[[List[int]], Awaitable[Any]]
+
+# header added by the bus on consume: the partition the message came from
+PARTITION_HEADER = "partition"
+
+# called once a fire-and-forget message is delivered: None, or the error
+DeliveryCallback = Callable[[Optional[Exception]], Any]
+
+
+class OutgoingMessage(NamedTuple):
+    topic: str
+    message: BotMessage
+    headers: dict
+    key: Optional[str] = None
 
 
 class EventBus(ABC):
     @abstractmethod
-    async def publish(self, topic: str, message: BotMessage, headers: dict) -> None: ...
+    async def publish(
+        self,
+        topic: str,
+        message: BotMessage,
+        headers: dict,
+        key: Optional[str] = None,
+    ) -> None:
+        """Messages with the same key land on the same partition, in order."""
+
+    @abstractmethod
+    async def publish_many(self, messages: List[OutgoingMessage]) -> None:
+        """Send all messages at once and wait until every one is delivered."""
+
+    @abstractmethod
+    async def publish_nowait(
+        self,
+        topic: str,
+        message: BotMessage,
+        headers: dict,
+        key: Optional[str] = None,
+        on_delivery: Optional[DeliveryCallback] = None,
+    ) -> None:
+        """Hand the message to the producer and return without waiting for delivery."""
 
     @abstractmethod
     async def subscribe(
-        self, topic: str, group_id: str, handler: MessageHandler
-    ) -> None: ...
+        self,
+        topic: Union[str, List[str]],
+        group_id: str,
+        handler: MessageHandler,
+        on_assign: Optional[PartitionsCallback] = None,
+        on_revoke: Optional[PartitionsCallback] = None,
+        max_in_flight: int = 0,
+        commit_interval_ms: int = 1000,
+    ) -> None:
+        """With max_in_flight > 0, partitions are handled concurrently (in order
+        within a partition) and an offset is committed only once handled.
+        Several topics may be read by one consumer group."""
+
+    @abstractmethod
+    async def publish_state(
+        self,
+        topic: str,
+        key: str,
+        value: Optional[dict],
+        partition: Optional[int] = None,
+    ) -> None:
+        """Write the latest state for key to a compacted topic; None deletes it."""
+
+    @abstractmethod
+    async def read_state(self, topic: str, partition: int) -> Dict[str, dict]:
+        """Replay one partition of a compacted topic: key -> latest state."""
@@ -1,46 +1,115 @@
 # workers/ad/ad_filter_worker.py
 
 import asyncio
+from typing import Optional
 from use_cases.ports.event_bus import EventBus, MessageHandler
 from repositories.kafka_bus import KafkaEventBus
 from repositories.ad_filter import AdFilterRepository
+from repositories.ad_rules import AdRuleEngine, load_ad_rules
+from repositories.micro_batcher import MicroBatcher
+from repositories.model_registry import default_registry
 from entities.data import BotMessage, ServiceCheckResult
+from use_cases.check_message import check_request_topics
 from config import settings
 
+# in-flight publish tasks, kept so they are not garbage-collected
+_pending: set = set()
+
 
 async def handle_ad(message: BotMessage, headers: dict):
     # only process "ad" check_type
     if headers.get("check_type") != "ad":
         return
 
-    # run the AdFilter adapter
-    result: ServiceCheckResult = AdFilterRepository(
-        settings.ad_filter_model_name
-    ).process(BotMessage(**message))
+    # hand the message to the micro-batcher; waits only if the queue is full
+    bot_message = BotMessage(**message)
+    future = await batcher.submit(bot_message)
+    # publish once the batch is scored, without blocking the consumer
+    task = asyncio.create_task(
+        publish_result(future, bot_message, headers["request_id"])
+    )
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def publish_result(future: asyncio.Future, message: BotMessage, request_id: str):
+    try:
+        result: ServiceCheckResult = await future
+    except Exception as exc:
+        print(f"[ad_worker] Batch failed for {request_id}: {exc}")
+        # report the failure, so the aggregator need not wait for the deadline
+        result = ServiceCheckResult(
+            safe=False,
+            score=0.0,
+            masked_answer="",
+            question=message.question,
+            error=f"Batch failed: {exc}",
+        )
 
     # publish the partial result back to Kafka
-    await bus.publish(
+    # fire-and-forget: delivery is reported by the callback
+    await bus.publish_nowait(
         topic="check-results",
         message=result,  # ServiceCheckResult is a BaseModel → .dict() under the hood
         headers={
-            "request_id": headers["request_id"],
+            "request_id": request_id,
             "check_type": "ad",
         },
+        # keyed so every result of a request reaches the same aggregator
+        key=request_id,
+        on_delivery=delivery_report(request_id),
     )
-    print(f"[ad_worker] Emitted AD result for {headers['request_id']}")
+    print(f"[ad_worker] Emitted AD result for {request_id} (stage: {result.stage})")
+
+
+def delivery_report(request_id: str):
+    def report(error: Optional[Exception]) -> None:
+        if error is not None:
+            print(f"[ad_worker] Result for {request_id} was not delivered: {error}")
+
+    return report
 
 
 async def main():
-    global bus  # shared by handler
+    global bus, repo, batcher  # shared by handler
     # inject the Kafka adapter
-    bus = KafkaEventBus(brokers=settings.kafka_brokers)
+    bus = KafkaEventBus(
+        brokers=settings.kafka_brokers,
+        linger_ms=settings.kafka_linger_ms,
+        max_batch_size=settings.kafka_max_batch_size,
+        compression_type=settings.kafka_compression_type,
+        acks=settings.kafka_acks,
+    )
+    # the model is loaded once and hot-reloaded when the artifact changes
+    default_registry.check_interval = settings.model_reload_interval_s
+    rules = None
+    if settings.ad_rules_enabled:
+        rules = AdRuleEngine(
+            load_ad_rules(settings.ad_rules_path) if settings.ad_rules_path else None
+        )
+    repo = AdFilterRepository(settings.ad_filter_model_name, rules=rules)
+    # score records in micro-batches: one sparse-matrix pass per batch
+    batcher = MicroBatcher(
+        repo.process_batch,
+        max_batch_size=settings.ad_batch_max_size,
+        max_latency_ms=settings.ad_batch_max_latency_ms,
+        max_queue_size=settings.ad_batch_queue_size,
+    )
 
     # subscribe to scatter topic as part of the "ad-service" group
-    await bus.subscribe(
-        topic="check-requests",
-        group_id="ad-service",
-        handler=handle_ad,  # type: MessageHandler
-    )
+    try:
+        await bus.subscribe(
+            topic=check_request_topics("ad", settings.check_topic_routing),
+            group_id="ad-service",
+            handler=handle_ad,  # type: MessageHandler
+        )
+    finally:
+        # score what is still queued and publish the last results
+        await batcher.flush()
+        await asyncio.gather(*_pending, return_exceptions=True)
+        await batcher.close()
+        # flush results still waiting for delivery
+        await bus.close()
 
 
 if __name__ == "__main__":
@@ -2,15 +2,23 @@
 
 import asyncio
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
 
-from use_cases.ports.event_bus import EventBus, MessageHandler
+from use_cases.ports.event_bus import EventBus, MessageHandler, PARTITION_HEADER
 from use_cases.ports.db_connector import IDBRepository
-from use_cases.ports.event_bus import EventBus
 from use_cases.ports.ml_service import ILLMRewriteRepository
 from repositories.kafka_bus import KafkaEventBus
 from repositories.file_db import MongoResultRepository
-from repositories.llm_rewrite import GigachatRewriteRepository
+from repositories.mongo_batch_writer import BatchedMongoResultRepository
+from repositories.pending_store import PendingStore
+from repositories.llm_rewrite import GigachatRewriteRepository, OllamaRewriteRepository
+from repositories.rewrite_cache import (
+    CachedRewriteRepository,
+    MemoryRewriteCache,
+    MongoRewriteCache,
+    rewrite_cache_key,
+)
+from repositories.rewrite_router import RoutingRewriteRepository
 from config import settings
 from entities.data import (
     ServiceCheckResult,
@@ -22,6 +30,16 @@ from entities.data import (
     LLMRewriteResult,
 )
 
+# bump whenever the rewrite prompt below changes: cached rewrites are keyed on it
+REWRITE_PROMPT_VERSION = "1"
+# answer for degraded results whose PII or safety check never arrived
+DEGRADED_ANSWER = "Извини, не понял тебя"
+# changelog value of a finalized request, in place of its partial results
+CLOSED_STATE = {"__closed__": True}
+# how often to wake up when nothing is pending, and to log pending stats
+EXPIRY_IDLE_S = 1.0
+PENDING_STATS_EVERY_S = 60.0
+
 
 class AggregatorService:
     """
@@ -35,13 +53,24 @@ class AggregatorService:
         rewriter: ILLMRewriteRepository,
         bus: EventBus,
         checks: List[str] = ["pii", "safety", "ad", "off_topic"],
+        pending: Optional[PendingStore] = None,
+        changelog_topic: Optional[str] = None,
     ):
         self.repo = repo
         self.rewriter = rewriter
         self.checks = checks
         self.bus = bus
-        # in-memory buffer: request_id -> { check_type: ServiceCheckResult }
-        self._pending: Dict[str, Dict[str, ServiceCheckResult]] = {}
+        # bounded buffer: request_id -> { check_type: ServiceCheckResult },
+        # with a deadline per request
+        self._pending = pending if pending is not None else PendingStore()
+        # complete requests being merged (and possibly rewritten) in the background
+        self._finalizing: Set[asyncio.Task] = set()
+        # requests are owned per check-results partition; partial buckets are
+        # mirrored to a compacted changelog (same partitioning) so that whoever
+        # owns the partition next can rebuild them, and finalized requests are
+        # marked closed there so that redelivered results stay late
+        self.changelog_topic = changelog_topic
+        self._owner: Dict[str, int] = {}
 
     async def handle(self, result: ServiceCheckResult, headers: dict):
         request_id = headers.get("request_id")
@@ -49,18 +78,173 @@ class AggregatorService:
         if not request_id or not check_type:
             return
 
-        bucket = self._pending.setdefault(request_id, {})
-        bucket[check_type] = result
+        bucket = self._pending.add(request_id, check_type, result)
+        if bucket is None:
+            print(f"[aggregator] Late {check_type} result for {request_id}, dropped")
+            return
+        if PARTITION_HEADER in headers:
+            self._owner[request_id] = int(headers[PARTITION_HEADER])
 
-        # once we've got every expected check, merge & persist
+        # durable before the offset of this result is committed; the complete
+        # bucket too, as it stays open in the changelog until the save is acked
+        await self._save_state(request_id, bucket, self._owner.get(request_id))
+        # once we've got every expected check, merge & persist;
+        # a slow LLM rewrite must not hold up the other requests
         if all(ct in bucket for ct in self.checks):
-            parts = self._pending.pop(request_id)
-            final = self._merge(parts)
+            self._start_finalize(request_id, self._pending.pop(request_id))
+        # requests evicted to make room are finalized right away
+        self.expire()
+
+    async def on_assign(self, partitions: List[int]) -> None:
+        """Rebuild the pending requests of newly owned partitions."""
+        if not self.changelog_topic:
+            return
+        restored = 0
+        for partition in partitions:
+            state = await self.bus.read_state(self.changelog_topic, partition)
+            for request_id, buckets in state.items():
+                if request_id in self._pending:
+                    continue
+                if buckets == CLOSED_STATE:
+                    # finalized already: a redelivered result must not reopen it
+                    self._pending.mark_closed(request_id)
+                    continue
+                # the deadline restarts from now: the original one is not stored
+                bucket = None
+                for check_type, payload in buckets.items():
+                    bucket = self._pending.add(
+                        request_id, check_type, ServiceCheckResult(**payload)
+                    )
+                if bucket is None:
+                    continue
+                self._owner[request_id] = partition
+                restored += 1
+                # complete, but its result was never acknowledged as saved
+                if all(ct in bucket for ct in self.checks):
+                    self._start_finalize(request_id, self._pending.pop(request_id))
+        self.expire()
+        print(f"[aggregator] Assigned {partitions}, restored {restored} requests")
+
+    async def on_revoke(self, partitions: List[int]) -> None:
+        """Forget pending requests of partitions now owned by another instance."""
+        revoked = set(partitions)
+        dropped = [rid for rid, p in self._owner.items() if p in revoked]
+        for request_id in dropped:
+            del self._owner[request_id]
+            self._pending.discard(request_id)
+        print(f"[aggregator] Revoked {partitions}, handed over {len(dropped)} requests")
+
+    async def _save_state(
+        self,
+        request_id: str,
+        bucket: Optional[Dict[str, ServiceCheckResult]],
+        partition: Optional[int],
+    ) -> None:
+        """Mirror a bucket to the changelog; None marks the request closed."""
+        if not self.changelog_topic:
+            return
+        value = (
+            {ct: r.model_dump() for ct, r in bucket.items()}
+            if bucket is not None
+            else CLOSED_STATE
+        )
+        try:
+            await self.bus.publish_state(
+                self.changelog_topic,
+                request_id,
+                value,
+                partition=partition,
+            )
+        except Exception as exc:
+            print(f"[aggregator] Changelog write failed for {request_id}: {exc}")
+
+    def expire(self) -> int:
+        """Finalize every request past its deadline with the partial results."""
+        expired = self._pending.pop_expired()
+        for request_id, parts in expired:
+            self._start_finalize(request_id, parts, degraded=True)
+        return len(expired)
+
+    async def run_expiry(self) -> None:
+        """Sleep until the nearest deadline, finalize what expired, repeat."""
+        loop = asyncio.get_running_loop()
+        next_stats = loop.time() + PENDING_STATS_EVERY_S
+        while True:
+            deadline = self._pending.next_deadline()
+            delay = (
+                EXPIRY_IDLE_S
+                if deadline is None
+                else max(0.0, deadline - self._pending.clock())
+            )
+            await asyncio.sleep(min(delay, EXPIRY_IDLE_S))
+            self.expire()
+            if loop.time() >= next_stats:
+                next_stats = loop.time() + PENDING_STATS_EVERY_S
+                print(f"[aggregator] Pending: {self._pending.stats()}")
+                if hasattr(self.repo, "stats"):
+                    print(f"[aggregator] Persistence: {self.repo.stats()}")
+
+    def _start_finalize(
+        self,
+        request_id: str,
+        parts: Dict[str, ServiceCheckResult],
+        degraded: bool = False,
+    ) -> None:
+        partition = self._owner.pop(request_id, None)
+        task = asyncio.create_task(
+            self._finalize(request_id, parts, degraded, partition)
+        )
+        self._finalizing.add(task)
+        task.add_done_callback(self._finalizing.discard)
+
+    async def _finalize(
+        self,
+        request_id: str,
+        parts: Dict[str, ServiceCheckResult],
+        degraded: bool = False,
+        partition: Optional[int] = None,
+    ):
+        try:
+            final = await self._merge(parts)
+            if degraded or any(p.error for p in parts.values()):
+                final = self._degrade(final, parts)
+                print(
+                    f"[aggregator] {request_id} finalized as degraded, "
+                    f"without {final.missing_checks}"
+                )
             await self.bus.publish(
-                topic="final-results", message=final, headers={"request_id": request_id}
+                topic="final-results",
+                message=final,
+                headers={"request_id": request_id},
+                key=request_id,
             )
-            self.repo.save(request_id, final)
+            await self.repo.save(request_id, final)
             print(f"[aggregator] Saved final result for {request_id}")
+        except Exception as exc:
+            print(f"[aggregator] Failed to finalize {request_id}: {exc}")
+            return
+        await self._save_state(request_id, None, partition)
+
+    async def drain(self) -> None:
+        """Wait for every request that is still being finalized."""
+        while self._finalizing:
+            await asyncio.gather(*list(self._finalizing))
+
+    def _degrade(
+        self, final: FinalCheckResult, parts: Dict[str, ServiceCheckResult]
+    ) -> FinalCheckResult:
+        """Mark a partial result: never safe, and never unmasked."""
+        # a check that reported an error counts as missing
+        missing = [ct for ct in self.checks if ct not in parts or parts[ct].error]
+        update = {
+            "final_verdict_safe": False,
+            "degraded": True,
+            "missing_checks": missing,
+        }
+        if "pii" in missing or "safety" in missing:
+            # the answer was never checked for PII or toxicity
+            update["masked_answer"] = DEGRADED_ANSWER
+        return final.model_copy(update=update)
 
     @staticmethod
     def _strip_masked_words(text: str) -> str:
@@ -77,7 +261,9 @@ class AggregatorService:
 
         return " ".join(w for w in text.split() if not is_masked(w))
 
-    def _rewrite(self, masked_text: str, problems: list[str], question: str) -> str:
+    async def _rewrite(
+        self, masked_text: str, problems: List[str], question: str
+    ) -> str:
         """
         Use the LLM to rewrite the text, handling any exceptions.
         Returns the rewritten text or a placeholder if it fails.
@@ -94,14 +280,17 @@ class AggregatorService:
             llm_request: LLMRequest = LLMRequest(
                 prompt=prompt,
                 api_key=settings.gigachat_api,
+                cache_key=rewrite_cache_key(
+                    masked_text, problems, question, REWRITE_PROMPT_VERSION
+                ),
             )
-            response: LLMRewriteResult = self.rewriter.process(llm_request)
+            response: LLMRewriteResult = await self.rewriter.process(llm_request)
             return response.answer if response else "[REWRITE_NEEDED]"
         except Exception as exc:
             print(f"[aggregator] Rewrite error: {exc}")
             return "[REWRITE_NEEDED]"
 
-    def _merge(self, parts: Dict[str, ServiceCheckResult]) -> FinalCheckResult:
+    async def _merge(self, parts: Dict[str, ServiceCheckResult]) -> FinalCheckResult:
         final_safe = all(p.safe for p in parts.values())
         violations: List[Violation] = []
 
@@ -111,7 +300,8 @@ class AggregatorService:
         question = ""
         for check_type, result in parts.items():
             question = result.question
-            if not result.safe:
+            # a check that failed to run is no verdict: _degrade reports it missing
+            if not result.safe and not result.error:
                 vt = getattr(ViolationType, check_type.upper(), None)
                 lvl = (
                     ViolationLevel.HIGH
@@ -135,14 +325,14 @@ class AggregatorService:
         # Handle PII or SAFETY violations
         pii_result = parts.get("pii")
         safety_result = parts.get("safety")
-        pii_or_safety_failed = (pii_result and not pii_result.safe) or (
-            safety_result and not safety_result.safe
-        )
+        pii_or_safety_failed = (
+            pii_result and not pii_result.safe and not pii_result.error
+        ) or (safety_result and not safety_result.safe and not safety_result.error)
 
         if pii_or_safety_failed:
             cleaned = self._strip_masked_words(base_answer)
             if ad_or_offtopic_unsafe:
-                rewritten = self._rewrite(cleaned, failed_checks, question)
+                rewritten = await self._rewrite(cleaned, failed_checks, question)
                 return FinalCheckResult(
                     final_verdict_safe=final_safe,
                     violations=violations,
@@ -161,7 +351,7 @@ class AggregatorService:
 
         # No PII/SAFETY issues, but AD or OFF_TOPIC fail
         if ad_or_offtopic_unsafe:
-            rewritten = self._rewrite(base_answer, failed_checks, question)
+            rewritten = await self._rewrite(base_answer, failed_checks, question)
             return FinalCheckResult(
                 final_verdict_safe=final_safe,
                 violations=violations,
@@ -191,24 +381,104 @@ async def _raw_handler(payload: dict, headers: dict):
 
 
 async def main():
-    # 1) wire up Kafka
-    bus: EventBus = KafkaEventBus(brokers=settings.kafka_brokers)
+    # 1) wire up Kafka; the changelog must be partitioned like check-results
+    bus = KafkaEventBus(
+        brokers=settings.kafka_brokers,
+        linger_ms=settings.kafka_linger_ms,
+        max_batch_size=settings.kafka_max_batch_size,
+        compression_type=settings.kafka_compression_type,
+        acks=settings.kafka_acks,
+    )
+    await bus.ensure_topic("check-results", settings.kafka_result_partitions)
+    await bus.ensure_topic(
+        settings.aggregator_changelog_topic,
+        settings.kafka_result_partitions,
+        compact=True,
+        retention_ms=settings.aggregator_changelog_retention_ms,
+    )
 
-    # 2) choose persistence adapter
-    repo: IDBRepository = MongoResultRepository(mongo_uri=settings.mongo_uri)
+    # 2) choose persistence adapter: write-behind, batched bulk upserts
+    repo = BatchedMongoResultRepository(
+        MongoResultRepository(mongo_uri=settings.mongo_uri).collection,
+        max_batch_size=settings.mongo_batch_max_size,
+        max_latency_ms=settings.mongo_batch_max_latency_ms,
+        max_queue_size=settings.mongo_batch_queue_size,
+    )
 
-    rewriter: GigachatRewriteRepository = GigachatRewriteRepository()
+    # long-lived clients; concurrency and latency are bounded per rewrite
+    backends = {
+        "gigachat": lambda: GigachatRewriteRepository(
+            credentials=settings.gigachat_api,
+            timeout_s=settings.gigachat_timeout_s,
+            max_concurrency=settings.gigachat_max_concurrency,
+        ),
+        "ollama": lambda: OllamaRewriteRepository(
+            host=settings.ollama_base_url or None,
+            model=settings.ollama_model_name,
+            timeout_s=settings.ollama_timeout_s,
+            max_concurrency=settings.ollama_max_concurrency,
+        ),
+    }
+    # routed to the fastest healthy backend, with failover and optional hedging
+    llm = RoutingRewriteRepository(
+        {
+            name.strip(): backends[name.strip()]()
+            for name in settings.rewrite_backends.split(",")
+            if name.strip()
+        },
+        deadline_s=settings.rewrite_deadline_s,
+        hedge_after_s=settings.rewrite_hedge_after_s,
+    )
+    rewriter: ILLMRewriteRepository = llm
+    if settings.rewrite_cache_backend == "memory":
+        rewriter = CachedRewriteRepository(
+            llm,
+            MemoryRewriteCache(
+                settings.rewrite_cache_size, settings.rewrite_cache_ttl_s
+            ),
+        )
+    elif settings.rewrite_cache_backend == "mongo":
+        rewriter = CachedRewriteRepository(
+            llm,
+            MongoRewriteCache(
+                settings.mongo_uri,
+                max_size=settings.rewrite_cache_size,
+                ttl_s=settings.rewrite_cache_ttl_s,
+            ),
+        )
 
     # 3) instantiate service
     global aggregator
-    aggregator = AggregatorService(repo, rewriter, bus)
+    aggregator = AggregatorService(
+        repo,
+        rewriter,
+        bus,
+        pending=PendingStore(
+            ttl_s=settings.aggregator_pending_ttl_s,
+            max_entries=settings.aggregator_max_pending,
+        ),
+        changelog_topic=settings.aggregator_changelog_topic,
+    )
+    expiry = asyncio.create_task(aggregator.run_expiry())
 
     # 4) subscribe
-    await bus.subscribe(
-        topic="check-results",
-        group_id="aggregator",
-        handler=_raw_handler,  # we wrap to deserialize correctly
-    )
+    try:
+        await bus.subscribe(
+            topic="check-results",
+            group_id="aggregator",
+            handler=_raw_handler,  # we wrap to deserialize correctly
+            on_assign=aggregator.on_assign,
+            on_revoke=aggregator.on_revoke,
+            # offsets are committed once the result is in the changelog
+            max_in_flight=settings.kafka_max_in_flight,
+            commit_interval_ms=settings.kafka_commit_interval_ms,
+        )
+    finally:
+        expiry.cancel()
+        await aggregator.drain()
+        await repo.close()
+        await llm.aclose()
+        await bus.close()
 
 
 if __name__ == "__main__":
@@ -1,36 +1,151 @@
 import asyncio
+from typing import Optional
+from repositories.inference_backend import get_backend
+from repositories.embedding_cache import EmbeddingCache
+from repositories.embedding_store import EmbeddingStore
 from repositories.kafka_bus import KafkaEventBus
+from repositories.llm_off_topic import LLMOffTopic
+from repositories.llm_off_topic_scorer import LLMOffTopicRepository
+from repositories.model_registry import default_registry
+from repositories.off_topic_cascade import OffTopicCascadeRepository
 from repositories.off_topic_scorer import OffTopicRepository
+from repositories.topic_index import TopicIndex
 from entities.data import BotMessage, ServiceCheckResult
+from use_cases.check_message import check_request_topics
 from config import settings
 
+# how often (in messages) to log embedding cache statistics
+CACHE_STATS_EVERY = 1000
+processed = 0
+# in-flight checks waiting for the LLM, kept so they are not garbage-collected
+_pending: set = set()
+
 
 async def handle(message: BotMessage, headers: dict):
     if headers.get("check_type") != "off_topic":
         return
 
-    result: ServiceCheckResult = OffTopicRepository(
-        settings.off_topic_model_name
-    ).process(BotMessage(**message))
+    check = check_and_publish(BotMessage(**message), headers["request_id"])
+    # with the concurrent consumer, a slow LLM call only holds up its own
+    # partition, and the offset is committed once the result is published
+    if cascade is None or settings.kafka_max_in_flight > 0:
+        await check
+        return
+    # escalations wait for the LLM; do not block the consumer on them
+    task = asyncio.create_task(check)
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
 
-    await bus.publish(
+async def check_and_publish(message: BotMessage, request_id: str):
+    global processed
+    try:
+        result: ServiceCheckResult = (
+            await cascade.process(message)
+            if cascade is not None
+            else repo.process(message)
+        )
+    except Exception as exc:
+        print(f"[off_topic_worker] Check failed for {request_id}: {exc}")
+        # report the failure, so the aggregator need not wait for the deadline
+        result = ServiceCheckResult(
+            safe=False,
+            score=0.0,
+            masked_answer="",
+            question=message.question,
+            error=f"Check failed: {exc}",
+        )
+    processed += 1
+    if processed % CACHE_STATS_EVERY == 0:
+        print(f"[off_topic_worker] Embedding cache: {repo.cache.stats()}")
+        if repo.store is not None:
+            print(f"[off_topic_worker] Embedding store: {repo.store.stats()}")
+        if cascade is not None:
+            print(f"[off_topic_worker] Cascade: {cascade.stage_report()}")
+
+    # fire-and-forget: delivery is reported by the callback
+    await bus.publish_nowait(
         topic="check-results",
         message=result,
         headers={
-            "request_id": headers["request_id"],
+            "request_id": request_id,
             "check_type": "off_topic",
         },
+        # keyed so every result of a request reaches the same aggregator
+        key=request_id,
+        on_delivery=delivery_report(request_id),
     )
 
 
+def delivery_report(request_id: str):
+    def report(error: Optional[Exception]) -> None:
+        if error is not None:
+            print(
+                f"[off_topic_worker] Result for {request_id} was not delivered: {error}"
+            )
+
+    return report
+
+
 async def main():
-    global bus
-    bus = KafkaEventBus(brokers=settings.kafka_brokers)
+    global bus, repo, cascade
+    bus = KafkaEventBus(
+        brokers=settings.kafka_brokers,
+        linger_ms=settings.kafka_linger_ms,
+        max_batch_size=settings.kafka_max_batch_size,
+        compression_type=settings.kafka_compression_type,
+        acks=settings.kafka_acks,
+    )
+    # the model is loaded once and hot-reloaded when a local artifact changes
+    default_registry.check_interval = settings.model_reload_interval_s
+    repo = OffTopicRepository(
+        settings.off_topic_model_name,
+        backend=get_backend(settings.inference_backend, settings.onnx_cache_dir),
+        cache=EmbeddingCache(settings.off_topic_cache_size),
+        store=(
+            EmbeddingStore(
+                settings.off_topic_store_path, settings.off_topic_store_capacity
+            )
+            if settings.off_topic_store_path
+            else None
+        ),
+        topic_index=(
+            TopicIndex(settings.off_topic_topics_path, top_k=settings.off_topic_top_k)
+            if settings.off_topic_topics_path
+            else None
+        ),
+        mode=settings.off_topic_mode,
+        topic_threshold=settings.off_topic_topic_threshold,
+    )
+    cascade, llm = None, None
+    if settings.off_topic_cascade_enabled:
+        llm = LLMOffTopic(
+            timeout_s=settings.off_topic_llm_timeout_s,
+            max_concurrency=settings.off_topic_llm_max_concurrency,
+        )
+        cascade = OffTopicCascadeRepository(
+            repo,
+            LLMOffTopicRepository(llm),
+            uncertain_low=settings.off_topic_uncertain_low,
+            uncertain_high=settings.off_topic_uncertain_high,
+        )
 
     # subscribe as part of the "pii-service" group
-    await bus.subscribe(
-        topic="check-requests", group_id="off-topic-service", handler=handle
-    )
+    try:
+        await bus.subscribe(
+            topic=check_request_topics("off_topic", settings.check_topic_routing),
+            group_id="off-topic-service",
+            handler=handle,
+            max_in_flight=settings.kafka_max_in_flight,
+            commit_interval_ms=settings.kafka_commit_interval_ms,
+        )
+    finally:
+        # finish the checks still waiting for the LLM and publish their results
+        await asyncio.gather(*_pending, return_exceptions=True)
+        if llm is not None:
+            await llm.aclose()
+        # flush results still waiting for delivery
+        await bus.close()
 
 
 if __name__ == "__main__":
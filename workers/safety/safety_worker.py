@@ -1,36 +1,114 @@
 import asyncio
+from typing import Optional
+from repositories.inference_backend import get_backend
 from repositories.kafka_bus import KafkaEventBus
+from repositories.micro_batcher import MicroBatcher
 from repositories.safety_classifier import SafetyClassifierRepository
 from entities.data import BotMessage, ServiceCheckResult
+from use_cases.check_message import check_request_topics
 from config import settings
 
+# in-flight publish tasks, kept so they are not garbage-collected
+_pending: set = set()
+
 
 async def handle(message: BotMessage, headers: dict):
     if headers.get("check_type") != "safety":
         return
     print(message)
-    # 1) run the PII adapter
-    result: ServiceCheckResult = SafetyClassifierRepository().process(
-        BotMessage(**message)
+    # 1) hand the message to the micro-batcher; waits only if the queue is full
+    bot_message = BotMessage(**message)
+    future = await batcher.submit(bot_message)
+    # 2) publish the result once its batch is done, without blocking the consumer
+    task = asyncio.create_task(
+        publish_result(future, bot_message, headers["request_id"])
     )
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def publish_result(future: asyncio.Future, message: BotMessage, request_id: str):
+    try:
+        result: ServiceCheckResult = await future
+    except Exception as exc:
+        print(f"[safety_worker] Batch failed for {request_id}: {exc}")
+        # report the failure, so the aggregator need not wait for the deadline
+        result = ServiceCheckResult(
+            safe=False,
+            score=0.0,
+            masked_answer="",
+            question=message.question,
+            error=f"Batch failed: {exc}",
+        )
     print(result)
-    # 2) publish partial result back
-    await bus.publish(
+    # fire-and-forget: delivery is reported by the callback
+    await bus.publish_nowait(
         topic="check-results",
         message=result,
         headers={
-            "request_id": headers["request_id"],
+            "request_id": request_id,
             "check_type": "safety",
         },
+        # keyed so every result of a request reaches the same aggregator
+        key=request_id,
+        on_delivery=delivery_report(request_id),
     )
 
 
+def parse_languages(value: str) -> list:
+    return [lang.strip() for lang in value.split(",") if lang.strip()]
+
+
+def delivery_report(request_id: str):
+    def report(error: Optional[Exception]) -> None:
+        if error is not None:
+            print(f"[safety_worker] Result for {request_id} was not delivered: {error}")
+
+    return report
+
+
 async def main():
-    global bus
-    bus = KafkaEventBus(brokers=settings.kafka_brokers)
-    await bus.subscribe(
-        topic="check-requests", group_id="safety-service", handler=handle
+    global bus, batcher
+    bus = KafkaEventBus(
+        brokers=settings.kafka_brokers,
+        linger_ms=settings.kafka_linger_ms,
+        max_batch_size=settings.kafka_max_batch_size,
+        compression_type=settings.kafka_compression_type,
+        acks=settings.kafka_acks,
+    )
+    repo = SafetyClassifierRepository(
+        mask_batch_size=settings.safety_mask_batch_size,
+        batch_size=settings.safety_batch_max_size,
+        languages=parse_languages(settings.safety_languages),
+        preload_languages=(
+            parse_languages(settings.safety_preload_languages)
+            if settings.safety_preload_languages is not None
+            else None
+        ),
+        backend=get_backend(settings.inference_backend, settings.onnx_cache_dir),
+    )
+    # load the needed models before consuming, so the first records don't pay for it
+    await asyncio.to_thread(repo.warmup)
+    print(f"[safety_worker] Ready: models loaded for {repo.preload_languages}")
+    batcher = MicroBatcher(
+        repo.process_batch,
+        max_batch_size=settings.safety_batch_max_size,
+        max_latency_ms=settings.safety_batch_max_latency_ms,
+        max_queue_size=settings.safety_batch_queue_size,
     )
+    try:
+        await bus.subscribe(
+            topic=check_request_topics("safety", settings.check_topic_routing),
+            group_id="safety-service",
+            handler=handle,
+        )
+    finally:
+        # score what is still queued and publish the last results
+        await batcher.flush()
+        await asyncio.gather(*_pending, return_exceptions=True)
+        await batcher.close()
+        # flush results still waiting for delivery
+        await bus.close()
 
 
 if __name__ == "__main__":